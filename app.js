@@ -3,15 +3,23 @@
 // Debug mode detection
 const urlParams = new URLSearchParams(window.location.search);
 const debugMode = urlParams.get('debug') === 'true';
+const runTestsMode = urlParams.get('runtests') === 'true';
+const memprofileMode = urlParams.get('memprofile') === 'true';
+const profileMode = urlParams.get('profile') === 'true';
+// ?shared=true runs the program in one interpreter shared by the origin's tabs (sharedHost.js);
+// profiling and the test suite need the page's own
+const sharedMode = urlParams.get('shared') === 'true' && !runTestsMode && !memprofileMode && !profileMode;
+// ?timeslice=N puts a yield point in the program's loops, checked every N iterations
+const timeslice = Number(urlParams.get('timeslice')) || 0;
 
 // Early debug access
 const earlyLog = window.earlyLog || (() => {});
 const APP_VERSION = '2025.08.23.1'; // YYYY.MM.DD.version_number
 earlyLog(`app.js v${APP_VERSION} starting initialization`);
 
-// Add debug output div if in debug mode
+// Add debug output div if in debug mode (the memory profile is shown there too)
 let debugOutput;
-if (debugMode) {
+if (debugMode || memprofileMode) {
     debugOutput = document.createElement('div');
     debugOutput.id = 'debug-output';
     debugOutput.style.cssText = `
@@ -51,6 +59,17 @@ if (debugMode) {
     });
 }
 
+// Add a line to the debug overlay
+function overlayLog(text, color = '#00ff00') {
+    if (!debugOutput) return;
+    const line = document.createElement('div');
+    line.style.color = color;
+    line.style.whiteSpace = 'pre-wrap';
+    line.textContent = text;
+    debugOutput.appendChild(line);
+    debugOutput.scrollTop = debugOutput.scrollHeight;
+}
+
 let pyodide;
 let isInitialized = false;
 
@@ -65,8 +84,30 @@ if (window.pyodide) {
     earlyLog('No existing Pyodide instance found');
 }
 let pythonProgram = '';
+// Loads the program's content packs from scenes/ (see contentPacks.js)
+let packLoader = null;
+// The program's persistent data directory (persistentFs.js)
+let programFiles = null;
+// The program's opening screen, shown before Pyodide is ready (see programPrefix.js):
+// the embedded prefix, the promise of it being on screen, the replay of the resumed run
+// and what the player typed at the captured prompt in the meantime
+let prefix = null;
+let prefixShown = null;
+let replay = null;
+let typedAhead = null;
+// Reveals narrate() output and keeps later output queued behind it (see typewriter.js)
+let typewriter = null;
 let isWaitingForInput = false;
 let inputResolver = null;
+let inputRejecter = null;
+// Python's deliver_input(), kept for the whole session: answers go back as plain strings
+let deliverInput = null;
+// Stop button state: the running flag, the stop request and Pyodide's interrupt buffer
+let isRunning = false;
+let stopRequested = false;
+let interruptBuffer = null;
+// Connection to the shared interpreter in ?shared=true mode (sharedClient.js)
+let sharedHost = null;
 
 // Get CSS custom properties for input configuration
 const computedStyle = getComputedStyle(document.documentElement);
@@ -93,20 +134,86 @@ if (inputType === 'numeric') {
 // Import modules
 earlyLog('Starting module imports...');
 
-Promise.all([
-    import('./transformInputToAsync.js')
+const modulesLoaded = Promise.all([
+    import('./prepareProgram.js')
+        .then(module => {
+            window.prepareProgram = module.prepareProgram;
+            window.wrapProgram = module.wrapProgram;
+            earlyLog('prepareProgram.js loaded');
+        })
+        .catch(err => earlyLog(`Error loading prepareProgram.js: ${err.message}`)),
+
+    import('./contentPacks.js')
+        .then(module => {
+            window.createPackLoader = module.createPackLoader;
+            earlyLog('contentPacks.js loaded');
+        })
+        .catch(err => earlyLog(`Error loading contentPacks.js: ${err.message}`)),
+
+    import('./typewriter.js')
+        .then(module => {
+            window.createTypewriter = module.createTypewriter;
+            earlyLog('typewriter.js loaded');
+        })
+        .catch(err => earlyLog(`Error loading typewriter.js: ${err.message}`)),
+
+    import('./testRunner.js')
+        .then(module => {
+            window.runTestSuite = module.runTestSuite;
+            earlyLog('testRunner.js loaded');
+        })
+        .catch(err => earlyLog(`Error loading testRunner.js: ${err.message}`)),
+
+    import('./saveStore.js')
+        .then(module => {
+            window.writeSaveData = module.writeSaveData;
+            window.readSaveData = module.readSaveData;
+            window.clearSaveData = module.clearSaveData;
+            earlyLog('saveStore.js loaded');
+        })
+        .catch(err => earlyLog(`Error loading saveStore.js: ${err.message}`)),
+
+    import('./eventJournal.js')
+        .then(module => {
+            window.recordEvent = module.recordEvent;
+            window.eventCount = module.eventCount;
+            window.clearEvents = module.clearEvents;
+            earlyLog('eventJournal.js loaded');
+        })
+        .catch(err => earlyLog(`Error loading eventJournal.js: ${err.message}`)),
+
+    import('./assetConfig.js')
         .then(module => {
-            window.transformPythonForPyodide = module.transformPythonForPyodide;
-            earlyLog('transformInputToAsync.js loaded');
+            window.pyodideBaseUrl = module.pyodideBaseUrl;
+            window.loadPyodideScript = module.loadPyodideScript;
+            window.registerAssetCache = module.registerAssetCache;
+            earlyLog('assetConfig.js loaded');
         })
-        .catch(err => earlyLog(`Error loading transformInputToAsync.js: ${err.message}`)),
+        .catch(err => earlyLog(`Error loading assetConfig.js: ${err.message}`)),
 
-    import('./concatenatePrints.js')
+    import('./persistentFs.js')
         .then(module => {
-            window.concatenateConsecutivePrints = module.concatenateConsecutivePrints;
-            earlyLog('concatenatePrints.js loaded');
+            window.createPersistentFs = module.createPersistentFs;
+            earlyLog('persistentFs.js loaded');
         })
-        .catch(err => earlyLog(`Error loading concatenatePrints.js: ${err.message}`)),
+        .catch(err => earlyLog(`Error loading persistentFs.js: ${err.message}`)),
+
+    import('./programPrefix.js')
+        .then(module => {
+            window.readPrefix = module.readPrefix;
+            window.prefixMatches = module.prefixMatches;
+            window.createReplay = module.createReplay;
+            earlyLog('programPrefix.js loaded');
+        })
+        .catch(err => earlyLog(`Error loading programPrefix.js: ${err.message}`)),
+
+    import('./sharedClient.js')
+        .then(module => {
+            window.sharedHostSupported = module.sharedHostSupported;
+            window.connectSharedHost = module.connectSharedHost;
+            earlyLog('sharedClient.js loaded');
+        })
+        .catch(err => earlyLog(`Error loading sharedClient.js: ${err.message}`)),
 
     import('./debugUtils.js')
         .then(module => {
@@ -121,8 +228,18 @@ Promise.all([
     earlyLog('Configuring debug modules');
     setDebugModules({
         'app.js': true,
+        'assetConfig.js': true,
         'concatenatePrints.js': false,
-        'transformInputToAsync.js': false
+        'contentPacks.js': true,
+        'eventJournal.js': false,
+        'persistentFs.js': false,
+        'prepareProgram.js': true,
+        'programPrefix.js': true,
+        'saveStore.js': false,
+        'sharedClient.js': true,
+        'testRunner.js': true,
+        'transformInputToAsync.js': false,
+        'typewriter.js': false
     });
 }).catch(err => {
     earlyLog(`ERROR in module loading: ${err.message}`);
@@ -138,6 +255,7 @@ const chatOutput = document.getElementById('chat-output');
 const userInput = document.getElementById('user-input');
 const sendButton = document.getElementById('send-button');
 const runScriptButton = document.getElementById('run-script-button');
+const stopButton = document.getElementById('stop-button');
 const clearButton = document.getElementById('clear-button');
 const status = document.getElementById('status');
 const pythonVersion = document.getElementById('python-version');
@@ -148,68 +266,65 @@ earlyLog(`chat-output: ${chatOutput ? 'YES' : 'NO'}`);
 earlyLog(`user-input: ${userInput ? 'YES' : 'NO'}`);
 earlyLog(`send-button: ${sendButton ? 'YES' : 'NO'}`);
 earlyLog(`run-script-button: ${runScriptButton ? 'YES' : 'NO'}`);
+earlyLog(`stop-button: ${stopButton ? 'YES' : 'NO'}`);
 earlyLog(`clear-button: ${clearButton ? 'YES' : 'NO'}`);
 earlyLog(`status: ${status ? 'YES' : 'NO'}`);
 earlyLog(`python-version: ${pythonVersion ? 'YES' : 'NO'}`);
 
-// Cookie utility functions
-function setCookie(name, value, days = 30) {
-    const expires = new Date();
-    expires.setTime(expires.getTime() + (days * 24 * 60 * 60 * 1000));
-    document.cookie = `${name}=${JSON.stringify(value)};expires=${expires.toUTCString()};path=/`;
-}
-
-function getCookie(name) {
-    const nameEQ = name + "=";
-    const ca = document.cookie.split(';');
-    for(let i = 0; i < ca.length; i++) {
-        let c = ca[i];
-        while (c.charAt(0) === ' ') c = c.substring(1, c.length);
-        if (c.indexOf(nameEQ) === 0) {
-            try {
-                return JSON.parse(c.substring(nameEQ.length, c.length));
-            } catch(e) {
-                return null;
-            }
-        }
-    }
-    return null;
-}
-
-function deleteCookie(name) {
-    document.cookie = `${name}=;expires=Thu, 01 Jan 1970 00:00:00 UTC;path=/;`;
-}
-
 // Data persistence bridge functions
-function saveAppData(data, key = 'app_data') {
-    // Convert Python object to JavaScript object if needed
-    let jsData;
-    if (data && typeof data.toJs === 'function') {
-        // If it's a PyProxy object with toJs method, convert it
-        // Use Object.fromEntries to convert Map to plain Object for JSON serialization
-        jsData = data.toJs({dict_converter: Object.fromEntries});
-    } else {
-        // Otherwise assume it's already a JavaScript object
-        jsData = data;
-    }
+// Saved data crosses the bridge as JSON text (see save_data/load_data in bootstrap.py),
+// so neither side ends up holding a proxy of the other's objects
+function saveAppData(text, key = 'app_data') {
+    const jsData = JSON.parse(text);
     
-    setCookie(key, jsData);
-    console.log(`App data saved to cookie (${key}):`, jsData);
+    // Only the fields that changed since the last save are rewritten
+    const writes = writeSaveData(key, jsData);
+    console.log(`App data saved (${key}, ${writes} cookie write(s)):`, jsData);
     return true; // Return success indicator
 }
 
 function loadAppData(key = 'app_data') {
-    const savedData = getCookie(key);
-    console.log(`App data loaded from cookie (${key}):`, savedData);
+    const savedData = readSaveData(key);
+    console.log(`App data loaded (${key}):`, savedData);
     
-    // Return the data as-is - it should be a proper JavaScript object
-    // that Python can convert using .to_py()
-    return savedData;
+    // Python parses the text with json.loads()
+    return savedData === null ? null : JSON.stringify(savedData);
+}
+
+// Live proxies: the JS values Python code holds references to, from Pyodide's internal
+// hiwire table. That table is private, so it is only read on the Pyodide version it was
+// checked against. PyProxies held by JavaScript have no such count - Pyodide doesn't
+// track them outside of its debug builds - so they are destroyed where they are used
+// rather than counted
+const HIWIRE_COUNT_VERSION = '0.24.1';
+let lastProxyCounts = null;
+
+function liveProxyCounts() {
+    const hiwire = pyodide && pyodide.version === HIWIRE_COUNT_VERSION && pyodide._module && pyodide._module.hiwire;
+    return {
+        jsValuesHeldByPython: hiwire && typeof hiwire.num_keys === 'function' ? hiwire.num_keys() : null
+    };
+}
+window.liveProxyCounts = liveProxyCounts;
+
+// Log the live proxy count after a run, and how it changed since the previous one
+function logProxyCounts() {
+    const { jsValuesHeldByPython: count } = liveProxyCounts();
+    if (count === null) {
+        overlayLog(`Live proxies: only counted on Pyodide ${HIWIRE_COUNT_VERSION}`, '#ffff00');
+        return;
+    }
+    const previous = lastProxyCounts ? lastProxyCounts.jsValuesHeldByPython : null;
+    const change = previous === null ? '' : ` (${count - previous >= 0 ? '+' : ''}${count - previous})`;
+    overlayLog(`Live proxies: ${count} JS values held by Python${change}`,
+        previous !== null && count > previous ? '#ffff00' : '#00ff00');
+    debug('app.js', `Live proxies: ${count}`);
+    lastProxyCounts = { jsValuesHeldByPython: count };
 }
 
 function clearAppData(key = 'app_data') {
-    deleteCookie(key);
-    console.log(`App data cleared from cookie (${key})`);
+    clearSaveData(key);
+    console.log(`App data cleared (${key})`);
     return true; // Return success indicator
 }
 
@@ -243,107 +358,51 @@ async function initializePyodide() {
         }
 
         console.log('Loading Pyodide...');
-        addMessage('system', 'Initializing Python environment... Please wait.');
         status.textContent = 'Loading Pyodide...';
+        await modulesLoaded;
+        const programFile = document.getElementById('python-file').value || 'main.py';
         
-        pyodide = await loadPyodide({
-            indexURL: "https://cdn.jsdelivr.net/pyodide/v0.24.1/full/"
-        });
-        
-        console.log('Loading Python program...');
-        await loadPythonProgram();
-        
-        console.log('Setting up Python environment...');
-        // Set up print and input overrides
-        pyodide.globals.set('js_print', displayPythonOutput);
-        pyodide.globals.set('js_input', getUserInput);
-        
-        // Set up data persistence functions (for cookie save/load)
-        pyodide.globals.set('js_save_data', saveAppData);
-        pyodide.globals.set('js_load_data', loadAppData);
-        pyodide.globals.set('js_clear_data', clearAppData);
+        // The opening screen is shown while Pyodide downloads, in place of the wait message
+        prefixShown = showPrefix(programFile);
+        if (!prefix) {
+            addMessage('system', 'Initializing Python environment... Please wait.');
+        }
         
-        await pyodide.runPythonAsync(`
-import builtins
-import asyncio
-
-# Get JS functions
-js_print = globals()['js_print']
-js_input = globals()['js_input']
-
-# Get data persistence functions
-js_save_data = globals()['js_save_data']
-js_load_data = globals()['js_load_data']
-js_clear_data = globals()['js_clear_data']
-
-# Override print
-def new_print(*args, msg_type='python', **kwargs):
-    text = ' '.join(str(arg) for arg in args)
-    js_print(text, msg_type)
-    # Also log to browser console for debugging
-    from js import console
-    console.log(f"Python print: {text} (type: {msg_type})")
-
-# Override input - this will work with await in the async context
-async def new_input(prompt=""):
-    result = await js_input(str(prompt) if prompt else "")
-    return str(result) if result is not None else ""
-
-# Override time.sleep with async version
-async def new_sleep(seconds):
-    await asyncio.sleep(seconds)
-
-builtins.print = new_print
-builtins.input = new_input
-
-# Use JS functions directly for simple pass-throughs (they already have default parameters)
-builtins.save_data = js_save_data
-builtins.clear_data = js_clear_data
-
-# Create Python wrapper function only for load_data since it does meaningful data conversion
-def load_data(key='app_data'):
-    """Load data from browser cookies and convert to Python dict"""
-    js_data = js_load_data(key)
-    if js_data is None:
-        return None
-    
-    # Convert JsProxy to Python object using to_py()
-    try:
-        # Check if it's a JsProxy object with to_py method
-        if hasattr(js_data, 'to_py'):
-            return js_data.to_py()
-        else:
-            # If it's already a Python object, return as-is
-            return js_data
-    except Exception as e:
-        print(f"Error converting JS data to Python: {e}")
-        return None
-
-# Make the load_data wrapper available globally
-builtins.load_data = load_data
-
-# Override time.sleep when time module is imported
-import time
-time.sleep = new_sleep
-
-PYODIDE_ENV = True
-print("Python environment ready!")
-        `);
+        // Interpreter files come from the configured host, through the caching service worker
+        const indexURL = pyodideBaseUrl();
+        registerAssetCache(indexURL);
+        typewriter = createTypewriter(() => {
+            chatOutput.scrollTop = chatOutput.scrollHeight;
+        });
+        // ?shared=true: one interpreter for all of the origin's tabs (sharedHost.js)
+        const version = sharedMode && sharedHostSupported()
+            ? await connectSharedInterpreter(indexURL, programFile)
+            : await setUpInterpreter(indexURL, programFile);
         
         isInitialized = true;
         status.textContent = 'Python environment ready!';
         status.className = '';
-        pythonVersion.textContent = `Python ${pyodide.runPython('import sys; sys.version.split()[0]')}`;
+        pythonVersion.textContent = `Python ${version}`;
         
         userInput.disabled = false;
         sendButton.disabled = false;
         runScriptButton.disabled = false;
         userInput.placeholder = 'Type a message...';
         
-        addMessage('system', 'Python environment initialized successfully! Click "Run Python Program" to start.');
+        if (runTestsMode) {
+            addMessage('system', 'Python environment initialized successfully! Click "Run Python Program" to start.');
+            runScriptButton.focus();
+            await runTests();
+        } else if (await prefixShown) {
+            // Carry on from the opening screen
+            replay = createReplay(prefix);
+            await runPythonProgram();
+        } else {
+            addMessage('system', 'Python environment initialized successfully! Click "Run Python Program" to start.');
 
-        // Focus the run button and add keyboard listener
-        runScriptButton.focus();
+            // Focus the run button and add keyboard listener
+            runScriptButton.focus();
+        }
         
     } catch (error) {
         console.error('Initialization error:', error);
@@ -352,6 +411,141 @@ print("Python environment ready!")
     }
 }
 
+// Load Pyodide in this page and set it up for the program
+// Returns the Python version
+async function setUpInterpreter(indexURL, programFile) {
+    // Stored program files are read from IndexedDB while Pyodide downloads
+    programFiles = createPersistentFs(programFile);
+    
+    await loadPyodideScript(indexURL);
+    pyodide = await loadPyodide({ indexURL });
+    
+    console.log('Loading Python program...');
+    await loadPythonProgram();
+    
+    console.log('Setting up Python environment...');
+    // Set up print and input overrides
+    pyodide.globals.set('js_print', displayPythonOutput);
+    pyodide.globals.set('js_request_input', requestInput);
+    pyodide.globals.set('js_stream', streamPythonOutput);
+    pyodide.globals.set('js_stop_requested', () => stopRequested);
+    pyodide.globals.set('js_sleep', sleepFor);
+    
+    // Writing 2 (SIGINT) here raises KeyboardInterrupt in Python the next time it checks,
+    // which a program that yields (input, sleep, ?timeslice) gives the Stop button a chance to do
+    interruptBuffer = new Uint8Array(window.crossOriginIsolated ? new SharedArrayBuffer(1) : new ArrayBuffer(1));
+    pyodide.setInterruptBuffer(interruptBuffer);
+    
+    // Set up data persistence functions (for cookie save/load)
+    pyodide.globals.set('js_save_data', saveAppData);
+    pyodide.globals.set('js_load_data', loadAppData);
+    pyodide.globals.set('js_clear_data', clearAppData);
+    
+    // Set up event journal functions (for counters such as play statistics)
+    pyodide.globals.set('js_record_event', recordEvent);
+    pyodide.globals.set('js_event_count', eventCount);
+    pyodide.globals.set('js_clear_events', clearEvents);
+    
+    // Set up content pack loading (enter_scene/scene)
+    pyodide.globals.set('js_load_pack', name => packLoader.loadPack(name));
+    pyodide.globals.set('js_prefetch_pack', name => packLoader.prefetchPack(name));
+    
+    // The bootstrap builds print/input/sleep/persistence on top of the js_* functions above
+    const bootstrapResponse = await fetch('bootstrap.py');
+    if (!bootstrapResponse.ok) {
+        throw new Error(`Could not load bootstrap.py (HTTP ${bootstrapResponse.status})`);
+    }
+    await pyodide.runPythonAsync(await bootstrapResponse.text());
+    deliverInput = pyodide.globals.get('deliver_input');
+    
+    // Importable modules for runProfiledProgram() and runFunctionProfile()
+    const toolModules = [memprofileMode && 'memprofile.py', profileMode && 'profiler.py'].filter(Boolean);
+    for (const moduleFile of toolModules) {
+        const moduleResponse = await fetch(moduleFile);
+        if (!moduleResponse.ok) {
+            throw new Error(`Could not load ${moduleFile} (HTTP ${moduleResponse.status})`);
+        }
+        pyodide.FS.writeFile(moduleFile, await moduleResponse.text());
+    }
+    
+    // The data directory becomes the working directory, so program files persist
+    await programFiles.mount(pyodide);
+    
+    return pyodide.runPython('import sys; sys.version.split()[0]');
+}
+
+// Connect to the interpreter the origin's tabs share, which runs this tab's program in a
+// session of its own; returns the Python version
+async function connectSharedInterpreter(indexURL, programFile) {
+    console.log('Connecting to the shared interpreter...');
+    sharedHost = connectSharedHost(indexURL, programFile, {
+        print: displayPythonOutput,
+        stream: streamPythonOutput,
+        input: getUserInput,
+        sleep: sleepFor,
+        loadPack: name => packLoader.loadPack(name),
+        prefetchPack: name => packLoader.prefetchPack(name)
+    });
+    // The worker keeps the program's files; a sync is requested the same way
+    programFiles = sharedHost;
+    await loadPythonProgram();
+    const { pythonVersion: version } = await sharedHost.ready;
+    return version;
+}
+
+// time.sleep() of the program; the resumed run doesn't wait again for the pauses of the opening screen
+function sleepFor(seconds) {
+    return replay && replay.active()
+        ? Promise.resolve()
+        : new Promise(resolve => setTimeout(resolve, seconds * 1000));
+}
+
+// Show the program's captured opening screen with its original pauses, and take the
+// player's answer to its prompt before the interpreter is ready
+// Resolves with whether the screen was shown (the prefix matches the program's source)
+async function showPrefix(programFile) {
+    // Profiling and test runs start from a clean chat
+    const candidate = memprofileMode || profileMode || runTestsMode ? null : readPrefix(programFile);
+    if (!candidate) {
+        return false;
+    }
+    prefix = candidate;
+    const response = await fetch(programFile);
+    if (!response.ok || !await prefixMatches(prefix, await response.text())) {
+        prefix = null;
+        addMessage('system', 'Initializing Python environment... Please wait.');
+        return false;
+    }
+    debug('app.js', `Showing the opening screen of ${programFile} (${prefix.transcript.length} messages)`);
+    const pause = seconds => new Promise(resolve => setTimeout(resolve, seconds * 1000));
+    let shownAt = 0;
+    for (const message of prefix.transcript) {
+        await pause(message.t - shownAt);
+        shownAt = message.t;
+        addMessage(message.type, message.text);
+    }
+    // The resumed run may already have moved past the opening screen
+    if (prefix.prompt && (!replay || replay.active())) {
+        await pause(prefix.prompt.t - shownAt);
+        if (prefix.prompt.text.trim()) {
+            addMessage('system', prefix.prompt.text);
+        }
+        // Until the program asks for real, an answer is kept for it (see getUserInput)
+        isWaitingForInput = true;
+        userInput.placeholder = 'Enter your response...';
+        userInput.disabled = false;
+        sendButton.disabled = false;
+        userInput.focus();
+        inputResolver = (value) => {
+            typedAhead = value || '';
+            isWaitingForInput = false;
+            inputResolver = null;
+            userInput.placeholder = 'Loading Python...';
+        };
+    }
+    return true;
+}
+
 // Load Python program
 async function loadPythonProgram() {
     try {
@@ -360,13 +554,10 @@ async function loadPythonProgram() {
         const response = await fetch(filename);
         if (response.ok) {
             let rawCode = await response.text();
-            // Transform the code to async/await style
-            let transformedCode = transformPythonForPyodide(rawCode);
+            // Transform the code to async/await style and concatenate consecutive print statements
+            pythonProgram = prepareProgram(rawCode, { timeslice });
+            packLoader = createPackLoader(filename, pythonProgram, { timeslice });
             console.log(`Loaded and transformed ${filename} successfully.`);
-            debug('app.js', `Transform Python code for Pyodide, pre-print-concatenation:\n${transformedCode}`);
-            // Further optimize by concatenating consecutive print statements
-            pythonProgram = concatenateConsecutivePrints(transformedCode);
-            debug('app.js', `Transform Python code for Pyodide:\n${pythonProgram}`);
         } else {
             throw new Error(`HTTP ${response.status}`);
         }
@@ -383,6 +574,7 @@ print(f"You are {age} years old.")
 
 print("Thanks for testing the interactive chat!")
         `;
+        packLoader = createPackLoader('', pythonProgram, { timeslice });
     }
 }
 
@@ -404,17 +596,60 @@ function addMessage(type, content, timestamp = null) {
     chatOutput.appendChild(messageDiv);
     
     chatOutput.scrollTop = chatOutput.scrollHeight;
+    return contentDiv;
 }
 
 // Display Python output
 function displayPythonOutput(text, type = 'python') {
-    addMessage(type, text);
+    // Already on screen from the opening screen
+    if (replay && replay.consume(type, text)) {
+        return;
+    }
+    // Wait for a passage that is still being revealed
+    typewriter.defer(() => addMessage(type, text));
+    // Also log to browser console for debugging
+    console.log(`Python print: ${text} (type: ${type})`);
+}
+
+// Display Python output like a typewriter (narrate() / print(..., stream=True))
+function streamPythonOutput(text, type = 'python') {
+    console.log(`Python narrate: ${text} (type: ${type})`);
+    if (replay && replay.consume(type, text)) {
+        return Promise.resolve();
+    }
+    return new Promise(resolve => {
+        typewriter.defer(() => {
+            typewriter.stream(addMessage(type, ''), text).then(resolve);
+        });
+    });
 }
 
 // Get user input (called from Python)
 function getUserInput(prompt) {
-    return new Promise((resolve) => {
+    // A good moment to save the files the program wrote so far
+    programFiles.scheduleSync();
+    // The prompt of the opening screen: already shown, and maybe already answered
+    if (replay && replay.resume(prompt)) {
+        return prefixShown.then(() => {
+            if (typedAhead !== null) {
+                const value = typedAhead;
+                typedAhead = null;
+                return value;
+            }
+            return waitForInput('');
+        });
+    }
+    return waitForInput(prompt);
+}
+
+// Show the prompt and wait for the player's answer (or the Stop button)
+function waitForInput(prompt) {
+    return new Promise((resolve, reject) => {
         console.log('getUserInput called with prompt:', prompt);
+        // The player is reading: a good time to download the scenes that may come next
+        if (packLoader) {
+            packLoader.prefetchReferenced();
+        }
         
         // Add the prompt message to the chat
         if (prompt && prompt.trim()) {
@@ -433,17 +668,44 @@ function getUserInput(prompt) {
             isWaitingForInput = false;
             userInput.placeholder = 'Type a message...';
             inputResolver = null;
+            inputRejecter = null;
             resolve(value || '');
         };
+        // Used by the Stop button
+        inputRejecter = (error) => {
+            isWaitingForInput = false;
+            userInput.placeholder = 'Type a message...';
+            inputResolver = null;
+            inputRejecter = null;
+            reject(error);
+        };
     });
 }
 
+// Ask for input on behalf of Python's input(); the answer (or the Stop error) goes to deliver_input
+function requestInput(prompt) {
+    getUserInput(prompt).then(
+        value => deliverInput(value),
+        error => deliverInput(null, error.message)
+    );
+}
+
 // Run Python program
 async function runPythonProgram() {
     if (!isInitialized || !pythonProgram) {
         addMessage('error', 'Python environment or program not ready.');
         return;
     }
+    if (isRunning) {
+        return;
+    }
+    isRunning = true;
+    stopRequested = false;
+    if (interruptBuffer) {
+        interruptBuffer[0] = 0;
+    }
+    runScriptButton.disabled = true;
+    stopButton.disabled = false;
     
     // swapping for a debug message instead
     // addMessage('system', 'Starting Python program...');
@@ -456,19 +718,169 @@ async function runPythonProgram() {
     try {
         // Wrap the transformed program in an async function
         // This allows synchronous Python input() and time.sleep() calls to work with async JavaScript Promises
-        const asyncProgram = `
-async def main():
-${pythonProgram.split('\n').map(line => '    ' + line).join('\n')}
-
-await main()
-        `;
-        
-        await pyodide.runPythonAsync(asyncProgram);
-        addMessage('system', 'Program finished. Click "Run Python Program" to start again.');
+        if (memprofileMode) {
+            await runProfiledProgram();
+        } else if (profileMode) {
+            await runFunctionProfile();
+        } else if (sharedHost) {
+            await sharedHost.run(wrapProgram(pythonProgram));
+        } else {
+            await pyodide.runPythonAsync(wrapProgram(pythonProgram));
+        }
+        typewriter.defer(() => addMessage('system', 'Program finished. Click "Run Python Program" to start again.'));
     } catch (error) {
-        console.error('Program execution error:', error);
-        addMessage('error', `Program error: ${error.message}`);
+        if (stopRequested) {
+            typewriter.defer(() => addMessage('system', 'Program stopped. Click "Run Python Program" to start again.'));
+        } else {
+            console.error('Program execution error:', error);
+            typewriter.defer(() => addMessage('error', `Program error: ${error.message}`));
+        }
+    } finally {
+        isRunning = false;
+        replay = null;
+        if (interruptBuffer) {
+            interruptBuffer[0] = 0;
+        }
+        programFiles.flush();
+        runScriptButton.disabled = false;
+        stopButton.disabled = true;
+        if (debugMode) {
+            logProxyCounts();
+        }
+    }
+}
+
+// Stop the running program: interrupt Python at its next check and reject a pending input()
+function stopProgram() {
+    if (!isRunning) {
+        return;
+    }
+    debug('app.js', 'Stopping Python program...');
+    stopRequested = true;
+    if (sharedHost) {
+        // Other tabs' programs share the interpreter: only this session is stopped
+        sharedHost.stop();
+    } else {
+        interruptBuffer[0] = 2;
+    }
+    stopButton.disabled = true;
+    typewriter.skip();
+    if (inputRejecter) {
+        inputRejecter(new Error('Program stopped'));
+    }
+}
+
+// Run the program with tracemalloc snapshots at every input() (?memprofile=true)
+async function runProfiledProgram() {
+    const filename = document.getElementById('python-file').value || 'main.py';
+    const memprofile = pyodide.pyimport('memprofile');
+    const profiler = memprofile.MemoryProfiler(filename, text => overlayLog(text));
+    const running = profiler.run(wrapProgram(pythonProgram), pyodide.globals);
+    try {
+        await running;
+    } finally {
+        const reportProxy = profiler.report();
+        const report = JSON.parse(profiler.report_json());
+        overlayLog(memprofile.format_report(reportProxy), report.monotonic_sites.length > 0 ? '#ffff00' : '#00ff00');
+        window.memoryProfile = report;
+        console.log('Memory profile:', JSON.stringify(report));
+        for (const proxy of [reportProxy, running, profiler, memprofile]) {
+            proxy.destroy();
+        }
+    }
+}
+
+// Run the program with every function timed (?profile=true) and show the summary at the end
+async function runFunctionProfile() {
+    const filename = document.getElementById('python-file').value || 'main.py';
+    const profilerModule = pyodide.pyimport('profiler');
+    const profiler = profilerModule.FunctionProfiler(filename);
+    const running = profiler.run(wrapProgram(pythonProgram), pyodide.globals);
+    try {
+        await running;
+    } finally {
+        const report = JSON.parse(profiler.report_json());
+        window.functionProfile = report;
+        console.log('Function profile:', JSON.stringify(report));
+        typewriter.defer(() => showProfileTable(report));
+        for (const proxy of [running, profiler, profilerModule]) {
+            proxy.destroy();
+        }
+    }
+}
+
+const PROFILE_COLUMNS = [
+    ['function', 'Function'],
+    ['calls', 'Calls'],
+    ['self_ms', 'Self ms'],
+    ['cumulative_ms', 'Cum. ms'],
+    ['wall_ms', 'Wall ms'],
+    ['input_wait_ms', 'Input ms'],
+    ['sleep_ms', 'Sleep ms']
+];
+
+// Profile summary in the chat: totals and a table sorted by clicking a column heading
+function showProfileTable(report) {
+    const seconds = ms => (ms / 1000).toFixed(2);
+    const contentDiv = addMessage('system',
+        `Profile: ${seconds(report.wall_ms)} s wall, ${seconds(report.active_ms)} s active, ` +
+        `${seconds(report.input_wait_ms)} s waiting for input (${report.prompts} prompts), ` +
+        `${seconds(report.sleep_ms)} s in sleep()`);
+    const table = document.createElement('table');
+    table.className = 'profile-table';
+    const headRow = table.createTHead().insertRow();
+    const body = table.createTBody();
+    let sortKey = report.sort;
+    let descending = true;
+
+    function render() {
+        const rows = [...report.functions].sort((a, b) => {
+            const order = typeof a[sortKey] === 'string' ? a[sortKey].localeCompare(b[sortKey]) : a[sortKey] - b[sortKey];
+            return descending ? -order : order;
+        });
+        body.replaceChildren();
+        for (const entry of rows) {
+            const row = body.insertRow();
+            for (const [key] of PROFILE_COLUMNS) {
+                const value = entry[key];
+                row.insertCell().textContent = typeof value === 'number' && key !== 'calls' ? value.toFixed(1) : value;
+            }
+        }
+        for (const cell of headRow.cells) {
+            cell.classList.toggle('sorted', cell.dataset.key === sortKey);
+            cell.dataset.direction = descending ? 'desc' : 'asc';
+        }
+    }
+
+    for (const [key, title] of PROFILE_COLUMNS) {
+        const cell = document.createElement('th');
+        cell.textContent = title;
+        cell.dataset.key = key;
+        cell.addEventListener('click', () => {
+            descending = key === sortKey ? !descending : key !== 'function';
+            sortKey = key;
+            render();
+        });
+        headRow.appendChild(cell);
+    }
+    render();
+    contentDiv.appendChild(table);
+    chatOutput.scrollTop = chatOutput.scrollHeight;
+}
+
+// Run the programs in test/ with scripted input instead of the game (?runtests=true)
+async function runTests() {
+    addMessage('system', 'Running test programs...');
+    const suite = await runTestSuite(pyodide);
+    for (const result of suite.results) {
+        const summary = `${result.name}: ${result.status.toUpperCase()} ` +
+            `(${result.passed} passed, ${result.failed} failed, ${result.duration_ms.toFixed(0)} ms)`;
+        addMessage(result.status === 'passed' ? 'system' : 'error', result.error ? `${summary}\n${result.error}` : summary);
     }
+    addMessage('system', `Test suite finished in ${suite.duration_ms.toFixed(0)} ms.`);
+    // Structured results for automation and the console
+    window.testResults = suite;
+    console.log('Test results:', JSON.stringify(suite));
 }
 
 // Handle user input
@@ -501,11 +913,25 @@ sendButton.addEventListener('click', handleUserInput);
 
 userInput.addEventListener('keypress', (e) => {
     if (e.key === 'Enter') {
+        // While a passage is being revealed, Enter skips ahead instead of sending
+        if (typewriter && typewriter.isBusy()) {
+            typewriter.skip();
+            return;
+        }
         handleUserInput();
     }
 });
 
+// Any key or a click on the chat reveals narrated text right away
+document.addEventListener('keydown', (e) => {
+    if (e.target !== userInput && typewriter) {
+        typewriter.skip();
+    }
+});
+chatOutput.addEventListener('click', () => typewriter && typewriter.skip());
+
 runScriptButton.addEventListener('click', runPythonProgram);
+stopButton.addEventListener('click', stopProgram);
 clearButton.addEventListener('click', clearChat);
 
 // Initialize on page load
@@ -527,6 +953,13 @@ window.addEventListener('unhandledrejection', function(event) {
     });
 });
 
+// Save program files before the page goes away (the pending sync may not get to run)
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden' && programFiles) {
+        programFiles.flush();
+    }
+});
+
 document.addEventListener('DOMContentLoaded', () => {
     console.log('DOM Content Loaded - Starting initialization...');
     try {
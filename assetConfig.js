@@ -0,0 +1,72 @@
+// assetConfig.js
+// Where the interpreter is loaded from and how it is cached - the one place to change hosting
+//
+// PYODIDE_BASE_URL defaults to the jsDelivr CDN. To self-host, copy the "full" folder of
+// the Pyodide release next to the app (e.g. as pyodide/) and point PYODIDE_BASE_URL at
+// it, or try a location without editing anything with ?pyodide=<url>. sw.js caches the
+// files under that URL and the app files listed in asset-manifest.json (see
+// buildManifest.js) cache-first, so a repeat visit starts without waiting for the network.
+
+import { debug } from './debugUtils.js';
+
+const MODULE_NAME = 'assetConfig.js';
+const PYODIDE_VERSION = '0.24.1';
+const PYODIDE_BASE_URL = `https://cdn.jsdelivr.net/pyodide/v${PYODIDE_VERSION}/full/`;
+// Bump to throw away every cached asset; app files are also replaced whenever the manifest changes
+const CACHE_VERSION = 1;
+const SERVICE_WORKER = 'sw.js';
+
+/**
+ * Absolute URL of the Pyodide distribution, ending in '/'
+ * @returns {string} - PYODIDE_BASE_URL or the ?pyodide= override
+ */
+function pyodideBaseUrl() {
+    const override = new URLSearchParams(window.location.search).get('pyodide');
+    const url = new URL(override || PYODIDE_BASE_URL, window.location.href).href;
+    return url.endsWith('/') ? url : `${url}/`;
+}
+
+/**
+ * Load pyodide.js, which defines loadPyodide()
+ * @param {string} baseUrl - Result of pyodideBaseUrl()
+ * @returns {Promise} - Resolves once loadPyodide is available
+ */
+function loadPyodideScript(baseUrl) {
+    if (typeof window.loadPyodide === 'function') {
+        return Promise.resolve();
+    }
+    return new Promise((resolve, reject) => {
+        const script = document.createElement('script');
+        script.src = `${baseUrl}pyodide.js`;
+        // A CORS response is one the service worker can check and cache
+        script.crossOrigin = 'anonymous';
+        script.onload = () => resolve();
+        script.onerror = () => reject(new Error(`Could not load ${script.src}`));
+        document.head.appendChild(script);
+    });
+}
+
+/**
+ * Register the caching service worker (not on file:// pages or with ?nocache=true)
+ * @param {string} baseUrl - Result of pyodideBaseUrl()
+ * @returns {Promise<ServiceWorkerRegistration|null>}
+ */
+async function registerAssetCache(baseUrl) {
+    const disabled = new URLSearchParams(window.location.search).get('nocache') === 'true';
+    if (disabled || !('serviceWorker' in navigator) || !window.isSecureContext) {
+        debug(MODULE_NAME, 'Asset cache not available');
+        return null;
+    }
+    // The settings travel in the worker's URL, so changing them installs a fresh worker
+    const url = `${SERVICE_WORKER}?v=${CACHE_VERSION}&pyodide=${encodeURIComponent(baseUrl)}`;
+    try {
+        const registration = await navigator.serviceWorker.register(url);
+        debug(MODULE_NAME, `Asset cache registered (v${CACHE_VERSION}, ${baseUrl})`);
+        return registration;
+    } catch (error) {
+        console.warn('Asset cache registration failed:', error);
+        return null;
+    }
+}
+
+export { PYODIDE_VERSION, CACHE_VERSION, pyodideBaseUrl, loadPyodideScript, registerAssetCache };
@@ -0,0 +1,239 @@
+// benchTransform.js
+// Scaling benchmark for transformPythonForPyodide and concatenateConsecutivePrints
+// Usage: node benchTransform.js [--sizes 100,250,500,1000,2000] [--depth 25] [--repeat 3] [--json]
+//
+// Generates synthetic story programs with thousands of functions, deep async call
+// chains through pause()/menu()-style helpers and long runs of prints, then times
+// both stages at increasing sizes. Inputs are prepared here (the concatenator's is the
+// transform's output) and handed over in a file, and every measurement runs in a fresh
+// Node.js process that only reads it, so the reported peak memory (max RSS growth)
+// belongs to that stage alone.
+
+import { spawnSync } from 'child_process';
+import fs from 'fs';
+import os from 'os';
+import path from 'path';
+import { fileURLToPath } from 'url';
+import { transformPythonForPyodide } from './transformInputToAsync.js';
+import { concatenateConsecutivePrints } from './concatenatePrints.js';
+
+const __filename = fileURLToPath(import.meta.url);
+
+const DEFAULTS = {
+    sizes: [100, 250, 500, 1000, 2000],
+    depth: 25,      // length of each async call chain ending in pause()/menu()
+    printRun: 8,    // consecutive prints per scene
+    repeat: 3
+};
+
+/**
+ * Generate a synthetic program
+ * @param {number} functions - Approximate number of functions
+ * @param {Object} options - { depth, printRun }
+ * @returns {{code: string, expectedAsync: number}} - Source and how many functions must end up async
+ */
+function generateProgram(functions, { depth = DEFAULTS.depth, printRun = DEFAULTS.printRun } = {}) {
+    const lines = [
+        'import time',
+        '',
+        'def pause(prompt="Press Enter to continue..."):',
+        '    input(prompt)',
+        '',
+        'def wait(s=2.0):',
+        '    time.sleep(s)',
+        '',
+        'def menu(title, options):',
+        '    print(title)',
+        '    while True:',
+        '        try:',
+        '            choice = int(input("Choose: "))',
+        '            if 1 <= choice <= len(options):',
+        '                return options[choice-1][1]',
+        '        except ValueError:',
+        '            pass',
+        '',
+        'state = {"visits": 0}',
+        ''
+    ];
+    let expectedAsync = 3;
+    let made = 3;
+    let chain = 0;
+
+    while (made < functions) {
+        // A chain: scene_<c>_0 pauses, every following scene calls the previous one
+        for (let d = 0; d < depth && made < functions; d++, made++) {
+            lines.push(`def scene_${chain}_${d}():`);
+            for (let p = 0; p < printRun; p++) {
+                lines.push(`    print("Chain ${chain}, scene ${d}, line ${p}: IT'S MONDAY AGAIN.")`);
+            }
+            lines.push('    state["visits"] += 1');
+            if (d === 0) {
+                lines.push(chain % 2 === 0 ? '    pause()' : '    wait(0.5)');
+            } else {
+                lines.push(`    scene_${chain}_${d - 1}()`);
+            }
+            lines.push('');
+            expectedAsync++;
+        }
+        // Pure helpers that must stay synchronous
+        for (let h = 0; h < 3 && made < functions; h++, made++) {
+            lines.push(`def helper_${chain}_${h}(x):`);
+            lines.push(`    return x * ${h + 2} + state["visits"]`);
+            lines.push('');
+        }
+        chain++;
+    }
+
+    lines.push('def title_screen():');
+    lines.push('    choice = menu("START", [("GO", scene_0_0)])');
+    lines.push('    choice()');
+    lines.push('');
+    lines.push('if __name__ == "__main__":');
+    lines.push('    title_screen()');
+    expectedAsync++;
+
+    return { code: lines.join('\n'), expectedAsync };
+}
+
+const STAGES = {
+    transform: code => transformPythonForPyodide(code),
+    concatenate: code => concatenateConsecutivePrints(code)
+};
+
+// Runs in the child process: time one stage on the input prepared by the parent
+function measure(stage, size, inputFile, expectedAsync) {
+    const input = fs.readFileSync(inputFile, 'utf8');
+    if (global.gc) global.gc();
+    const rssBefore = process.memoryUsage().rss;
+
+    const started = process.hrtime.bigint();
+    const output = STAGES[stage](input);
+    const ms = Number(process.hrtime.bigint() - started) / 1e6;
+
+    // maxRSS is reported in kilobytes
+    const peakBytes = Math.max(0, process.resourceUsage().maxRSS * 1024 - rssBefore);
+    const result = { stage, size, lines: input.split('\n').length, ms, peakBytes };
+    if (stage === 'transform') {
+        result.asyncFunctions = (output.match(/^\s*async\s+def\b/gm) || []).length;
+        result.expectedAsync = expectedAsync;
+    }
+    return result;
+}
+
+function runChild(stage, size, inputFile, expectedAsync) {
+    const child = spawnSync(process.execPath, [
+        '--expose-gc', __filename, '--child', stage, String(size), inputFile, String(expectedAsync)
+    ], { encoding: 'utf8', maxBuffer: 64 * 1024 * 1024 });
+    if (child.status !== 0) {
+        throw new Error(`Measurement of ${stage} at ${size} functions failed:\n${child.stderr}`);
+    }
+    return JSON.parse(child.stdout);
+}
+
+// Least-squares slope of log(time) against log(size): ~1 is linear, ~2 quadratic
+function scalingExponent(points) {
+    const xs = points.map(p => Math.log(p.size));
+    const ys = points.map(p => Math.log(Math.max(p.ms, 1e-3)));
+    const mx = xs.reduce((a, b) => a + b, 0) / xs.length;
+    const my = ys.reduce((a, b) => a + b, 0) / ys.length;
+    let num = 0;
+    let den = 0;
+    for (let i = 0; i < xs.length; i++) {
+        num += (xs[i] - mx) * (ys[i] - my);
+        den += (xs[i] - mx) ** 2;
+    }
+    return den === 0 ? NaN : num / den;
+}
+
+function parseArgs(argv) {
+    const options = { ...DEFAULTS, json: false };
+    for (let i = 0; i < argv.length; i++) {
+        switch (argv[i]) {
+            case '--sizes': options.sizes = argv[++i].split(',').map(Number); break;
+            case '--depth': options.depth = Number(argv[++i]); break;
+            case '--print-run': options.printRun = Number(argv[++i]); break;
+            case '--repeat': options.repeat = Number(argv[++i]); break;
+            case '--json': options.json = true; break;
+        }
+    }
+    return options;
+}
+
+// Write the input of each stage at each size: { size: { expectedAsync, files: { stage: path } } }
+function prepareInputs(options, dir) {
+    const inputs = {};
+    for (const size of options.sizes) {
+        const { code, expectedAsync } = generateProgram(size, options);
+        // The concatenator runs on transformed code in the real pipeline
+        const stageInputs = { transform: code, concatenate: transformPythonForPyodide(code) };
+        const files = {};
+        for (const [stage, input] of Object.entries(stageInputs)) {
+            files[stage] = path.join(dir, `${stage}-${size}.py`);
+            fs.writeFileSync(files[stage], input);
+        }
+        inputs[size] = { expectedAsync, files };
+    }
+    return inputs;
+}
+
+function runBenchmark(options) {
+    const dir = fs.mkdtempSync(path.join(os.tmpdir(), 'bench-transform-'));
+    try {
+        return runStages(options, prepareInputs(options, dir));
+    } finally {
+        fs.rmSync(dir, { recursive: true, force: true });
+    }
+}
+
+function runStages(options, inputs) {
+    const curves = {};
+    for (const stage of Object.keys(STAGES)) {
+        curves[stage] = [];
+        for (const size of options.sizes) {
+            // Keep the fastest run: the others mostly measure noise
+            let best = null;
+            for (let r = 0; r < options.repeat; r++) {
+                const result = runChild(stage, size, inputs[size].files[stage], inputs[size].expectedAsync);
+                if (!best || result.ms < best.ms) best = result;
+            }
+            curves[stage].push(best);
+            if (!options.json) {
+                const asyncInfo = stage === 'transform'
+                    ? `  async ${best.asyncFunctions}/${best.expectedAsync}`
+                    : '';
+                console.log(`${stage.padEnd(12)} ${String(size).padStart(6)} fn ${String(best.lines).padStart(7)} lines ` +
+                    `${best.ms.toFixed(1).padStart(10)} ms ${(best.ms * 1000 / best.lines).toFixed(2).padStart(8)} µs/line ` +
+                    `${(best.peakBytes / 1048576).toFixed(1).padStart(7)} MB peak${asyncInfo}`);
+            }
+        }
+    }
+
+    const report = { options, curves, exponents: {} };
+    for (const [stage, points] of Object.entries(curves)) {
+        report.exponents[stage] = scalingExponent(points);
+    }
+    if (options.json) {
+        console.log(JSON.stringify(report, null, 2));
+    } else {
+        console.log('');
+        for (const [stage, exponent] of Object.entries(report.exponents)) {
+            console.log(`${stage}: time grows ~ n^${exponent.toFixed(2)}`);
+        }
+        const incomplete = curves.transform.filter(p => p.asyncFunctions < p.expectedAsync);
+        if (incomplete.length > 0) {
+            console.log(`Warning: transform left functions synchronous at ${incomplete.map(p => p.size).join(', ')} functions`);
+        }
+    }
+    return report;
+}
+
+export { generateProgram, runBenchmark };
+
+if (process.argv[1] === __filename) {
+    const argv = process.argv.slice(2);
+    if (argv[0] === '--child') {
+        console.log(JSON.stringify(measure(argv[1], Number(argv[2]), argv[3], Number(argv[4]))));
+    } else {
+        runBenchmark(parseArgs(argv));
+    }
+}
@@ -0,0 +1,795 @@
+"""
+Program runtime bootstrap
+Builds the print/input/sleep/persistence builtins every program runs with.
+
+In the browser, app.js sets the js_* host functions as globals and runs this file,
+which installs the runtime into builtins. The CPython tools (runner.py) import it
+and build the same runtime around Python host functions, one namespace per program.
+
+Several programs can share one interpreter and event loop as sessions: start_session()
+runs each as an asyncio task whose context (the current_runtime variable) routes the
+interpreter-wide print/input/open/save_data/sys.stdout to that session's host,
+so output of modules the program imports, and of tasks it starts, lands in the right place.
+A host that gives each session a data directory (js_data_dir) gets relative paths of open()
+and the os module resolved there, so sessions never share or change the process's cwd.
+
+Every input() is a turn: the program's state is kept per turn (StateHistory), and typing
+/undo or /rewind N at a prompt takes the program back to an earlier one.
+
+Only strings, numbers and booleans cross to the host: saved data travels as JSON text
+and input arrives through deliver_input(), so no proxy is created per call that the
+host or the runtime would have to release.
+"""
+
+import ast
+import asyncio
+import builtins
+import contextvars
+import copy
+import errno
+import inspect
+import io
+import json
+import os
+import sys
+import time
+import types
+
+# Seconds a sliced loop may run before it gives the host a turn (see the transform's timeslice option)
+TIME_SLICE = 0.05
+
+# Names of the host functions a runtime is built from
+HOST_FUNCTIONS = (
+    "js_print", "js_input",
+    "js_save_data", "js_load_data", "js_clear_data",
+    "js_record_event", "js_event_count", "js_clear_events",
+)
+
+# Typed at a prompt: back to the prompt before it, or N prompts back (see StateHistory)
+UNDO_COMMAND = "/undo"
+REWIND_COMMAND = "/rewind"
+# Turns between full indexes of the state history
+CHECKPOINT_EVERY = 16
+# Full indexes the history keeps; the turns before the oldest are dropped and can't be rewound to
+MAX_CHECKPOINTS = 8
+# Program values the history keeps; functions, modules, files and the like are not state
+STATE_TYPES = (type(None), bool, int, float, complex, str, bytes, tuple, frozenset, list, dict, set)
+
+class ChatStream(io.TextIOBase):
+    """Line-buffered text stream that sends its output to the chat as messages of one type
+
+    Writes are collected until a newline, so print(..., end="") and sys.stdout.write()
+    fragments become one message and only complete lines cross to the host. flush()
+    sends a pending partial line; the runtime flushes before input() and sleep() and
+    the wrapped program flushes when it ends.
+    """
+
+    encoding = "utf-8"
+
+    def __init__(self, emit, msg_type, before_emit=None):
+        super().__init__()
+        self._emit = emit
+        self.msg_type = msg_type
+        # Called before every message, so another stream's pending output comes first
+        self._before_emit = before_emit
+        self._pending = []
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return False
+
+    def write(self, text):
+        if not isinstance(text, str):
+            raise TypeError(f"write() argument must be str, not {type(text).__name__}")
+        if "\n" not in text:
+            self._pending.append(text)
+            return len(text)
+        # Everything up to the last newline goes out as one message, the rest waits
+        head, _, tail = text.rpartition("\n")
+        self._pending.append(head)
+        self._send()
+        if tail:
+            self._pending.append(tail)
+        return len(text)
+
+    def flush(self):
+        if self._pending:
+            self._send()
+
+    def _send(self):
+        text = "".join(self._pending)
+        self._pending = []
+        if self._before_emit is not None:
+            self._before_emit()
+        self._emit(text, self.msg_type)
+
+# The runtime of the session the running task belongs to (see start_session)
+current_runtime = contextvars.ContextVar("current_runtime", default=None)
+
+def _to_json(data):
+    def default(value):
+        if isinstance(value, (set, frozenset)):
+            return sorted(value, key=repr)
+        raise TypeError(f"save_data() can't store {type(value).__name__} values")
+    return json.dumps(data, default=default)
+
+def _program_frame():
+    """The frame of the wrapped program's main(), whose locals hold the program's functions and state"""
+    frame = sys._getframe(1)
+    found = None
+    # Outermost async main(): a program may have its own main(), and a host its own sync one
+    while frame is not None:
+        if frame.f_code.co_name == "main" and frame.f_code.co_flags & inspect.CO_COROUTINE:
+            found = frame
+        frame = frame.f_back
+    return found
+
+class RewindRequested(BaseException):
+    """Raised out of input() to run the program again up to an earlier turn; a BaseException so the program's own handlers don't catch it"""
+
+# Marks a dict variable of the history, whose keys are kept as entries of their own
+_DICT = object()
+
+def _same(a, b):
+    try:
+        return type(a) is type(b) and bool(a == b)
+    except Exception:
+        return False
+
+def _flatten(variables):
+    """{path: value} of a program's state: (name,) for each variable, (name, key) for each key of a dict one"""
+    flat = {}
+    for name, value in variables.items():
+        if name.startswith("_") or not isinstance(value, STATE_TYPES):
+            continue
+        if type(value) is dict:
+            flat[(name,)] = _DICT
+            for key, item in value.items():
+                flat[(name, key)] = item
+        else:
+            flat[(name,)] = value
+    return flat
+
+def _unflatten(flat):
+    variables = {}
+    for path, value in flat.items():
+        if len(path) == 1:
+            variables[path[0]] = {} if value is _DICT else value
+    for path, value in flat.items():
+        if len(path) == 2:
+            variables[path[0]][path[1]] = value
+    return variables
+
+class StateHistory:
+    """The program's state at every turn (input()), copy-on-write
+
+    A turn stores copies of only the values that changed since the turn before and
+    shares the rest with earlier turns. Dicts are tracked key by key, so
+    state["snooze_count"] += 1 costs one copied int, not a copy of the state dict.
+    Every CHECKPOINT_EVERY turns a full index of references is kept, so looking up a
+    turn applies at most that many changes. Only the last MAX_CHECKPOINTS indexes are
+    kept, with the turns from the oldest of them on: a long game holds a bounded window
+    of turns, and first is the earliest one that can still be looked up.
+    """
+
+    def __init__(self):
+        # Per turn from `first` on: (changed values, removed paths, full index or None)
+        self._turns = []
+        self.first = 0
+        # path -> value as of the last turn
+        self._current = {}
+
+    def __len__(self):
+        return self.first + len(self._turns)
+
+    def record(self, variables):
+        """Add a turn with the state in variables (a program's locals)"""
+        flat = _flatten(variables)
+        changes = {}
+        for path, value in flat.items():
+            if path in self._current and _same(self._current[path], value):
+                continue
+            if value is _DICT:
+                changes[path] = value
+                continue
+            try:
+                changes[path] = copy.deepcopy(value)
+            except Exception:
+                # Holds something that can't be copied: not kept
+                continue
+        removed = [path for path in self._current if path not in flat]
+        for path in removed:
+            del self._current[path]
+        self._current.update(changes)
+        checkpoint = None
+        if len(self) % CHECKPOINT_EVERY == 0:
+            checkpoint = dict(self._current)
+            if len(self) - self.first >= MAX_CHECKPOINTS * CHECKPOINT_EVERY:
+                del self._turns[:CHECKPOINT_EVERY]
+                self.first += CHECKPOINT_EVERY
+        self._turns.append((changes, removed, checkpoint))
+
+    def _flat_at(self, turn):
+        start = turn - turn % CHECKPOINT_EVERY - self.first
+        end = turn - self.first
+        flat = dict(self._turns[start][2])
+        for changes, removed, _ in self._turns[start + 1:end + 1]:
+            for path in removed:
+                flat.pop(path, None)
+            flat.update(changes)
+        return flat
+
+    def at(self, turn):
+        """{name: value} of the state at a turn (first or later); the values are the history's, copy them before changing them"""
+        return _unflatten(self._flat_at(turn))
+
+    def truncate(self, turns):
+        """Forget every turn from turns on (0, or first or later)"""
+        if turns >= len(self):
+            return
+        if turns <= self.first:
+            # Nothing kept before it: the next turn recorded is a full index again
+            self._turns = []
+            self.first = turns
+            self._current = {}
+            return
+        del self._turns[turns - self.first:]
+        self._current = self._flat_at(turns - 1)
+
+def _restore_state(variables, state):
+    """Put the containers of a program's locals back the way they were at a turn
+
+    Names can't be rebound in a running frame, but dicts, lists and sets are changed in
+    place, which covers state dicts; other values are reproduced by the replay itself.
+    """
+    for name, value in state.items():
+        current = variables.get(name)
+        value = copy.deepcopy(value)
+        if type(current) is dict and type(value) is dict:
+            current.clear()
+            current.update(value)
+        elif type(current) is list and type(value) is list:
+            current[:] = value
+        elif type(current) is set and type(value) is set:
+            current.clear()
+            current.update(value)
+
+def _rewind_steps(text):
+    """Turns to go back for an /undo or /rewind N answer, 0 for a /rewind without a valid N, None for any other answer"""
+    words = text.strip().split()
+    if words == [UNDO_COMMAND]:
+        return 1
+    if words and words[0] == REWIND_COMMAND:
+        if len(words) == 2 and words[1].isdigit():
+            return int(words[1])
+        return 0
+    return None
+
+# os functions taking one or two paths, resolved against a session's directory (see _session_os)
+OS_PATH_FUNCTIONS = (
+    "access", "chmod", "listdir", "lstat", "makedirs", "mkdir", "open", "remove", "removedirs",
+    "rmdir", "scandir", "stat", "truncate", "unlink", "utime", "walk",
+)
+OS_TWO_PATH_FUNCTIONS = ("rename", "renames", "replace")
+OS_PATH_MODULE_FUNCTIONS = (
+    "abspath", "exists", "getatime", "getctime", "getmtime", "getsize", "isdir", "isfile",
+    "islink", "lexists", "realpath",
+)
+
+def _session_path(cwd, path):
+    """path as the session sees it: relative ones start at its directory, absolute ones and file descriptors stay"""
+    if cwd["path"] is None or isinstance(path, int):
+        return path
+    path = os.fspath(path)
+    base = os.fsencode(cwd["path"]) if isinstance(path, bytes) else cwd["path"]
+    return os.path.join(base, path)
+
+def _session_os(cwd):
+    """A private copy of the os module whose relative paths and getcwd()/chdir() use cwd["path"]
+
+    pathlib, shutil and the like still use the real module; programs reach their files
+    through open() and os, as the examples do.
+    """
+    def resolving(function, paths=1):
+        def resolved(*args, **kwargs):
+            if not args and function.__name__ in ("listdir", "scandir"):
+                args = (".",)
+            args = tuple(_session_path(cwd, arg) for arg in args[:paths]) + args[paths:]
+            return function(*args, **kwargs)
+        resolved.__name__ = function.__name__
+        resolved.__doc__ = function.__doc__
+        return resolved
+
+    def getcwd():
+        return cwd["path"]
+
+    def getcwdb():
+        return os.fsencode(cwd["path"])
+
+    def chdir(path):
+        target = os.path.normpath(_session_path(cwd, path))
+        if not os.path.isdir(target):
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        cwd["path"] = os.fsdecode(target)
+
+    path_module = types.ModuleType(os.path.__name__, os.path.__doc__)
+    path_module.__dict__.update(os.path.__dict__)
+    for name in OS_PATH_MODULE_FUNCTIONS:
+        setattr(path_module, name, resolving(getattr(os.path, name)))
+    path_module.samefile = resolving(os.path.samefile, paths=2)
+
+    os_module = types.ModuleType("os", os.__doc__)
+    os_module.__dict__.update(os.__dict__)
+    for name in OS_PATH_FUNCTIONS:
+        if hasattr(os, name):
+            setattr(os_module, name, resolving(getattr(os, name)))
+    for name in OS_TWO_PATH_FUNCTIONS:
+        setattr(os_module, name, resolving(getattr(os, name), paths=2))
+    os_module.getcwd = getcwd
+    os_module.getcwdb = getcwdb
+    os_module.chdir = chdir
+    os_module.path = path_module
+    return os_module
+
+def create_runtime(host):
+    """Build the builtins of a program from a mapping of host function names to callables"""
+    js_print = host["js_print"]
+    js_load_data = host["js_load_data"]
+    js_save_data = host["js_save_data"]
+    # Input: either js_input(prompt), awaitable, or js_request_input(prompt), answered through
+    # deliver_input(text) - one long-lived callable instead of a promise per prompt
+    js_input = host.get("js_input")
+    js_request_input = host.get("js_request_input")
+    # Optional: hosts without their own sleep (the browser) use asyncio's
+    js_sleep = host.get("js_sleep")
+    # Optional: content packs (see contentPacks.js)
+    js_load_pack = host.get("js_load_pack")
+    js_prefetch_pack = host.get("js_prefetch_pack")
+    # Optional: typewriter output (see typewriter.js), returns an awaitable that completes once shown
+    js_stream = host.get("js_stream")
+    # Optional: True once the user pressed Stop
+    js_stop_requested = host.get("js_stop_requested")
+
+    def check_stop():
+        if js_stop_requested is not None and js_stop_requested():
+            raise KeyboardInterrupt("Program stopped")
+
+    # The passage still being revealed; input() and sleep() wait for it so pacing is kept
+    streaming = {"pending": None}
+
+    async def finish_stream():
+        pending = streaming["pending"]
+        if pending is not None:
+            streaming["pending"] = None
+            await pending
+
+    # Turns of the current run: the state kept at each and the answer given. A rewind runs
+    # the program again, answering from `answers` up to the turn `until`, where the state
+    # kept for that turn is put back. What the host told the program in between (saved data,
+    # event counts) is kept in `results`, and `marks` is how many of them came before each
+    # turn, so the replay sees what the first run saw even though the host's copy has moved on
+    history = StateHistory()
+    answers = []
+    results = []
+    marks = []
+    rewind = {"turn": 0, "result": 0, "until": None, "state": None}
+
+    def replaying():
+        return rewind["until"] is not None
+
+    def muted():
+        # Output of the turns before the one rewound to is left out; the last answer
+        # replayed leads up to that turn's prompt, and its output is shown again
+        return replaying() and rewind["turn"] < rewind["until"]
+
+    def emit(text, msg_type='python'):
+        if not muted():
+            js_print(text, msg_type)
+
+    # The program's sys.stdout/sys.stderr: chat messages, stderr ones shown as errors
+    stdout = ChatStream(emit, 'python')
+    stderr = ChatStream(emit, 'error', before_emit=stdout.flush)
+
+    def flush_output():
+        stdout.flush()
+        stderr.flush()
+
+    # Override print
+    def new_print(*args, sep=' ', end='\n', file=None, flush=False, msg_type='python', stream=False):
+        sep = ' ' if sep is None else sep
+        end = '\n' if end is None else end
+        text = sep.join(str(arg) for arg in args) + end
+        if file is None and msg_type == 'python' and not stream:
+            file = stdout
+        if file is not None:
+            file.write(text)
+            if flush:
+                file.flush()
+            return
+        # A message of its own (narration, errors, system messages) after the output before it
+        flush_output()
+        if text.endswith('\n'):
+            text = text[:-1]
+        if stream and js_stream is not None:
+            if not muted():
+                streaming["pending"] = js_stream(text, msg_type)
+        else:
+            emit(text, msg_type)
+
+    def narrate(*args, **kwargs):
+        """print() that reveals the text like a typewriter where the host supports it"""
+        new_print(*args, stream=True, **kwargs)
+
+    # The prompt waiting for deliver_input()
+    waiting = {"future": None}
+
+    def deliver_input(text, error=None):
+        """Answer the pending input() with text, or fail it with an error message"""
+        future, waiting["future"] = waiting["future"], None
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(EOFError(str(error)))
+        else:
+            future.set_result("" if text is None else str(text))
+
+    async def ask(prompt):
+        try:
+            if js_request_input is not None:
+                waiting["future"] = asyncio.get_running_loop().create_future()
+                js_request_input(str(prompt) if prompt else "")
+                result = await waiting["future"]
+            else:
+                result = await js_input(str(prompt) if prompt else "")
+        except Exception:
+            # Stopping rejects the pending input
+            check_stop()
+            raise
+        return str(result) if result is not None else ""
+
+    def record_turn():
+        marks.append(len(results))
+        frame = _program_frame()
+        history.record(frame.f_locals if frame is not None else {})
+        del frame
+
+    def go_back(turn, steps):
+        """Start a replay up to `steps` turns before `turn`"""
+        target = turn - steps
+        rewind["state"] = history.at(target)
+        history.truncate(target)
+        del answers[target:]
+        del results[marks[target]:]
+        del marks[target:]
+        rewind["until"] = target
+        new_print(f"Back {steps} turn{'s' if steps != 1 else ''}, to turn {target + 1}", msg_type='system')
+        raise RewindRequested()
+
+    # Override input - this will work with await in the async context
+    async def new_input(prompt=""):
+        flush_output()
+        await finish_stream()
+        turn = rewind["turn"]
+        rewind["turn"] += 1
+        if replaying():
+            if turn < rewind["until"]:
+                return answers[turn]
+            # Caught up with the turn rewound to
+            frame = _program_frame()
+            if frame is not None:
+                _restore_state(frame.f_locals, rewind["state"])
+            del frame
+            rewind["until"] = rewind["state"] = None
+        record_turn()
+        while True:
+            answer = await ask(prompt)
+            steps = _rewind_steps(answer)
+            if steps is None:
+                break
+            if steps <= 0:
+                new_print(f"Usage: {REWIND_COMMAND} N, where N is how many turns to go back (1 or more)", msg_type='system')
+            elif turn == 0:
+                new_print("Nothing to go back to: this is the first turn", msg_type='system')
+            elif turn - steps < history.first:
+                limit = turn - history.first
+                new_print(f"Can only go back {limit} turn{'s' if limit != 1 else ''}", msg_type='system')
+            else:
+                go_back(turn, steps)
+        answers.append(answer)
+        return answer
+
+    async def run_main(main):
+        """Run the wrapped program's main(), again from the start for every rewind"""
+        history.truncate(0)
+        answers.clear()
+        results.clear()
+        marks.clear()
+        try:
+            while True:
+                rewind["turn"] = rewind["result"] = 0
+                try:
+                    return await main()
+                except RewindRequested:
+                    continue
+        finally:
+            rewind["until"] = rewind["state"] = None
+
+    # Async time.sleep(): the transform rewrites the calls it awaits to _sleep(), the others
+    # (and library code) keep the blocking time.sleep
+    async def new_sleep(seconds):
+        flush_output()
+        await finish_stream()
+        if muted():
+            # A turn being replayed: its pauses were already sat through
+            check_stop()
+            return
+        if js_sleep is not None:
+            await js_sleep(seconds)
+        else:
+            await asyncio.sleep(seconds)
+        check_stop()
+
+    # Yield points of sliced loops: counting is cheap, the clock is read every `every` iterations
+    slicing = {"count": 0, "last": time.monotonic()}
+
+    def yield_due(every):
+        slicing["count"] += 1
+        if slicing["count"] < every:
+            return False
+        slicing["count"] = 0
+        return time.monotonic() - slicing["last"] >= TIME_SLICE
+
+    async def yield_now():
+        """Let the page render, take input events and handle Stop"""
+        check_stop()
+        flush_output()
+        if js_sleep is not None:
+            await js_sleep(0)
+        else:
+            await asyncio.sleep(0)
+        slicing["last"] = time.monotonic()
+        check_stop()
+
+    # The transform awaits calls of unknown callables through this (choice() from a menu may
+    # be a scene that waits for input or a plain function)
+    async def maybe_await(value):
+        return await value if inspect.isawaitable(value) else value
+
+    # Saved data crosses the bridge as JSON text, never as a proxy
+    def save_data(data, key='app_data'):
+        """Save data (dicts, lists, strings, numbers...) in browser cookies"""
+        if replaying():
+            return True
+        return js_save_data(_to_json(data), key)
+
+    def host_result(function, *args):
+        """Call a host function whose result the program sees, or replay what it returned the first time"""
+        index = rewind["result"]
+        rewind["result"] += 1
+        if replaying() and index < len(results):
+            return results[index]
+        result = function(*args)
+        results.append(result)
+        return result
+
+    def load_data(key='app_data'):
+        """Load data from browser cookies as Python dicts/lists"""
+        text = host_result(js_load_data, key)
+        if text is None:
+            return None
+        try:
+            return json.loads(str(text))
+        except ValueError as e:
+            new_print(f"Error converting saved data to Python: {e}")
+            return None
+
+    # While a rewind replays, what the program saves or counts was saved or counted the first time
+    def clear_data(key='app_data'):
+        return True if replaying() else host["js_clear_data"](key)
+
+    def record_event(event, key='app_events', count=1):
+        if replaying():
+            return host_result(host["js_event_count"], event, key)
+        return host_result(host["js_record_event"], event, key, count)
+
+    def event_count(event, key='app_events'):
+        return host_result(host["js_event_count"], event, key)
+
+    def clear_events(key='app_events'):
+        if not replaying():
+            host["js_clear_events"](key)
+
+    # Content packs: compiled code by name, and the pack namespaces of the current program run
+    pack_code = {}
+    pack_run = {"frame": None, "namespaces": {}}
+
+    async def enter_scene(name):
+        """Run the function `name` of the content pack scenes/<name>.py, loading the pack on first entry"""
+        if js_load_pack is None:
+            raise RuntimeError("Content packs are not supported by this host")
+        frame = _program_frame()
+        if frame is not pack_run["frame"]:
+            # A new run of the program: packs have to see its functions and state, not the last run's
+            pack_run["frame"] = frame
+            pack_run["namespaces"] = {}
+        namespaces = pack_run["namespaces"]
+
+        if name not in namespaces:
+            # Pack code sees the program's globals and the functions/state defined in its main()
+            namespace = dict(frame.f_globals if frame is not None else sys._getframe(1).f_globals)
+            if frame is not None:
+                namespace.update(frame.f_locals)
+            if name not in pack_code:
+                source = await js_load_pack(name)
+                pack_code[name] = compile(str(source), f"<scene {name}>", "exec")
+            exec(pack_code[name], namespace)
+            namespaces[name] = namespace
+        del frame
+
+        result = namespaces[name][name]()
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    def scene(name):
+        """A menu-ready callable that enters a content pack, whose download starts right away"""
+        if name not in pack_code and js_prefetch_pack is not None:
+            js_prefetch_pack(name)
+
+        async def enter():
+            return await enter_scene(name)
+        enter.__name__ = name
+        return enter
+
+    # A private copy of the sys module, so the program's sys.stdout/sys.stderr are this
+    # runtime's streams without patching the interpreter-wide module
+    sys_module = types.ModuleType("sys", sys.__doc__)
+    sys_module.__dict__.update(sys.__dict__)
+    sys_module.stdout = stdout
+    sys_module.stderr = stderr
+
+    # Where the session's relative paths start: its data directory if the host gives it one,
+    # otherwise the process's cwd (a program of its own, as in a page or runner.py)
+    cwd = {"path": host.get("js_data_dir")}
+    os_module = _session_os(cwd) if cwd["path"] is not None else None
+
+    def session_open(file, *args, **kwargs):
+        return io.open(_session_path(cwd, file), *args, **kwargs)
+
+    real_import = builtins.__import__
+
+    def session_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if name == "sys" and level == 0:
+            return sys_module
+        if os_module is not None and level == 0 and name in ("os", "os.path"):
+            return os_module.path if name == "os.path" and fromlist else os_module
+        return real_import(name, globals, locals, fromlist, level)
+
+    runtime = {name: host[name] for name in HOST_FUNCTIONS if name in host}
+    runtime.update({
+        "print": new_print,
+        "input": new_input,
+        "narrate": narrate,
+        "open": session_open,
+        "_sleep": new_sleep,
+        "_maybe_await": maybe_await,
+        "_yield_due": yield_due,
+        "_yield_now": yield_now,
+        "_flush_output": flush_output,
+        "_deliver_input": deliver_input,
+        "_run_main": run_main,
+        "save_data": save_data,
+        "clear_data": clear_data,
+        "load_data": load_data,
+        # Event journal: cheap appends and O(1) counter lookups, safe across tabs
+        "record_event": record_event,
+        "event_count": event_count,
+        "clear_events": clear_events,
+        "enter_scene": enter_scene,
+        "scene": scene,
+        "__import__": session_import,
+    })
+    return runtime
+
+class RoutedStream(io.TextIOBase):
+    """sys.stdout/sys.stderr of a shared interpreter: the stream of the running session"""
+
+    def __init__(self, name, fallback):
+        super().__init__()
+        self.name = name
+        self.fallback = fallback
+
+    def target(self):
+        runtime = _routed_runtime()
+        return getattr(runtime["__import__"]("sys"), self.name) if runtime is not None else self.fallback
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return False
+
+    def write(self, text):
+        return self.target().write(text)
+
+    def flush(self):
+        self.target().flush()
+
+# Interpreter-wide state of install(): the runtime used outside of sessions and the originals
+_routing = {"default": None, "originals": None}
+
+def _routed_runtime():
+    return current_runtime.get() or _routing["default"]
+
+def _route(name):
+    original = _routing["originals"].get(name)
+
+    def resolve_route():
+        """The function a call would go to right now"""
+        runtime = _routed_runtime()
+        if runtime is not None and name in runtime:
+            return runtime[name]
+        if original is None:
+            raise RuntimeError(f"{name}() is only available in a program session")
+        return original
+
+    def routed(*args, **kwargs):
+        return resolve_route()(*args, **kwargs)
+    routed.__name__ = name
+    routed.resolve_route = resolve_route
+    return routed
+
+def _install_routes(runtime):
+    """Route the interpreter-wide builtins and sys.stdout/sys.stderr to the running session (once)"""
+    if _routing["originals"] is not None:
+        return
+    names = [name for name in runtime if name != "__import__" and not name.startswith("js_")]
+    _routing["originals"] = {name: getattr(builtins, name, None) for name in names}
+    for name in names:
+        setattr(builtins, name, _route(name))
+    sys.stdout = RoutedStream("stdout", sys.stdout)
+    sys.stderr = RoutedStream("stderr", sys.stderr)
+
+def install(runtime):
+    """Make a runtime the interpreter-wide default, used by code running outside of any session"""
+    _install_routes(runtime)
+    _routing["default"] = runtime
+
+def compile_program(code, filename="<session>"):
+    """Compile wrapped program code once, for hosts that start many sessions of one program"""
+    return compile(code, filename, "exec", flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT)
+
+async def run_session(code, runtime, filename="<session>"):
+    """Run wrapped program code, or compile_program()'s result, with the interpreter-wide I/O routed to runtime; run it as a task of its own"""
+    # Tasks copy the context they're created in, so this only holds for this task and those it starts
+    current_runtime.set(runtime)
+    namespace = create_namespace(runtime)
+    compiled = code if isinstance(code, types.CodeType) else compile_program(code, filename)
+    result = eval(compiled, namespace)
+    if inspect.iscoroutine(result):
+        await result
+    return namespace
+
+def start_session(code, runtime, filename="<session>"):
+    """Start a program session on the running event loop; returns its asyncio task"""
+    _install_routes(runtime)
+    return asyncio.ensure_future(run_session(code, runtime, filename))
+
+def create_namespace(runtime):
+    """Fresh program globals whose builtins are routed to the runtime, isolated from other programs"""
+    session_builtins = dict(builtins.__dict__)
+    session_builtins.update(runtime)
+    # The raw js_* host functions are part of the runtime, so they stay reachable like in the browser
+    return {"__name__": "__main__", "__builtins__": session_builtins, "PYODIDE_ENV": True}
+
+if "js_print" in globals():
+    # Running as the browser bootstrap: the js_* host functions were set by app.js
+    _page_runtime = create_runtime(globals())
+    install(_page_runtime)
+    # app.js keeps one proxy of this for the whole session (see requestInput)
+    deliver_input = _page_runtime["_deliver_input"]
+
+    PYODIDE_ENV = True
+    print("Python environment ready!")
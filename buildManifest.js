@@ -0,0 +1,93 @@
+// buildManifest.js
+// Writes asset-manifest.json: the app files sw.js precaches, with their SHA-256 digests
+// Usage: node buildManifest.js [--pyodide-dir DIR] [--out asset-manifest.json]
+//
+// Run it whenever the deployed files change. The manifest's version is a digest of all
+// file digests, so any change makes sw.js build a new cache next to the old one; files
+// that don't match their digest keep the new cache from being used at all. With
+// --pyodide-dir, the files of a self-hosted Pyodide distribution get digests too and
+// are checked when sw.js first caches them.
+
+import crypto from 'crypto';
+import fs from 'fs';
+import path from 'path';
+import { fileURLToPath } from 'url';
+
+const PROJECT_DIR = path.dirname(fileURLToPath(import.meta.url));
+const MANIFEST_FILE = 'asset-manifest.json';
+
+// Files the page loads, relative to the project directory
+const APP_PATTERNS = [/^[^/]+\.(html|css|js|py)$/, /^scenes\/[^/]+\.py$/, /^test\/[^/]+\.(py|json)$/];
+// Tools and the service worker itself, which the browser fetches on its own.
+// Command-line tools added to the project belong here too, or every visitor downloads them
+const NOT_SERVED = new Set([
+    'sw.js', 'buildManifest.js', 'devServer.js', 'benchTransform.js', 'quickTest.js',
+    'testConcatenatePrints.js', 'testTransform.js', 'testSaveStore.js', 'testEventJournal.js', 'runner.py', 'run_tests.py', 'build_prefix.py',
+    'explore_paths.py', 'server.py', 'loadgen.py'
+]);
+
+function digest(file) {
+    return 'sha256-' + crypto.createHash('sha256').update(fs.readFileSync(file)).digest('base64');
+}
+
+// Relative paths of the files under dir, with '/' separators
+function listFiles(dir, prefix = '') {
+    const files = [];
+    for (const entry of fs.readdirSync(path.join(dir, prefix), { withFileTypes: true })) {
+        const relative = prefix ? `${prefix}/${entry.name}` : entry.name;
+        if (entry.isDirectory()) {
+            if (!entry.name.startsWith('.') && entry.name !== 'node_modules') {
+                files.push(...listFiles(dir, relative));
+            }
+        } else {
+            files.push(relative);
+        }
+    }
+    return files.sort();
+}
+
+/**
+ * Build the manifest
+ * @param {Object} options - { rootDir, pyodideDir }
+ * @returns {Object} - { version, files: { path: digest }, pyodide: { path: digest } }
+ */
+function buildManifest({ rootDir = PROJECT_DIR, pyodideDir = null } = {}) {
+    const files = {};
+    for (const file of listFiles(rootDir)) {
+        if (!NOT_SERVED.has(file) && APP_PATTERNS.some(pattern => pattern.test(file))) {
+            files[file] = digest(path.join(rootDir, file));
+        }
+    }
+    const pyodide = {};
+    if (pyodideDir) {
+        for (const file of listFiles(pyodideDir)) {
+            pyodide[file] = digest(path.join(pyodideDir, file));
+        }
+    }
+    const version = crypto.createHash('sha256')
+        .update(JSON.stringify([files, pyodide]))
+        .digest('hex')
+        .slice(0, 16);
+    return { version, files, pyodide };
+}
+
+function writeManifest(options = {}, out = path.join(options.rootDir || PROJECT_DIR, MANIFEST_FILE)) {
+    const manifest = buildManifest(options);
+    fs.writeFileSync(out, JSON.stringify(manifest, null, 2) + '\n');
+    return manifest;
+}
+
+export { buildManifest, writeManifest, MANIFEST_FILE };
+
+if (process.argv[1] === fileURLToPath(import.meta.url)) {
+    const args = process.argv.slice(2);
+    const option = name => {
+        const index = args.indexOf(name);
+        return index === -1 ? null : args[index + 1];
+    };
+    const pyodideDir = option('--pyodide-dir');
+    const out = option('--out') || path.join(PROJECT_DIR, MANIFEST_FILE);
+    const manifest = writeManifest({ pyodideDir }, out);
+    console.log(`Wrote ${out}: version ${manifest.version}, ${Object.keys(manifest.files).length} app files, ` +
+        `${Object.keys(manifest.pyodide).length} Pyodide files`);
+}
@@ -0,0 +1,154 @@
+"""
+Ahead-of-time opening screens
+Runs the program of each page under CPython (through runner.py) up to its first input()
+and embeds the captured messages in the page between the program-prefix markers, so the
+opening screen is shown while Pyodide is still downloading. app.js shows the captured
+messages with their original timing, then resumes once the interpreter is ready: the
+real run reproduces them silently, without waiting in time.sleep(), and takes over at
+the captured prompt (see programPrefix.js).
+
+A program that reads saved data, statistics or content packs before its first input
+depends on the player's browser and is not captured. Run this again whenever the
+program or the runtime (the transform and bootstrap.py) changes; a page whose prefix doesn't
+match their digests ignores it.
+
+Usage: python build_prefix.py [page.html ...] [--check]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import html
+import json
+import os
+import re
+import sys
+import tempfile
+
+import runner
+
+PREFIX_START = "<!-- program-prefix:start -->"
+PREFIX_END = "<!-- program-prefix:end -->"
+PREFIX_BLOCK = re.compile(re.escape(PREFIX_START) + r".*?" + re.escape(PREFIX_END), re.DOTALL)
+PROGRAM_INPUT = re.compile(r'<input[^>]*id="python-file"[^>]*value="([^"]*)"')
+# Host functions whose results depend on the player's saved state
+STATEFUL_CALLS = ("load_data", "save_data", "clear_data", "record_event", "event_count", "clear_events", "load_pack")
+# Files that shape the transcript besides the program itself (RUNTIME_FILES in programPrefix.js)
+RUNTIME_FILES = ("bootstrap.py", "prepareProgram.js", "transformInputToAsync.js", "concatenatePrints.js")
+
+class PrefixComplete(BaseException):
+    """Raised at the first input(); a BaseException so the program's own handlers don't catch it"""
+
+class PrefixSession(runner.Session):
+    """Session that stops at the first prompt and notes calls that make the prefix player-specific"""
+
+    def __init__(self, **kwargs):
+        super().__init__(inputs=[], **kwargs)
+        self.prompt = None
+        self.stateful = []
+
+    async def input(self, prompt=""):
+        self.prompt = {"text": str(prompt), "t": self.clock}
+        raise PrefixComplete()
+
+def _stateful(name):
+    def call(self, *args, **kwargs):
+        self.stateful.append(name)
+        return getattr(runner.Session, name)(self, *args, **kwargs)
+    return call
+
+for _name in STATEFUL_CALLS:
+    setattr(PrefixSession, _name, _stateful(_name))
+
+def digest(source):
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+def runtime_digest():
+    """Digest of the runtime files, as they are served (newlines untranslated)"""
+    sources = []
+    for name in RUNTIME_FILES:
+        with open(os.path.join(runner.PROJECT_DIR, name), encoding="utf-8", newline="") as f:
+            sources.append(f.read())
+    return digest("\n".join(sources))
+
+def capture(path):
+    """Transcript of a program up to its first input(), or None with the reason it can't be captured"""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    code = runner.prepare_programs([path])[path]
+    path = os.path.abspath(path)
+    session = PrefixSession(program_path=path, prepared_code=code)
+    cwd = os.getcwd()
+    # Files the program writes don't belong in the repository
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        os.chdir(scratch_dir)
+        try:
+            asyncio.run(runner.run_code(code, session, path))
+        except PrefixComplete:
+            pass
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}"
+        finally:
+            os.chdir(cwd)
+    if session.stateful:
+        return None, f"calls {', '.join(sorted(set(session.stateful)))}() before its first input"
+    return {
+        "program": os.path.basename(path),
+        "sha256": digest(source),
+        "runtime": runtime_digest(),
+        "transcript": [{"type": m["type"], "text": m["text"], "t": m["t"]} for m in session.transcript],
+        "prompt": session.prompt,
+    }, None
+
+def prefix_block(prefix):
+    if prefix is None:
+        return f"{PREFIX_START}\n    {PREFIX_END}"
+    # "</" would end the script element early
+    data = json.dumps(prefix, ensure_ascii=False).replace("</", "<\\/")
+    return f'{PREFIX_START}\n    <script type="application/json" id="program-prefix">{data}</script>\n    {PREFIX_END}'
+
+def embedded_prefix(page):
+    match = re.search(r'<script type="application/json" id="program-prefix">(.*?)</script>', page, re.DOTALL)
+    return json.loads(match.group(1).replace("<\\/", "</")) if match else None
+
+def update_page(page_path, check=False):
+    """Capture the page's program and embed it; with check, only report whether the page is up to date"""
+    with open(page_path, encoding="utf-8") as f:
+        page = f.read()
+    if not PREFIX_BLOCK.search(page):
+        print(f"{page_path}: no {PREFIX_START} marker, skipped", file=sys.stderr)
+        return True
+    match = PROGRAM_INPUT.search(page)
+    program = html.unescape(match.group(1)) if match else "main.py"
+    program_path = os.path.join(os.path.dirname(os.path.abspath(page_path)), program)
+
+    prefix, reason = capture(program_path)
+    if prefix is None:
+        print(f"{page_path}: {program} not captured ({reason})", file=sys.stderr)
+    if check:
+        current = embedded_prefix(page)
+        up_to_date = current == prefix
+        print(f"{page_path}: prefix of {program} is {'up to date' if up_to_date else 'stale'}")
+        return up_to_date
+
+    updated = PREFIX_BLOCK.sub(lambda _: prefix_block(prefix), page, count=1)
+    if updated != page:
+        with open(page_path, "w", encoding="utf-8") as f:
+            f.write(updated)
+    if prefix is not None:
+        print(f"{page_path}: embedded {len(prefix['transcript'])} messages of {program}, "
+              f"up to {prefix['prompt']['text'] if prefix['prompt'] else 'the end'!r}")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed each page's opening screen, captured under CPython")
+    parser.add_argument("pages", nargs="*", default=[os.path.join(runner.PROJECT_DIR, "index.html")],
+                        help="pages with program-prefix markers (default: index.html)")
+    parser.add_argument("--check", action="store_true", help="only check that the embedded prefixes are current")
+    args = parser.parse_args()
+    results = [update_page(page, check=args.check) for page in args.pages]
+    if not all(results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,14 @@
 import { debug } from './debugUtils.js';
 
 const MODULE_NAME = 'concatenatePrints.js';
+// print() keyword arguments (sep=, end=, stream=...) only apply to their own call
+const PRINT_KEYWORD = /(^|,)\s*(sep|end|file|flush|stream|msg_type)\s*=(?!=)/;
+
+// Match a print statement that may be merged with its neighbours
+function matchPlainPrint(line) {
+    const match = line.match(/^(\s*)print\((.+)\)$/);
+    return match && !PRINT_KEYWORD.test(match[2]) ? match : null;
+}
 
 /**
  * Concatenate consecutive print() statements into single print() calls
@@ -35,7 +43,7 @@ function concatenateConsecutivePrints(code) {
         debug(MODULE_NAME, `Line ${i + 1}: "${trimmedLine}"`);
         
         // Check if this line is a print statement
-        const printMatch = line.match(/^(\s*)print\((.+)\)$/);
+        const printMatch = matchPlainPrint(line);
         
         if (printMatch) {
             const indent = printMatch[1];
@@ -49,7 +57,7 @@ function concatenateConsecutivePrints(code) {
             debug(MODULE_NAME, `  🔍 Looking for consecutive prints starting from line ${j + 1}...`);
             while (j < lines.length) {
                 const nextLine = lines[j];
-                const nextPrintMatch = nextLine.match(/^(\s*)print\((.+)\)$/);
+                const nextPrintMatch = matchPlainPrint(nextLine);
                 
                 // If next line is also a print with same indentation, collect it
                 if (nextPrintMatch && nextPrintMatch[1] === indent) {
@@ -0,0 +1,85 @@
+// contentPacks.js
+// Lazy loading of story content packs
+//
+// A program can keep scenes in separate files under scenes/ next to it. A pack is
+// fetched and transformed the first time it is needed and compiled the first time the
+// program enters it with enter_scene("name"), which then calls the pack's function of
+// the same name (see bootstrap.py). scene("name") returns a menu-ready callable and
+// starts fetching its pack right away, and whenever the program waits for input the
+// packs referenced by code already loaded are prefetched, so startup only pays for
+// the opening scene and entering the next one rarely waits for the network.
+
+import { debug } from './debugUtils.js';
+import { prepareProgram } from './prepareProgram.js';
+
+const MODULE_NAME = 'contentPacks.js';
+const PACK_DIR = 'scenes/';
+const PACK_REFERENCE = /\b(?:enter_scene|scene)\(\s*["'](\w+)["']/g;
+const ASYNC_DEF = /^\s*async\s+def\s+(\w+)/gm;
+
+// Names of the packs a piece of code enters or offers in a menu
+function referencedPacks(code) {
+    return [...code.matchAll(PACK_REFERENCE)].map(match => match[1]);
+}
+
+// Names of the functions the transform made async, which pack code has to await
+function asyncFunctionNames(code) {
+    return [...code.matchAll(ASYNC_DEF)].map(match => match[1]);
+}
+
+/**
+ * Create the pack loader of a program
+ * @param {string} programFile - Path of the program, packs are looked up in scenes/ next to it
+ * @param {string} preparedProgram - The program after prepareProgram()
+ * @param {Object} options - More options for prepareProgram(), e.g. { timeslice: 1000 }
+ * @returns {Object} - { loadPack(name), prefetchPack(name), prefetchReferenced() }
+ */
+function createPackLoader(programFile, preparedProgram, options = {}) {
+    const baseUrl = programFile.slice(0, programFile.lastIndexOf('/') + 1) + PACK_DIR;
+    const asyncNames = asyncFunctionNames(preparedProgram);
+    const referenced = new Set(referencedPacks(preparedProgram));
+    // name -> Promise of the prepared pack code
+    const packs = new Map();
+
+    function loadPack(name) {
+        if (!packs.has(name)) {
+            debug(MODULE_NAME, `Fetching content pack '${name}'`);
+            const started = performance.now();
+            const loading = fetch(`${baseUrl}${name}.py`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`Could not load scene '${name}' (HTTP ${response.status})`);
+                    }
+                    return response.text();
+                })
+                .then(code => {
+                    const prepared = prepareProgram(code, { ...options, alsoTransform: asyncNames });
+                    for (const pack of referencedPacks(prepared)) {
+                        referenced.add(pack);
+                    }
+                    debug(MODULE_NAME, `Content pack '${name}' ready in ${(performance.now() - started).toFixed(0)} ms`);
+                    return prepared;
+                });
+            // Forget failed loads so entering the scene again retries
+            loading.catch(() => packs.delete(name));
+            packs.set(name, loading);
+        }
+        return packs.get(name);
+    }
+
+    function prefetchPack(name) {
+        loadPack(name).catch(err => debug(MODULE_NAME, `Prefetch of '${name}' failed: ${err.message}`));
+    }
+
+    function prefetchReferenced() {
+        for (const name of referenced) {
+            if (!packs.has(name)) {
+                prefetchPack(name);
+            }
+        }
+    }
+
+    return { loadPack, prefetchPack, prefetchReferenced };
+}
+
+export { createPackLoader, referencedPacks, asyncFunctionNames };
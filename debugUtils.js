@@ -4,7 +4,13 @@
 const debugSettings = {
     'app.js': false,
     'concatenatePrints.js': false,
-    'transformInputToAsync.js': false
+    'contentPacks.js': false,
+    'eventJournal.js': false,
+    'prepareProgram.js': false,
+    'saveStore.js': false,
+    'testRunner.js': false,
+    'transformInputToAsync.js': false,
+    'typewriter.js': false
 };
 
 /**
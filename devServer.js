@@ -0,0 +1,107 @@
+// devServer.js
+// Local static server, a stand-in for the static host the app is deployed to
+// Usage: node devServer.js [--port 8000] [--pyodide-dir DIR] [--no-isolation]
+//
+// Serves the project directory, rebuilding asset-manifest.json on start so sw.js
+// precaches and checks the current files. --pyodide-dir serves a downloaded Pyodide
+// distribution at /pyodide/ (open the page with ?pyodide=pyodide/ to use it) and adds
+// its digests to the manifest. Pages are cross-origin isolated by default (COOP/COEP
+// headers), which gives Pyodide a SharedArrayBuffer interrupt buffer for the Stop button.
+
+import fs from 'fs';
+import http from 'http';
+import path from 'path';
+import { fileURLToPath } from 'url';
+import { writeManifest } from './buildManifest.js';
+
+const PROJECT_DIR = path.dirname(fileURLToPath(import.meta.url));
+const PYODIDE_PREFIX = '/pyodide/';
+
+const MIME_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8',
+    '.mjs': 'text/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.json': 'application/json; charset=utf-8',
+    '.py': 'text/plain; charset=utf-8',
+    '.md': 'text/plain; charset=utf-8',
+    '.txt': 'text/plain; charset=utf-8',
+    '.wasm': 'application/wasm',
+    '.zip': 'application/zip',
+    '.whl': 'application/zip',
+    '.tar': 'application/x-tar',
+    '.svg': 'image/svg+xml',
+    '.png': 'image/png',
+    '.ico': 'image/x-icon'
+};
+
+/**
+ * Create the server
+ * @param {Object} options - { rootDir, pyodideDir, isolation }
+ * @returns {http.Server}
+ */
+function createDevServer({ rootDir = PROJECT_DIR, pyodideDir = null, isolation = true } = {}) {
+    return http.createServer((req, res) => {
+        const { pathname } = new URL(req.url, 'http://localhost');
+        let base = rootDir;
+        let relative = decodeURIComponent(pathname);
+        if (pyodideDir && relative.startsWith(PYODIDE_PREFIX)) {
+            base = pyodideDir;
+            relative = relative.slice(PYODIDE_PREFIX.length);
+        }
+        if (relative.endsWith('/')) {
+            relative += 'index.html';
+        }
+        const file = path.join(base, relative);
+        // No escaping the served directory with ../
+        if (path.relative(base, file).startsWith('..')) {
+            res.writeHead(403).end();
+            return;
+        }
+
+        const headers = {
+            'Content-Type': MIME_TYPES[path.extname(file)] || 'application/octet-stream',
+            // Always revalidate: caching is the service worker's job
+            'Cache-Control': 'no-cache',
+            'Access-Control-Allow-Origin': '*'
+        };
+        if (isolation) {
+            headers['Cross-Origin-Opener-Policy'] = 'same-origin';
+            headers['Cross-Origin-Embedder-Policy'] = 'require-corp';
+            headers['Cross-Origin-Resource-Policy'] = 'cross-origin';
+        }
+        fs.stat(file, (error, stat) => {
+            if (error || !stat.isFile()) {
+                res.writeHead(404, { 'Content-Type': 'text/plain' }).end('Not found');
+                console.log(`404 ${pathname}`);
+                return;
+            }
+            res.writeHead(200, { ...headers, 'Content-Length': stat.size });
+            if (req.method === 'HEAD') {
+                res.end();
+            } else {
+                fs.createReadStream(file).pipe(res);
+            }
+        });
+    });
+}
+
+export { createDevServer };
+
+if (process.argv[1] === fileURLToPath(import.meta.url)) {
+    const args = process.argv.slice(2);
+    const option = name => {
+        const index = args.indexOf(name);
+        return index === -1 ? null : args[index + 1];
+    };
+    const port = Number(option('--port')) || 8000;
+    const pyodideDir = option('--pyodide-dir') ? path.resolve(option('--pyodide-dir')) : null;
+    const manifest = writeManifest({ pyodideDir });
+    console.log(`asset-manifest.json version ${manifest.version}`);
+    createDevServer({ pyodideDir, isolation: !args.includes('--no-isolation') }).listen(port, () => {
+        console.log(`Serving ${PROJECT_DIR} at http://localhost:${port}/`);
+        if (pyodideDir) {
+            console.log(`Self-hosted Pyodide: http://localhost:${port}/?pyodide=pyodide/`);
+        }
+    });
+}
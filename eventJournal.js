@@ -0,0 +1,209 @@
+// eventJournal.js
+// Append-only event journal with in-memory counters for play statistics
+//
+// Every page load is its own journal session. A session only ever writes its own
+// `s_<id>` field under the journal key, kept in a cookie of its own (see writeFieldCookie
+// in saveStore.js), so two tabs recording events at the same time can never overwrite
+// each other's increments. Counters are aggregated in memory when a journal is first
+// opened and then updated incrementally, which makes eventCount() a plain lookup and
+// recording an event a single cookie write.
+//
+// Sessions of closed tabs are folded into the `base` counts once they are a day old, or
+// once there are more than MAX_SESSIONS of them (frequent reloads), oldest first. The ids
+// of folded sessions are kept in `folded`, and a tab re-reads its own field before writing
+// it (only checking that its cookie is still there): if another tab folded it meanwhile,
+// it carries on in a new session instead of writing counts back that are already in the base.
+//
+// Stored session entry: { t: last write time (ms), c: { event: count }, l: [events since compaction] }
+
+import { debug } from './debugUtils.js';
+import { readSaveData, writeSaveField, writeFieldCookie, hasFieldCookie, removeSaveField, clearSaveData } from './saveStore.js';
+
+const MODULE_NAME = 'eventJournal.js';
+
+// Fold a session's log into its counts once it holds this many events
+const COMPACT_EVERY = 16;
+// Sessions untouched for this long belong to closed tabs and are folded into the base counts
+const STALE_SESSION_MS = 24 * 60 * 60 * 1000;
+// Sessions kept besides this tab's; older ones are folded even if they are recent
+const MAX_SESSIONS = 8;
+// Ids of folded sessions remembered, so a session written again after its fold is ignored
+const MAX_FOLDED = 32;
+const BASE_FIELD = 'base';
+const FOLDED_FIELD = 'folded';
+const SESSION_PREFIX = 's_';
+
+function newSessionField() {
+    return SESSION_PREFIX + Date.now().toString(36) + Math.random().toString(36).slice(2, 8);
+}
+
+function newSession() {
+    return { t: Date.now(), c: {}, l: [] };
+}
+
+// key -> { totals: Map(event -> count), field: this tab's session field, session: { t, c, l }, written }
+const journals = new Map();
+
+function addCounts(totals, counts) {
+    for (const [event, count] of Object.entries(counts)) {
+        totals.set(event, (totals.get(event) || 0) + count);
+    }
+}
+
+function addLog(totals, log) {
+    for (const event of log) {
+        totals.set(event, (totals.get(event) || 0) + 1);
+    }
+}
+
+// Fold sessions into the base counts and remove them
+function foldSessions(key, fields) {
+    // Read again right before writing, so a fold another tab just made is built on, not lost
+    const stored = readSaveData(key) || {};
+    const base = { ...(stored[BASE_FIELD] || {}) };
+    const folded = [...(stored[FOLDED_FIELD] || [])];
+    let count = 0;
+    for (const field of fields) {
+        const entry = stored[field];
+        if (entry && !folded.includes(field)) {
+            for (const event of entry.l || []) {
+                base[event] = (base[event] || 0) + 1;
+            }
+            for (const [event, n] of Object.entries(entry.c || {})) {
+                base[event] = (base[event] || 0) + n;
+            }
+            folded.push(field);
+            count++;
+        }
+    }
+    if (count > 0) {
+        writeSaveField(key, BASE_FIELD, base);
+        writeSaveField(key, FOLDED_FIELD, folded.slice(-MAX_FOLDED));
+    }
+    for (const field of fields) {
+        removeSaveField(key, field);
+    }
+    debug(MODULE_NAME, `Folded ${count} session(s) of '${key}' into the base counts`);
+}
+
+// Read a journal from storage, folding sessions of closed tabs into the base counts
+function loadJournal(key, previous = null) {
+    let stored = readSaveData(key) || {};
+    const now = Date.now();
+    const folded = stored[FOLDED_FIELD] || [];
+    let field = previous ? previous.field : newSessionField();
+    if (previous && previous.written && (!stored[field] || folded.includes(field))) {
+        // Folded by another tab: what it held is in the base now
+        field = newSessionField();
+    }
+
+    const others = Object.entries(stored)
+        .filter(([name]) => name.startsWith(SESSION_PREFIX) && name !== field)
+        .sort(([, a], [, b]) => (b.t || 0) - (a.t || 0));
+    const toFold = others
+        .filter(([name, entry], index) =>
+            index >= MAX_SESSIONS || now - (entry.t || 0) > STALE_SESSION_MS || folded.includes(name))
+        .map(([name]) => name);
+    if (toFold.length > 0) {
+        foldSessions(key, toFold);
+        stored = readSaveData(key) || {};
+    }
+
+    const totals = new Map();
+    addCounts(totals, stored[BASE_FIELD] || {});
+    for (const [name, entry] of Object.entries(stored)) {
+        if (name.startsWith(SESSION_PREFIX) && name !== field) {
+            addCounts(totals, entry.c || {});
+            addLog(totals, entry.l || []);
+        }
+    }
+
+    const session = stored[field] || newSession();
+    const written = Boolean(stored[field]);
+    addCounts(totals, session.c);
+    addLog(totals, session.l);
+    return { totals, field, session, written };
+}
+
+function getJournal(key) {
+    if (!journals.has(key)) {
+        journals.set(key, loadJournal(key));
+    }
+    return journals.get(key);
+}
+
+// Another tab may have folded this tab's session since it was last written, removing its cookie
+function checkSession(key, journal) {
+    if (!journal.written) return;
+    if (!hasFieldCookie(key, journal.field)) {
+        debug(MODULE_NAME, `Session of '${key}' was folded by another tab, starting a new one`);
+        journal.field = newSessionField();
+        journal.session = newSession();
+        journal.written = false;
+    }
+}
+
+/**
+ * Append an event to the journal
+ * @param {string} event - Event name, e.g. 'play'
+ * @param {string} key - Journal storage key
+ * @param {number} count - How many occurrences to record
+ * @returns {number} - The updated count for the event
+ */
+function recordEvent(event, key = 'app_events', count = 1) {
+    const journal = getJournal(key);
+    checkSession(key, journal);
+    const { session } = journal;
+
+    if (count === 1) {
+        session.l.push(event);
+    } else {
+        session.c[event] = (session.c[event] || 0) + count;
+    }
+    if (session.l.length >= COMPACT_EVERY) {
+        for (const logged of session.l) {
+            session.c[logged] = (session.c[logged] || 0) + 1;
+        }
+        session.l = [];
+        debug(MODULE_NAME, `Compacted session log of '${key}'`);
+    }
+    session.t = Date.now();
+    writeFieldCookie(key, journal.field, session);
+    journal.written = true;
+
+    const total = (journal.totals.get(event) || 0) + count;
+    journal.totals.set(event, total);
+    return total;
+}
+
+/**
+ * Get the aggregated count of an event
+ * @param {string} event - Event name
+ * @param {string} key - Journal storage key
+ * @returns {number}
+ */
+function eventCount(event, key = 'app_events') {
+    return getJournal(key).totals.get(event) || 0;
+}
+
+/**
+ * Remove every recorded event of a journal
+ * @param {string} key - Journal storage key
+ */
+function clearEvents(key = 'app_events') {
+    clearSaveData(key);
+    journals.set(key, { totals: new Map(), field: newSessionField(), session: newSession(), written: false });
+}
+
+// Pick up events other tabs recorded while this one was in the background
+// (in sharedHost.js every tab's events go through the one journal, there is no document)
+if (typeof document !== 'undefined') {
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState !== 'visible') return;
+        for (const [key, journal] of journals) {
+            journals.set(key, loadJournal(key, journal));
+        }
+    });
+}
+
+export { recordEvent, eventCount, clearEvents };
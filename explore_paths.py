@@ -0,0 +1,259 @@
+"""
+Story path explorer
+Plays every menu path of a program headlessly (through runner.py, with the browser's
+transform, builtins and a virtual clock) and reports every reachable ending, dead end
+and exception. Paths are explored breadth first, one level of answers at a time fanned
+out across a process pool; each path is replayed from the start up to its next prompt.
+
+The answers tried at a prompt are the numbered options of the menu printed before it,
+y and n for a "(y/n)" question, and Enter for anything else. A prompt reached with the
+same program state (the `state` dict of the program), at the same place as an earlier
+path is a repeat: it is reported but not explored again, which keeps loops like
+"MAIN MENU" finite. The place is the program line that asked and the line that called
+it (say pause() in start_demo), not the whole stack: a scene entered again from deeper
+in the game, like TRY AGAIN after a game over, is a repeat of its first visit.
+
+Usage: python explore_paths.py [program.py] [-j N] [--max-depth N] [--timeout S]
+                               [--ending TEXT ...] [--state-var NAME] [--json REPORT.json]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+
+import bootstrap
+import runner
+
+# Output that marks an ending of the demo game; the program finishing is always one
+ENDING_MARKERS = ("GAME OVER", "DEMO COMPLETE")
+MENU_OPTION = re.compile(r"^\s*(\d+)\.\s+(.+?)\s*$", re.MULTILINE)
+YES_NO = re.compile(r"\((\w+)/(\w+)\)")
+ENTER = ""
+# Filename prefix of content pack code (see enter_scene in bootstrap.py)
+PACK_FILENAME_PREFIX = "<scene "
+# Program lines that tell two prompts apart: the input() call and its caller
+PLACE_DEPTH = 2
+# Content pack code of this worker process, transformed once (see ExploreSession.load_pack)
+pack_cache = {}
+
+class PromptReached(BaseException):
+    """Raised at the first unscripted input(); a BaseException so the program's own handlers don't catch it"""
+
+class ExploreSession(runner.Session):
+    """Session that answers the scripted path and stops at the prompt after it"""
+
+    def __init__(self, path, state_var, **kwargs):
+        super().__init__(inputs=path, **kwargs)
+        self.state_var = state_var
+        self.prompt = None
+        self.state = None
+        self.place = None
+        # Index of the first message after the last answer
+        self.step_start = 0
+
+    async def input(self, prompt=""):
+        if self.inputs:
+            value = await super().input(prompt)
+            self.step_start = len(self.transcript)
+            return value
+        frame = bootstrap._program_frame()
+        if frame is not None:
+            state = frame.f_locals.get(self.state_var, frame.f_globals.get(self.state_var))
+            self.state = json.dumps(state, sort_keys=True, default=repr)
+        self.place = program_place(self.program_path)
+        del frame
+        self.prompt = str(prompt)
+        raise PromptReached()
+
+    async def load_pack(self, name):
+        if name not in pack_cache:
+            pack_cache[name] = await super().load_pack(name)
+        return pack_cache[name]
+
+def program_place(program_path, depth=PLACE_DEPTH):
+    """The innermost program lines on the stack, e.g. ['pause:10', 'start_demo:184']"""
+    place = []
+    frame = sys._getframe(1)
+    while frame is not None and len(place) < depth:
+        filename = frame.f_code.co_filename
+        if filename == program_path or filename.startswith(PACK_FILENAME_PREFIX):
+            place.append(f"{frame.f_code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return place
+
+def state_key(state, place, prompt):
+    return hashlib.sha256(f"{state}\0{place}\0{prompt}".encode("utf-8")).hexdigest()[:16]
+
+def answers_for(prompt, output):
+    """[(answer, label)] to try at a prompt, from the menu printed before it"""
+    for text in reversed(output):
+        options = MENU_OPTION.findall(text)
+        if options:
+            return [(number, label) for number, label in options]
+    yes_no = YES_NO.search(prompt)
+    if yes_no:
+        return [(yes_no.group(1), yes_no.group(1)), (yes_no.group(2), yes_no.group(2))]
+    return [(ENTER, "(enter)")]
+
+def ending_of(transcript, start, markers):
+    """Name of the ending the output since start shows, if any: the marker and the line leading up to it"""
+    lines = []
+    for index, message in enumerate(transcript):
+        if message["type"] in ("user", "system"):
+            continue
+        for line in message["text"].split("\n"):
+            line = line.strip()
+            for marker in markers:
+                if index >= start and marker in line:
+                    return f"{line} ({lines[-1]})" if lines else line
+            if re.search(r"\w", line):
+                lines.append(line)
+    return None
+
+def explore_path(program, code, path, state_var, markers, timeout):
+    """Worker: play one path and describe where it ends up"""
+    session = ExploreSession(path, state_var, program_path=program, prepared_code=code)
+    started = time.perf_counter()
+    status, error = "prompt", None
+    # Files the program writes land in a scratch directory, not the repository
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        os.chdir(scratch_dir)
+        try:
+            asyncio.run(asyncio.wait_for(runner.run_code(code, session, program), timeout))
+            status = "finished"
+        except PromptReached:
+            pass
+        except asyncio.TimeoutError:
+            status, error = "timeout", f"Timed out after {timeout} s"
+        except Exception as e:
+            status, error = "error", f"{type(e).__name__}: {e}"
+        finally:
+            os.chdir(cwd)
+    transcript = session.transcript
+    output = [m["text"] for m in transcript[session.step_start:] if m["type"] not in ("user", "system")]
+    ending = ending_of(transcript, session.step_start, markers)
+    if status == "finished" and ending is None:
+        last = [line.strip() for text in output for line in text.split("\n") if line.strip()]
+        ending = f"program finished ({last[-1] if last else 'no output'})"
+    return {
+        "path": path,
+        "status": status,
+        "error": error,
+        "prompt": session.prompt,
+        "key": state_key(session.state, session.place, session.prompt) if status == "prompt" else None,
+        "answers": answers_for(session.prompt, output) if status == "prompt" else [],
+        "ending": ending,
+        "output_messages": len(output),
+        "duration_ms": (time.perf_counter() - started) * 1000,
+        "virtual_seconds": session.clock,
+    }
+
+def explore(program, jobs=None, max_depth=60, timeout=10.0, markers=ENDING_MARKERS, state_var="state"):
+    """Explore every path of a program, returns the report"""
+    program = os.path.abspath(program)
+    code = runner.prepare_programs([program])[program]
+    started = time.perf_counter()
+    seen = {}
+    nodes = []
+    endings, dead_ends, exceptions = {}, [], []
+    # Each entry: (answers so far, their labels, key of the prompt they were given at)
+    frontier = [([], [], None)]
+    depth = 0
+    with multiprocessing.Pool(jobs or os.cpu_count()) as pool:
+        while frontier:
+            pending = [
+                (labels, parent, pool.apply_async(explore_path, (program, code, path, state_var, markers, timeout)))
+                for path, labels, parent in frontier
+            ]
+            frontier = []
+            for labels, parent, pending_result in pending:
+                try:
+                    node = pending_result.get(timeout + 5)
+                except multiprocessing.TimeoutError:
+                    # Stuck in a CPU loop: the asyncio timeout inside the worker never got a chance
+                    pool.terminate()
+                    raise RuntimeError(f"Path {' > '.join(labels) or '(start)'} never returned to the event loop")
+                node["labels"] = labels
+                nodes.append(node)
+                route = " > ".join(labels) or "(start)"
+                if node["ending"]:
+                    ending = endings.setdefault(node["ending"], {"ending": node["ending"], "paths": 0, "shortest": route})
+                    ending["paths"] += 1
+                if node["status"] in ("error", "timeout"):
+                    exceptions.append({"error": node["error"], "path": route})
+                    continue
+                if node["status"] != "prompt":
+                    continue
+                if node["key"] == parent and node["output_messages"] == 0:
+                    dead_ends.append({"reason": f"no progress at {node['prompt']!r}", "path": route})
+                    continue
+                if node["key"] in seen:
+                    node["repeat_of"] = seen[node["key"]]
+                    continue
+                seen[node["key"]] = route
+                if depth >= max_depth:
+                    dead_ends.append({"reason": f"depth limit ({max_depth} answers)", "path": route})
+                    continue
+                for answer, label in node["answers"]:
+                    frontier.append((node["path"] + [answer], labels + [label], node["key"]))
+            depth += 1
+    return {
+        "program": os.path.basename(program),
+        "duration_ms": (time.perf_counter() - started) * 1000,
+        "paths": len(nodes),
+        "states": len(seen),
+        "depth": depth,
+        "endings": sorted(endings.values(), key=lambda e: e["ending"]),
+        "dead_ends": dead_ends,
+        "exceptions": exceptions,
+        "nodes": nodes,
+    }
+
+def format_report(report, slowest=10):
+    """Human-readable summary of an exploration"""
+    lines = [
+        f"Explored {report['paths']} paths of {report['program']} ({report['states']} distinct states, "
+        f"{report['depth']} levels) in {report['duration_ms'] / 1000:.2f} s",
+        f"\nEndings ({len(report['endings'])}):",
+    ]
+    lines += [f"  {e['ending']}: {e['paths']} paths, shortest: {e['shortest']}" for e in report["endings"]]
+    lines.append(f"\nDead ends ({len(report['dead_ends'])}):")
+    lines += [f"  {d['reason']}: {d['path']}" for d in report["dead_ends"]]
+    lines.append(f"\nExceptions ({len(report['exceptions'])}):")
+    lines += [f"  {e['error']}: {e['path']}" for e in report["exceptions"]]
+    lines.append(f"\nSlowest paths (wall ms, virtual s):")
+    for node in sorted(report["nodes"], key=lambda n: -n["duration_ms"])[:slowest]:
+        lines.append(f"  {node['duration_ms']:8.1f} {node['virtual_seconds']:7.1f}  {' > '.join(node['labels']) or '(start)'}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Explore every menu path of a program")
+    parser.add_argument("program", nargs="?", default=os.path.join(runner.PROJECT_DIR, "main.py"),
+                        help="program to explore (default: main.py)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--max-depth", type=int, default=60, help="most answers in one path")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds before a path is abandoned")
+    parser.add_argument("--ending", action="append", metavar="TEXT",
+                        help=f"output that marks an ending (default: {', '.join(ENDING_MARKERS)})")
+    parser.add_argument("--state-var", default="state", help="program variable whose value identifies a state")
+    parser.add_argument("--json", metavar="REPORT.json", help="also write the full report, with every path")
+    args = parser.parse_args()
+
+    report = explore(args.program, jobs=args.jobs, max_depth=args.max_depth, timeout=args.timeout,
+                     markers=tuple(args.ending or ENDING_MARKERS), state_var=args.state_var)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if report["exceptions"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Load generator for server.py
+Opens many player connections at once, each playing a scripted path through the program
+again and again, and reports the throughput and the latency of each turn: the time from
+connecting or sending an answer until the next prompt (or the end of the program) arrives.
+Idle players can be parked at the program's first prompt alongside, to see how the server
+copes with players who are only reading.
+
+Start the server with --virtual-time, or the program's pauses make up most of each turn.
+
+Usage: python loadgen.py [answer ...] [--host HOST] [--port N] [--websocket] [-c N] [--idle N]
+                         [--duration S] [--program NAME] [--player-prefix TEXT] [--json REPORT.json]
+       (the default answers play main.py's ABOUT screen and quit)
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import urllib.parse
+
+import server
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+# Title screen, ABOUT, back to the menu, QUIT
+DEFAULT_ANSWERS = ["", "2", "", "4"]
+
+class TcpPlayer:
+    """A player on server.py's text protocol; a prompt ends with IAC GA"""
+
+    async def connect(self, host, port, program, player):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        # Asked before the program starts: which program (if there are several) and who plays
+        return ([program] if program else []) + [player]
+
+    async def next_prompt(self):
+        """The next prompt, or None once the program ended"""
+        try:
+            data = await self.reader.readuntil(server.GO_AHEAD)
+        except asyncio.IncompleteReadError:
+            return None
+        return data[:-len(server.GO_AHEAD)].decode("utf-8", "replace").rpartition("\n")[2]
+
+    async def answer(self, text):
+        self.writer.write(f"{text}\n".encode("utf-8"))
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+class WebSocketPlayer:
+    """A player on server.py's WebSocket protocol; program and player are part of the URL"""
+
+    async def connect(self, host, port, program, player):
+        query = urllib.parse.urlencode({"player": player})
+        self.websocket = await websockets.connect(f"ws://{host}:{port}/{program or ''}?{query}")
+        return []
+
+    async def next_prompt(self):
+        try:
+            while True:
+                message = json.loads(await self.websocket.recv())
+                if message["type"] == "input":
+                    return message["prompt"]
+                if message["type"] == "done":
+                    if message["error"]:
+                        raise RuntimeError(message["error"])
+                    return None
+        except websockets.exceptions.ConnectionClosed:
+            return None
+
+    async def answer(self, text):
+        await self.websocket.send(text)
+
+    async def close(self):
+        await self.websocket.close()
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def play_rounds(args, player_class, index, deadline, results):
+    """One active player: play the script, start again, until the deadline"""
+    player_name = f"{args.player_prefix}{index}" if args.player_prefix else ""
+    while time.perf_counter() < deadline:
+        player = player_class()
+        started = time.perf_counter()
+        try:
+            script = await player.connect(args.host, args.port, args.program, player_name)
+            script += list(args.answers)
+            while True:
+                prompt = await player.next_prompt()
+                results["latencies"].append((time.perf_counter() - started) * 1000)
+                if prompt is None:
+                    results["rounds"] += 1
+                    break
+                if not script:
+                    results["cut_short"] += 1
+                    break
+                if args.think:
+                    await asyncio.sleep(args.think)
+                started = time.perf_counter()
+                await player.answer(script.pop(0))
+            await player.close()
+        except (OSError, RuntimeError) as e:
+            results["errors"].append(f"{type(e).__name__}: {e}")
+            await asyncio.sleep(0.1)
+
+async def park(args, player_class, index, stop, results):
+    """One idle player: waits at the program's first prompt until the run is over"""
+    player = player_class()
+    try:
+        script = await player.connect(args.host, args.port, args.program, f"{args.player_prefix}idle{index}"
+                                      if args.player_prefix else "")
+        for answer in script:
+            await player.next_prompt()
+            await player.answer(answer)
+        if await player.next_prompt() is not None:
+            results["parked"] += 1
+        await stop.wait()
+        await player.close()
+    except (OSError, RuntimeError) as e:
+        results["errors"].append(f"{type(e).__name__}: {e}")
+
+async def run_load(args):
+    player_class = WebSocketPlayer if args.websocket else TcpPlayer
+    results = {"latencies": [], "rounds": 0, "cut_short": 0, "parked": 0, "errors": []}
+    stop = asyncio.Event()
+    idle = [asyncio.ensure_future(park(args, player_class, i, stop, results)) for i in range(args.idle)]
+    # Park the idle players before the measured run starts
+    while idle and results["parked"] + len(results["errors"]) < args.idle:
+        await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(play_rounds(args, player_class, i, deadline, results) for i in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*idle)
+    latencies = results["latencies"]
+    return {
+        "protocol": "websocket" if args.websocket else "tcp",
+        "clients": args.clients,
+        "idle": results["parked"],
+        "seconds": elapsed,
+        "rounds": results["rounds"],
+        "cut_short": results["cut_short"],
+        "turns": len(latencies),
+        "turns_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50),
+            "p90": percentile(latencies, 0.90),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies, default=0.0),
+        },
+        "errors": len(results["errors"]),
+        "first_errors": results["errors"][:10],
+    }
+
+def format_report(report):
+    latency = report["latency_ms"]
+    lines = [
+        f"{report['clients']} active and {report['idle']} idle {report['protocol']} players for {report['seconds']:.1f} s",
+        f"  {report['rounds']} rounds played ({report['cut_short']} cut short), {report['turns']} turns, "
+        f"{report['turns_per_second']:.0f} turns/s",
+        f"  Turn latency: p50 {latency['p50']:.1f} ms, p90 {latency['p90']:.1f} ms, "
+        f"p99 {latency['p99']:.1f} ms, max {latency['max']:.1f} ms",
+        f"  Errors: {report['errors']}",
+    ]
+    lines += [f"    {error}" for error in report["first_errors"]]
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark server.py with many concurrent players")
+    parser.add_argument("answers", nargs="*", default=DEFAULT_ANSWERS, help="answers each player gives, in order")
+    parser.add_argument("--host", default="127.0.0.1", help="server address")
+    parser.add_argument("--port", type=int, help=f"server port (default: {server.DEFAULT_PORT}, "
+                        f"or {server.DEFAULT_WS_PORT} with --websocket)")
+    parser.add_argument("--websocket", action="store_true", help="connect over WebSocket instead of TCP")
+    parser.add_argument("-c", "--clients", type=int, default=50, help="players playing at once")
+    parser.add_argument("--idle", type=int, default=0, help="players parked at the first prompt meanwhile")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to keep playing")
+    parser.add_argument("--think", type=float, default=0.0, metavar="S", help="seconds each player waits before answering")
+    parser.add_argument("--program", help="program to pick, if the server serves several")
+    parser.add_argument("--player-prefix", default="",
+                        help="play as PREFIX0, PREFIX1... so the server saves their data (default: without saving)")
+    parser.add_argument("--json", metavar="REPORT.json", help="also write the report as JSON")
+    args = parser.parse_args()
+    if args.websocket and websockets is None:
+        parser.error("--websocket needs the websockets package")
+    if args.port is None:
+        args.port = server.DEFAULT_WS_PORT if args.websocket else server.DEFAULT_PORT
+
+    report = asyncio.run(run_load(args))
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if report["errors"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -28,37 +28,39 @@ def menu(title, options):
         print("Invalid choice. Try again.")
 
 # Play count tracking functions
-def get_demo_stats():
-    """Get the demo statistics data from storage, or empty dict if none exists"""
-    return load_data("monday_demo_stats") or {}
+# Statistics are kept in an append-only event journal: recording an event never
+# rewrites the other counters, and two tabs playing at once don't lose increments.
+STATS_KEY = "monday_demo_events"
+
+def migrate_demo_stats():
+    """Move statistics saved by older versions of the demo into the event journal"""
+    old_stats = load_data("monday_demo_stats")
+    if old_stats:
+        if old_stats.get("play_count", 0) > 0:
+            record_event("play", STATS_KEY, old_stats["play_count"])
+        if old_stats.get("completion_count", 0) > 0:
+            record_event("complete", STATS_KEY, old_stats["completion_count"])
+        clear_data("monday_demo_stats")
 
 def get_play_count():
     """Get the number of times the demo has been played"""
-    play_data = get_demo_stats()
-    return play_data.get("play_count", 0)
+    return event_count("play", STATS_KEY)
 
 def get_completion_count():
     """Get the number of times the demo has been completed"""
-    play_data = get_demo_stats()
-    return play_data.get("completion_count", 0)
+    return event_count("complete", STATS_KEY)
 
 def increment_play_count():
-    """Increment and save the play count"""
-    play_data = get_demo_stats()
-    play_data["play_count"] = play_data.get("play_count", 0) + 1
-    save_data(play_data, "monday_demo_stats")
-    return play_data["play_count"]
+    """Record a play and return the new play count"""
+    return record_event("play", STATS_KEY)
 
 def increment_completion_count():
-    """Increment and save the completion count"""
-    play_data = get_demo_stats()
-    play_data["completion_count"] = play_data.get("completion_count", 0) + 1
-    save_data(play_data, "monday_demo_stats")
-    return play_data["completion_count"]
+    """Record a completion and return the new completion count"""
+    return record_event("complete", STATS_KEY)
 
 def clear_play_count():
     """Clear the play count and completion count (reset stats)"""
-    clear_data("monday_demo_stats")
+    clear_events(STATS_KEY)
     print("Demo statistics cleared!")
 
 # Demo game state
@@ -81,6 +83,7 @@ def title_screen():
     print("\n              DEMO VERSION")
     print(" ", "="*34)
     pause()
+    migrate_demo_stats()
     main_menu()
 
 def main_menu():
@@ -91,9 +94,8 @@ def main_menu():
             ("CLEAR STATS", clear_stats),
             ("QUIT", quit_demo)
         ])
-        # unfortunately there seems no way simple enough to programmatically convert
-        # this to async/await in Pyodide, so we just prepend `await` for select functions
-        # y'know what, let's just make everything async for consistency...
+        # choice may be a scene that waits for input or a plain function: the transform
+        # makes this await work for both, so options that never wait can stay synchronous
         await choice()
 
 def clear_stats():
@@ -177,14 +179,14 @@ def start_demo():
     else:
         print(f"\n🎮 Welcome back! This is play #{play_count}")
     
-    print("\nYOU'RE IN BED, ASLEEP.")
+    # narrate() types the story out in the browser (a plain print() elsewhere)
+    narrate("\nYOU'RE IN BED, ASLEEP.")
     pause()
-    print("IT'S 5:15 A.M.")
+    narrate("IT'S 5:15 A.M.")
     pause()
-    print("YOUR STEREO TURNS ON AND A LOCAL RADIO STATION")
-    print("IS PLAYING A TERRIBLE SONG.")
+    narrate("YOUR STEREO TURNS ON AND A LOCAL RADIO STATION\nIS PLAYING A TERRIBLE SONG.")
     pause()
-    print("WHAT A BAD WAY TO START A DAY!")
+    narrate("WHAT A BAD WAY TO START A DAY!")
     pause()
     wakeup_menu()
 
@@ -229,84 +231,10 @@ def get_up():
     pause()
     print("BUT YOU REALLY, REALLY GOTTA GO!")
     pause()
-    bathroom_menu()
+    # Later scenes live in content packs under scenes/, loaded the first time they're entered
+    enter_scene("bathroom_menu")
     return True
 
-def bathroom_menu():
-    choice = menu("   DO YOU GO?   ", [
-        ("RELIEVE SELF", relieve_self), 
-        ("HOLD IT IN", hold_it_in)
-    ])
-    # Both relieve_self and hold_it_in need async
-    await choice()
-
-def hold_it_in():
-    print("YOU WET YOUR PANTS.")
-    state["pants_wet"] = True
-    pause()
-    ed_mcmahon()
-
-def relieve_self():
-    print("AHHHHH...")
-    pause()
-    ed_mcmahon()
-
-def ed_mcmahon():
-    if not state["pants_wet"]:
-        print("ED MCMAHON SHOWS UP AT YOUR DOOR!")
-        print("HE SAYS YOU'VE WON 10 MILLION BUCKS!")
-        print("WHOO-HOO!")
-        print("YOU STUFF THE ENTIRE 10 MILLION BUCKS IN YOUR POCKET.")
-        state["has_money"] = True
-        pause()
-        breakfast_demo()
-    else:
-        print("ED MCMAHON SHOWS UP AT YOUR DOOR!")
-        print("HE SAYS YOU'VE WON 10 MILLION BUCKS!")
-        print("BUT HE SEES YOUR PANTS AND IS DISGUSTED.")
-        print("HE TAKES BACK THE MONEY AND LEAVES.")
-        pause()
-        game_over()
-
-def breakfast_demo():
-    # Increment completion count when demo is completed
-    completion_count = increment_completion_count()
-    
-    print("Now you need to get ready for school...")
-    print("But this is where the demo ends!")
-    pause()
-    print("\n" + "="*50)
-    print("         DEMO COMPLETE!")
-    print("="*50)
-    
-    # Show completion message
-    if completion_count == 1:
-        print(f"\n🎉 Congratulations! You completed the Monday demo!")
-        print("🏆 This is your first completion!")
-    else:
-        print(f"\n🎉 Demo completed! This is completion #{completion_count}!")
-        if completion_count >= 3:
-            print("🌟 You're becoming a Monday survival expert!")
-    
-    print("\nIn the full game, you would continue with:")
-    print("• Washing hands and eating breakfast")
-    print("• Packing your school bag")
-    print("• Catching the bus to school")
-    print("• Navigating classes and social situations")
-    print("• Making choices that affect your survival")
-    print("• Discovering multiple endings")
-    print("\nThe full game contains dozens of decision points")
-    print("and hilariously unexpected death scenes!")
-    print("\nPlay the full game at: https://lazyspaniard.com/monday/")
-    pause()
-    
-    choice = menu("What would you like to do?", [
-        ("PLAY AGAIN", start_demo),
-        ("MAIN MENU", main_menu),
-        ("QUIT", quit_demo)
-    ])
-    await choice()
-
 def game_over():
     print(" " + "="*30)
     print("     GAME OVER")
@@ -0,0 +1,225 @@
+"""
+Memory profiling of program runs (?memprofile=true in the browser, runner.py --memprofile)
+Runs a prepared program with tracemalloc enabled and takes a snapshot every time it asks
+for input. Between two prompts the growth is attributed to the program function whose
+line allocated it, and every prompt site (the function asking and its caller) keeps the
+memory in use at each visit, so growth that never comes back down across "PLAY AGAIN"
+cycles - nested coroutines from replays, proxies, accumulated state - gets flagged.
+"""
+
+import ast
+import builtins
+import inspect
+import json
+import sys
+import time
+import tracemalloc
+
+# Frames kept per allocation, enough to get from the allocator back to program code
+TRACE_FRAMES = 30
+# Filename prefix of content pack code (see enter_scene in bootstrap.py)
+PACK_FILENAME_PREFIX = "<scene "
+# Visits of one prompt site with growth every time before it is flagged
+MONOTONIC_VISITS = 3
+# Functions listed per checkpoint
+TOP_FUNCTIONS = 5
+
+def _display_name(code):
+    # The wrapped program's functions are locals of main()
+    name = code.co_qualname.replace("main.<locals>.", "")
+    return "<program>" if name == "main" else name
+
+class MemoryProfiler:
+    """tracemalloc snapshots at input() boundaries of one program run"""
+
+    def __init__(self, filename, on_checkpoint=None):
+        self.filename = filename
+        self.on_checkpoint = on_checkpoint
+        # filename -> [(first line, last line, function name)] of program code
+        self.line_index = {}
+        self.indexed = set()
+        self.checkpoints = []
+        self.functions = {}
+        self.previous = None
+        self.started = None
+        self.ignore = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+
+    def index_code(self, code):
+        """Remember which lines belong to which function, for code and everything nested in it"""
+        if code in self.indexed:
+            return
+        self.indexed.add(code)
+        lines = [line for _, _, line in code.co_lines() if line is not None]
+        if lines and code.co_name != "<module>":
+            self.line_index.setdefault(code.co_filename, []).append((min(lines), max(lines), _display_name(code)))
+        for const in code.co_consts:
+            if inspect.iscode(const):
+                self.index_code(const)
+
+    def is_program_code(self, code):
+        return code in self.indexed or code.co_filename.startswith(PACK_FILENAME_PREFIX)
+
+    def function_at(self, filename, lineno):
+        """Innermost program function containing a line, None for runtime/library code"""
+        best = None
+        for first, last, name in self.line_index.get(filename, ()):
+            if first <= lineno <= last and (best is None or last - first < best[1] - best[0]):
+                best = (first, last, name)
+        return best[2] if best else None
+
+    def program_frames(self):
+        """Program frames on the stack, innermost first"""
+        frames = []
+        frame = sys._getframe(1)
+        while frame is not None:
+            if self.is_program_code(frame.f_code):
+                # Pack code isn't reachable from the program's code object
+                self.index_code(frame.f_code)
+                frames.append(frame)
+            frame = frame.f_back
+        return frames
+
+    def attribute(self, snapshot):
+        """Growth since the previous snapshot, per program function"""
+        growth = {}
+        for diff in snapshot.compare_to(self.previous, "traceback"):
+            if diff.size_diff == 0:
+                continue
+            name = "(runtime)"
+            # Most recent frame last
+            for frame in reversed(diff.traceback):
+                found = self.function_at(frame.filename, frame.lineno)
+                if found:
+                    name = found
+                    break
+            growth[name] = growth.get(name, 0) + diff.size_diff
+        return growth
+
+    def checkpoint(self, prompt=""):
+        """Snapshot at an input() boundary"""
+        frames = self.program_frames()
+        site = " > ".join(f"{_display_name(f.f_code)}:{f.f_lineno}" for f in reversed(frames[:2])) or "<program>"
+        depth = len(frames)
+        del frames
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(self.ignore)
+        # In use by the program and runtime, without the profiler's own bookkeeping
+        current = sum(trace.size for trace in snapshot.traces)
+        peak = tracemalloc.get_traced_memory()[1]
+        growth = self.attribute(snapshot) if self.previous is not None else {}
+        self.previous = snapshot
+        for name, size in growth.items():
+            entry = self.functions.setdefault(name, {"growth": 0, "intervals": 0})
+            entry["growth"] += size
+            entry["intervals"] += 1
+
+        top = sorted(growth.items(), key=lambda item: -abs(item[1]))[:TOP_FUNCTIONS]
+        checkpoint = {
+            "index": len(self.checkpoints),
+            "t": time.perf_counter() - self.started,
+            "prompt": str(prompt),
+            "site": site,
+            "stack_depth": depth,
+            "current_bytes": current,
+            "peak_bytes": peak,
+            "growth": dict(top),
+        }
+        self.checkpoints.append(checkpoint)
+        if self.on_checkpoint is not None:
+            self.on_checkpoint(format_checkpoint(checkpoint))
+        return checkpoint
+
+    def monotonic_sites(self):
+        """Prompt sites whose memory in use grew on every one of at least MONOTONIC_VISITS visits"""
+        visits = {}
+        for checkpoint in self.checkpoints:
+            visits.setdefault(checkpoint["site"], []).append(checkpoint)
+        flagged = []
+        for site, seen in visits.items():
+            sizes = [c["current_bytes"] for c in seen]
+            if len(seen) >= MONOTONIC_VISITS and all(b > a for a, b in zip(sizes, sizes[1:])):
+                flagged.append({
+                    "site": site,
+                    "visits": len(seen),
+                    "first_bytes": sizes[0],
+                    "last_bytes": sizes[-1],
+                    "per_visit_bytes": (sizes[-1] - sizes[0]) // (len(seen) - 1),
+                    "stack_depths": [c["stack_depth"] for c in seen],
+                })
+        return flagged
+
+    def report(self):
+        functions = sorted(
+            ({"function": name, **entry} for name, entry in self.functions.items()),
+            key=lambda entry: -entry["growth"],
+        )
+        last = self.checkpoints[-1] if self.checkpoints else {"current_bytes": 0, "peak_bytes": 0}
+        return {
+            "filename": self.filename,
+            "checkpoints": self.checkpoints,
+            "functions": functions,
+            "monotonic_sites": self.monotonic_sites(),
+            "final_bytes": last["current_bytes"],
+            "peak_bytes": last["peak_bytes"],
+        }
+
+    def report_json(self):
+        return json.dumps(self.report())
+
+    async def run(self, code, namespace):
+        """Run wrapped program code in namespace with tracing on and input() instrumented"""
+        compiled = compile(code, self.filename, "exec", flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT)
+        self.index_code(compiled)
+
+        # The runtime's input lives in the namespace's builtins (runner.py) or in builtins (browser)
+        target = namespace.get("__builtins__", builtins)
+        if not isinstance(target, dict):
+            target = target.__dict__
+        original_input = target["input"]
+
+        async def profiled_input(prompt=""):
+            self.checkpoint(prompt)
+            return await original_input(prompt)
+
+        target["input"] = profiled_input
+        self.started = time.perf_counter()
+        tracemalloc.start(TRACE_FRAMES)
+        try:
+            self.checkpoint("<start>")
+            result = eval(compiled, namespace)
+            if inspect.iscoroutine(result):
+                await result
+        finally:
+            self.checkpoint("<end>")
+            tracemalloc.stop()
+            self.previous = None
+            target["input"] = original_input
+
+def _kb(size):
+    return f"{size / 1024:+.1f} KB"
+
+def format_checkpoint(checkpoint):
+    growth = ", ".join(f"{name} {_kb(size)}" for name, size in checkpoint["growth"].items())
+    return (f"[mem #{checkpoint['index']}] {checkpoint['current_bytes'] / 1024:.1f} KB at {checkpoint['site']} "
+            f"(depth {checkpoint['stack_depth']})" + (f": {growth}" if growth else ""))
+
+def format_report(report, limit=10):
+    """Human-readable summary of a report"""
+    lines = [
+        f"Memory profile of {report['filename']}: {len(report['checkpoints'])} checkpoints, "
+        f"final {report['final_bytes'] / 1024:.1f} KB, peak {report['peak_bytes'] / 1024:.1f} KB",
+        "Growth per function:",
+    ]
+    for entry in report["functions"][:limit]:
+        lines.append(f"  {entry['growth'] / 1024:+10.1f} KB  {entry['function']} ({entry['intervals']} intervals)")
+    if report["monotonic_sites"]:
+        lines.append("Memory grew on every visit of:")
+        for site in report["monotonic_sites"]:
+            lines.append(f"  {site['site']}: {site['visits']} visits, {site['per_visit_bytes'] / 1024:+.1f} KB per visit, "
+                         f"stack depth {site['stack_depths'][0]} -> {site['stack_depths'][-1]}")
+    else:
+        lines.append("No prompt site grew on every visit.")
+    return "\n".join(lines)
@@ -0,0 +1,188 @@
+// persistentFs.js
+// Persistent program data directory for Pyodide, backed by IndexedDB
+//
+// Files a program writes under its data directory (its working directory, so a plain
+// open("scores.txt", "w") lands there) are kept across page loads. The stored files are
+// read from IndexedDB while Pyodide is still downloading and written into the in-memory
+// filesystem once it is ready. Saving is batched: the host asks for a sync at quiet
+// moments (waiting for input, end of the program) and after SYNC_DELAY_MS without another
+// request, one pass over the directory stores the files whose size or mtime changed and
+// drops the deleted ones, all in a single transaction - nothing is done per write().
+
+import { debug } from './debugUtils.js';
+
+const MODULE_NAME = 'persistentFs.js';
+const DB_NAME = 'pyodide-program-files';
+const DB_VERSION = 1;
+const STORE_NAME = 'files';
+// Where the data directories of the programs live in Pyodide's filesystem
+const DATA_ROOT = '/home/pyodide/data';
+const SYNC_DELAY_MS = 1000;
+
+function request(req) {
+    return new Promise((resolve, reject) => {
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => reject(req.error);
+    });
+}
+
+function openDatabase() {
+    return new Promise((resolve, reject) => {
+        const req = indexedDB.open(DB_NAME, DB_VERSION);
+        req.onupgradeneeded = () => req.result.createObjectStore(STORE_NAME);
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => reject(req.error);
+    });
+}
+
+function timeOf(value) {
+    return value instanceof Date ? value.getTime() : Number(value);
+}
+
+/**
+ * Data directory of a program, e.g. /home/pyodide/data/main for main.py
+ * @param {string} programFile - The program's file name
+ * @returns {string} - Absolute path in Pyodide's filesystem
+ */
+function dataDirFor(programFile) {
+    const base = (programFile || 'program').split('/').pop().replace(/\.py$/, '') || 'program';
+    return `${DATA_ROOT}/${base}`;
+}
+
+/**
+ * Start restoring a program's data directory; call before loadPyodide() so both run at once
+ * @param {string} programFile - The program's file name
+ * @returns {Object} - { mount(pyodide), scheduleSync(), flush(), dataDir }
+ */
+function createPersistentFs(programFile) {
+    const dataDir = dataDirFor(programFile);
+    // path -> { size, mtime } of what IndexedDB holds
+    const stored = new Map();
+    let FS = null;
+    let timer = null;
+    let syncing = null;
+    let again = false;
+
+    // Records of the data directory: path -> { contents: Uint8Array | null (directory), mtime }
+    const restoring = (async () => {
+        if (typeof indexedDB === 'undefined') {
+            return { db: null, records: [] };
+        }
+        const db = await openDatabase();
+        const range = IDBKeyRange.bound(`${dataDir}/`, `${dataDir}/\uffff`);
+        const store = db.transaction(STORE_NAME, 'readonly').objectStore(STORE_NAME);
+        const [keys, values] = await Promise.all([request(store.getAllKeys(range)), request(store.getAll(range))]);
+        debug(MODULE_NAME, `Read ${keys.length} stored entries of ${dataDir}`);
+        return { db, records: keys.map((path, i) => [path, values[i]]) };
+    })().catch(error => {
+        console.warn(`Program files can't be restored, ${dataDir} won't persist:`, error);
+        return { db: null, records: [] };
+    });
+
+    /**
+     * Write the restored files into Pyodide's filesystem and make the data directory the cwd
+     * @param {Object} pyodide - The loaded Pyodide instance
+     * @param {Object} [options] - { chdir: false } leaves the cwd alone, for an interpreter
+     *     shared by several programs that each get their directory through the runtime
+     */
+    async function mount(pyodide, { chdir = true } = {}) {
+        FS = pyodide.FS;
+        const { records } = await restoring;
+        FS.mkdirTree(dataDir);
+        // Parents sort before their children
+        records.sort(([a], [b]) => a.localeCompare(b));
+        for (const [path, record] of records) {
+            if (record.contents === null) {
+                FS.mkdirTree(path);
+            } else {
+                FS.writeFile(path, record.contents);
+                FS.utime(path, record.mtime, record.mtime);
+            }
+            stored.set(path, { size: record.contents ? record.contents.length : -1, mtime: record.mtime });
+        }
+        if (chdir) {
+            pyodide.runPython(`import os; os.chdir(${JSON.stringify(dataDir)})`);
+        }
+        debug(MODULE_NAME, `Mounted ${dataDir} with ${records.length} entries`);
+    }
+
+    // Current entries of the data directory: path -> { size (-1 for directories), mtime }
+    function scan(dir, found = new Map()) {
+        for (const name of FS.readdir(dir)) {
+            if (name === '.' || name === '..') continue;
+            const path = `${dir}/${name}`;
+            const stat = FS.stat(path);
+            const isDir = FS.isDir(stat.mode);
+            found.set(path, { size: isDir ? -1 : stat.size, mtime: timeOf(stat.mtime) });
+            if (isDir) scan(path, found);
+        }
+        return found;
+    }
+
+    async function sync() {
+        const { db } = await restoring;
+        if (!db || !FS) return;
+        const current = scan(dataDir);
+        const puts = [];
+        for (const [path, entry] of current) {
+            const known = stored.get(path);
+            if (!known || known.size !== entry.size || known.mtime !== entry.mtime) {
+                puts.push([path, entry]);
+            }
+        }
+        const deletes = [...stored.keys()].filter(path => !current.has(path));
+        if (puts.length === 0 && deletes.length === 0) return;
+
+        const tx = db.transaction(STORE_NAME, 'readwrite');
+        const store = tx.objectStore(STORE_NAME);
+        for (const [path, entry] of puts) {
+            const contents = entry.size === -1 ? null : FS.readFile(path);
+            store.put({ contents, mtime: entry.mtime }, path);
+        }
+        for (const path of deletes) {
+            store.delete(path);
+        }
+        await new Promise((resolve, reject) => {
+            tx.oncomplete = resolve;
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        });
+        for (const [path, entry] of puts) stored.set(path, entry);
+        for (const path of deletes) stored.delete(path);
+        debug(MODULE_NAME, `Synced ${dataDir}: ${puts.length} written, ${deletes.length} deleted`);
+    }
+
+    // Run a sync now, or once more after the one in progress
+    function flush() {
+        if (timer !== null) {
+            clearTimeout(timer);
+            timer = null;
+        }
+        if (syncing) {
+            again = true;
+            return syncing;
+        }
+        syncing = sync()
+            .catch(error => console.warn(`Syncing ${dataDir} failed:`, error))
+            .finally(() => {
+                syncing = null;
+                if (again) {
+                    again = false;
+                    flush();
+                }
+            });
+        return syncing;
+    }
+
+    // Ask for a sync; requests within SYNC_DELAY_MS of each other are served by one pass
+    function scheduleSync() {
+        if (timer !== null) {
+            clearTimeout(timer);
+        }
+        timer = setTimeout(flush, SYNC_DELAY_MS);
+    }
+
+    return { mount, scheduleSync, flush, dataDir };
+}
+
+export { createPersistentFs, dataDirFor };
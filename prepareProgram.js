@@ -0,0 +1,81 @@
+// prepareProgram.js
+// Turns a Python source file into the code that is actually executed
+// Usage: node prepareProgram.js [--wrap] [--json] [--also-transform name,...] [--timeslice N] <python_file.py> [...]
+//
+// Used by app.js in the browser and, through the command line, by the CPython
+// tools (runner.py), so both run programs with exactly the same transform.
+
+import { debug } from './debugUtils.js';
+import { transformPythonForPyodide } from './transformInputToAsync.js';
+import { concatenateConsecutivePrints } from './concatenatePrints.js';
+
+const MODULE_NAME = 'prepareProgram.js';
+
+/**
+ * Transform a program to async/await style and concatenate consecutive prints
+ * @param {string} code - Python source code
+ * @param {Object} options - Options for transformPythonForPyodide, e.g. { alsoTransform: [...], timeslice: 1000 }
+ * @returns {string} - Transformed Python code
+ */
+function prepareProgram(code, options = {}) {
+    const transformedCode = transformPythonForPyodide(code, options);
+    debug(MODULE_NAME, `Transform Python code for Pyodide, pre-print-concatenation:\n${transformedCode}`);
+    // Further optimize by concatenating consecutive print statements
+    const preparedCode = concatenateConsecutivePrints(transformedCode);
+    debug(MODULE_NAME, `Transform Python code for Pyodide:\n${preparedCode}`);
+    return preparedCode;
+}
+
+/**
+ * Wrap a prepared program in an async function so top-level input() and time.sleep() can be awaited
+ * @param {string} code - Prepared Python code
+ * @returns {string} - Code ready for runPythonAsync (or a top-level-await compile under CPython)
+ */
+function wrapProgram(code) {
+    return `
+async def main():
+${code.split('\n').map(line => '    ' + line).join('\n')}
+
+try:
+    # Runs main() again from the start when the player rewinds (see StateHistory in bootstrap.py)
+    await _run_main(main)
+finally:
+    # Send a partial line the program left in sys.stdout/sys.stderr
+    _flush_output()
+        `;
+}
+
+export { prepareProgram, wrapProgram };
+
+// If run directly, print the prepared program(s) (Node.js only)
+if (typeof process !== 'undefined' && process.versions && process.versions.node) {
+    const fs = (await import('fs')).default;
+    const { fileURLToPath } = await import('url');
+    if (process.argv[1] === fileURLToPath(import.meta.url)) {
+        const args = process.argv.slice(2);
+        const wrap = args.includes('--wrap');
+        const asJson = args.includes('--json');
+        const alsoIndex = args.indexOf('--also-transform');
+        const alsoTransform = alsoIndex === -1 ? [] : args[alsoIndex + 1].split(',').filter(Boolean);
+        const timesliceIndex = args.indexOf('--timeslice');
+        const timeslice = timesliceIndex === -1 ? 0 : Number(args[timesliceIndex + 1]);
+        const optionValues = new Set([alsoIndex + 1, timesliceIndex + 1].filter(i => i > 0));
+        const filenames = args.filter((arg, i) => !arg.startsWith('--') && !optionValues.has(i));
+        if (filenames.length === 0) {
+            console.error('Usage: node prepareProgram.js [--wrap] [--json] [--also-transform name,...] [--timeslice N] <python_file.py> [...]');
+            process.exit(1);
+        }
+
+        const prepared = {};
+        for (const filename of filenames) {
+            try {
+                const code = prepareProgram(fs.readFileSync(filename, 'utf8'), { alsoTransform, timeslice });
+                prepared[filename] = wrap ? wrapProgram(code) : code;
+            } catch (err) {
+                console.error(`Error preparing '${filename}': ${err.message}`);
+                process.exit(1);
+            }
+        }
+        process.stdout.write(asJson ? JSON.stringify(prepared) : Object.values(prepared).join('\n'));
+    }
+}
@@ -0,0 +1,209 @@
+"""
+Function-level profiling of program runs (?profile=true in the browser, runner.py --profile)
+Runs a prepared program under sys.setprofile and attributes time and calls to each program
+function - the program's own, content pack scenes and runtime helpers such as load_data.
+Async functions are suspended while they wait, so a function's compute time only counts
+the time it is actually running; its wall time runs from the call to its return. Time spent
+waiting for the player's input (and in time.sleep()) is reported separately per function
+that asked, so a slow menu() and a player who thinks for a minute are told apart.
+"""
+
+import ast
+import builtins
+import dis
+import inspect
+import json
+import sys
+import time
+
+# Filename prefix of content pack code (see enter_scene in bootstrap.py)
+PACK_FILENAME_PREFIX = "<scene "
+# An async function whose frame returns here is suspended, not finished
+SUSPENDED_OPCODES = {dis.opmap["YIELD_VALUE"]}
+# Report columns a summary can be sorted by
+SORT_KEYS = ("calls", "self_ms", "cumulative_ms", "wall_ms", "input_wait_ms", "sleep_ms")
+# Runtime builtins that are waits themselves or transform plumbing
+RUNTIME_SKIPPED = {"input"}
+
+def _display_name(code):
+    # The wrapped program's functions are locals of main()
+    name = code.co_qualname.replace("main.<locals>.", "")
+    return "<program>" if name == "main" else name
+
+class FunctionProfiler:
+    """Calls, compute time, wall time and waits per program function of one program run"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        # code object -> display name of everything that is profiled
+        self.names = {}
+        self.stats = {}
+        # [frame, started, time spent in profiled callees] of the running program frames
+        self.stack = []
+        # frame -> time of its first call, for frames that haven't returned yet
+        self.open_calls = {}
+        self.waits = {"input": 0.0, "sleep": 0.0}
+        self.prompts = 0
+        self.started = None
+        self.finished = None
+
+    def index_code(self, code, name=None):
+        """Profile code and every function nested in it"""
+        if code in self.names:
+            return
+        self.names[code] = name or _display_name(code)
+        for const in code.co_consts:
+            if inspect.iscode(const):
+                self.index_code(const)
+
+    def index_runtime(self, target):
+        """Profile the runtime's Python builtins (load_data, enter_scene, narrate...)"""
+        for name, value in target.items():
+            # A routed builtin (see install in bootstrap.py): profile the runtime function behind it
+            resolve = getattr(value, "resolve_route", None)
+            if resolve is not None:
+                try:
+                    value = resolve()
+                except RuntimeError:
+                    continue
+            if (inspect.isfunction(value) and not name.startswith("_") and name not in RUNTIME_SKIPPED
+                    and value.__code__.co_qualname.startswith("create_runtime.")):
+                self.names.setdefault(value.__code__, name)
+
+    def entry(self, name):
+        return self.stats.setdefault(name, {
+            "function": name, "calls": 0, "self_ms": 0.0, "cumulative_ms": 0.0,
+            "wall_ms": 0.0, "input_wait_ms": 0.0, "sleep_ms": 0.0,
+        })
+
+    def name_of(self, code):
+        name = self.names.get(code)
+        if name is None and code.co_filename.startswith(PACK_FILENAME_PREFIX):
+            # Pack code is compiled after the program starts
+            self.index_code(code)
+            name = self.names[code]
+        return name
+
+    def profile(self, frame, event, arg):
+        if event == "call":
+            name = self.name_of(frame.f_code)
+            if name is None:
+                return
+            now = time.perf_counter()
+            if frame not in self.open_calls:
+                # A first call; the other "call" events of a coroutine are resumes
+                self.open_calls[frame] = now
+                self.entry(name)["calls"] += 1
+            self.stack.append([frame, now, 0.0])
+        elif event == "return":
+            if not self.stack or self.stack[-1][0] is not frame:
+                return
+            now = time.perf_counter()
+            _, started, in_callees = self.stack.pop()
+            code = frame.f_code
+            elapsed = now - started
+            stats = self.entry(self.names[code])
+            stats["self_ms"] += (elapsed - in_callees) * 1000
+            # Recursive calls are already counted by the outermost one
+            if not any(item[0].f_code is code for item in self.stack):
+                stats["cumulative_ms"] += elapsed * 1000
+            if self.stack:
+                self.stack[-1][2] += elapsed
+            if code.co_code[frame.f_lasti] not in SUSPENDED_OPCODES:
+                first = self.open_calls.pop(frame, None)
+                if first is not None:
+                    stats["wall_ms"] += (now - first) * 1000
+
+    def waiting_function(self):
+        """Display name of the innermost program function on the stack"""
+        frame = sys._getframe(2)
+        while frame is not None:
+            name = self.names.get(frame.f_code)
+            if name is not None:
+                return name
+            frame = frame.f_back
+        return "<program>"
+
+    def wrap_wait(self, wait, kind):
+        async def profiled(*args, **kwargs):
+            name = self.waiting_function()
+            started = time.perf_counter()
+            try:
+                return await wait(*args, **kwargs)
+            finally:
+                waited = time.perf_counter() - started
+                self.waits[kind] += waited
+                self.entry(name)["input_wait_ms" if kind == "input" else "sleep_ms"] += waited * 1000
+                if kind == "input":
+                    self.prompts += 1
+        profiled.__name__ = wait.__name__
+        return profiled
+
+    def report(self, sort="self_ms"):
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Can't sort by {sort!r}, use one of {', '.join(SORT_KEYS)}")
+        total = ((self.finished or time.perf_counter()) - self.started) if self.started else 0.0
+        functions = sorted(self.stats.values(), key=lambda entry: -entry[sort])
+        return {
+            "filename": self.filename,
+            "wall_ms": total * 1000,
+            "input_wait_ms": self.waits["input"] * 1000,
+            "sleep_ms": self.waits["sleep"] * 1000,
+            # Everything that wasn't waiting: program code, runtime and host
+            "active_ms": (total - self.waits["input"] - self.waits["sleep"]) * 1000,
+            "prompts": self.prompts,
+            "sort": sort,
+            "functions": functions,
+        }
+
+    def report_json(self, sort="self_ms"):
+        return json.dumps(self.report(sort))
+
+    async def run(self, code, namespace):
+        """Run wrapped program code in namespace with the profiler and wait timers installed"""
+        compiled = compile(code, self.filename, "exec", flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT)
+        self.index_code(compiled)
+
+        # The runtime lives in the namespace's builtins (runner.py) or in builtins (browser)
+        target = namespace.get("__builtins__", builtins)
+        if not isinstance(target, dict):
+            target = target.__dict__
+        self.index_runtime(target)
+        original_input, original_sleep = target["input"], target["_sleep"]
+        target["input"] = self.wrap_wait(original_input, "input")
+        target["_sleep"] = self.wrap_wait(original_sleep, "sleep")
+
+        self.started = time.perf_counter()
+        previous = sys.getprofile()
+        sys.setprofile(self.profile)
+        try:
+            result = eval(compiled, namespace)
+            if inspect.iscoroutine(result):
+                await result
+        finally:
+            sys.setprofile(previous)
+            self.finished = time.perf_counter()
+            target["input"] = original_input
+            target["_sleep"] = original_sleep
+
+COLUMNS = (
+    ("calls", "calls", "{:>7}"),
+    ("self_ms", "self ms", "{:>10.1f}"),
+    ("cumulative_ms", "cum ms", "{:>10.1f}"),
+    ("wall_ms", "wall ms", "{:>11.1f}"),
+    ("input_wait_ms", "input ms", "{:>11.1f}"),
+    ("sleep_ms", "sleep ms", "{:>10.1f}"),
+)
+
+def format_report(report, limit=20):
+    """Human-readable summary of a report, as a table in the report's sort order"""
+    lines = [
+        f"Profile of {report['filename']}: {report['wall_ms'] / 1000:.2f} s wall, "
+        f"{report['active_ms'] / 1000:.2f} s active, {report['input_wait_ms'] / 1000:.2f} s waiting for "
+        f"input ({report['prompts']} prompts), {report['sleep_ms'] / 1000:.2f} s in sleep()",
+        f"Sorted by {report['sort']}:",
+        "".join(f"{title:>{len(fmt.format(0))}}" for _, title, fmt in COLUMNS) + "  function",
+    ]
+    for entry in report["functions"][:limit]:
+        lines.append("".join(fmt.format(entry[key]) for key, _, fmt in COLUMNS) + f"  {entry['function']}")
+    return "\n".join(lines)
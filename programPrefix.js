@@ -0,0 +1,119 @@
+// programPrefix.js
+// Opening screen captured ahead of time by build_prefix.py
+//
+// The page embeds the messages its program prints before the first input() (a
+// <script type="application/json" id="program-prefix"> element), so app.js can show them
+// while Pyodide is still downloading. Once the interpreter is ready the program runs from
+// the start as usual; a replay swallows the output that is already on screen and hands
+// over at the captured prompt. If the real run prints anything else the replay stops and
+// the output is shown normally from there.
+
+import { debug } from './debugUtils.js';
+
+const MODULE_NAME = 'programPrefix.js';
+const PREFIX_ELEMENT = 'program-prefix';
+// Files that shape the transcript besides the program itself (RUNTIME_FILES in build_prefix.py)
+const RUNTIME_FILES = ['bootstrap.py', 'prepareProgram.js', 'transformInputToAsync.js', 'concatenatePrints.js'];
+
+async function sha256Hex(text) {
+    const hash = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+    return [...new Uint8Array(hash)].map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+/**
+ * The embedded prefix of a program, if the page has one
+ * @param {string} programFile - The program the page runs
+ * @returns {Object|null} - { program, sha256, transcript: [{ type, text, t }], prompt: { text, t } | null }
+ */
+function readPrefix(programFile) {
+    const element = document.getElementById(PREFIX_ELEMENT);
+    if (!element) {
+        return null;
+    }
+    try {
+        const prefix = JSON.parse(element.textContent);
+        return prefix.program === programFile.split('/').pop() ? prefix : null;
+    } catch (error) {
+        debug(MODULE_NAME, `Unreadable prefix: ${error.message}`);
+        return null;
+    }
+}
+
+// Digest of the runtime files, as build_prefix.py computes it
+async function runtimeDigest() {
+    const sources = await Promise.all(RUNTIME_FILES.map(async file => {
+        const response = await fetch(file);
+        if (!response.ok) {
+            throw new Error(`${file}: HTTP ${response.status}`);
+        }
+        return response.text();
+    }));
+    return sha256Hex(sources.join('\n'));
+}
+
+/**
+ * Check that a prefix was captured from this version of the program and of the runtime
+ * @param {Object} prefix - Result of readPrefix()
+ * @param {string} source - The program's source
+ * @returns {Promise<boolean>}
+ */
+async function prefixMatches(prefix, source) {
+    if (!window.crypto || !crypto.subtle) {
+        return false;
+    }
+    if (await sha256Hex(source) !== prefix.sha256) {
+        debug(MODULE_NAME, `${prefix.program} changed since its prefix was captured, not shown`);
+        return false;
+    }
+    try {
+        if (await runtimeDigest() !== prefix.runtime) {
+            debug(MODULE_NAME, 'The runtime changed since the prefix was captured, not shown');
+            return false;
+        }
+    } catch (error) {
+        debug(MODULE_NAME, `Runtime files unreadable, prefix not shown: ${error.message}`);
+        return false;
+    }
+    return true;
+}
+
+/**
+ * Replay of a prefix for the resumed run
+ * @param {Object} prefix - Result of readPrefix()
+ * @returns {Object} - { consume(type, text), resume(prompt), active() }
+ */
+function createReplay(prefix) {
+    const expected = [...prefix.transcript];
+    let active = true;
+
+    function stop(reason) {
+        if (active) {
+            active = false;
+            debug(MODULE_NAME, `Replay stopped: ${reason}`);
+        }
+    }
+
+    return {
+        // True if the message is the next captured one (and is already on screen)
+        consume(type, text) {
+            if (!active) return false;
+            const next = expected[0];
+            if (next && next.type === type && next.text === String(text)) {
+                expected.shift();
+                return true;
+            }
+            stop(`unexpected ${type} message`);
+            return false;
+        },
+        // True if the run reached the captured prompt with nothing left over; the replay ends either way
+        resume(prompt) {
+            if (!active) return false;
+            const resumed = expected.length === 0 && prefix.prompt !== null && prefix.prompt.text === String(prompt);
+            stop(resumed ? 'caught up with the captured prompt' : 'input() before the captured prompt');
+            return resumed;
+        },
+        active: () => active
+    };
+}
+
+export { readPrefix, prefixMatches, createReplay };
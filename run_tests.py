@@ -0,0 +1,143 @@
+"""
+Parallel test runner for the programs in test/
+Every program runs through the browser transform and the bootstrap shims (see runner.py)
+with its scripted inputs from test/scripted_inputs.json and a virtual clock, fanned out
+across a process pool. testRunner.js (?runtests=true) does the same inside one Pyodide instance;
+--sessions does it here too, every program a session of one interpreter and event loop.
+
+Usage: python run_tests.py [program.py ...] [-j N | --sessions] [--json PATH] [--real-time] [--timeout S]
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+
+import runner
+
+TEST_DIR = os.path.join(runner.PROJECT_DIR, "test")
+SCRIPTED_INPUTS = os.path.join(TEST_DIR, "scripted_inputs.json")
+
+# Test programs announce their results by printing (same patterns as testRunner.js)
+PASS_PATTERN = re.compile(r"\b(PASS(ED)?|SUCCESS)\b")
+FAIL_PATTERN = re.compile(r"\bFAIL(ED|URE)?\b")
+
+def summarize_transcript(transcript, error):
+    """Work out the status of a finished test program from its transcript"""
+    passed = failed = 0
+    for message in transcript:
+        if message["type"] in ("user", "system"):
+            continue
+        for line in message["text"].split("\n"):
+            if FAIL_PATTERN.search(line):
+                failed += 1
+            elif PASS_PATTERN.search(line):
+                passed += 1
+    status = "error" if error else "failed" if failed else "passed"
+    return {"status": status, "passed": passed, "failed": failed}
+
+def run_test(path, code, inputs, real_time, timeout):
+    """Worker: run one test program and summarize it"""
+    # Files the program writes land in a scratch directory, not the repository
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        os.chdir(scratch_dir)
+        try:
+            result = runner.run_program(path, inputs, real_time=real_time, code=code, timeout=timeout)
+        finally:
+            os.chdir(cwd)
+    result.update(summarize_transcript(result["transcript"], result["error"]))
+    return result
+
+def run_in_pool(programs, prepared, scripted_inputs, jobs, real_time, timeout):
+    """Every program in a worker process of its own"""
+    pool = multiprocessing.Pool(min(jobs, len(programs)) or 1)
+    pending = [
+        (path, pool.apply_async(run_test, (
+            path, prepared[path], scripted_inputs.get(os.path.basename(path), []), real_time, timeout
+        )))
+        for path in programs
+    ]
+    results = []
+    for path, pending_result in pending:
+        try:
+            results.append(pending_result.get(timeout))
+        except multiprocessing.TimeoutError:
+            # Stuck in a CPU loop: the asyncio timeout inside the worker never got a chance
+            results.append({
+                "name": os.path.basename(path), "status": "timeout", "passed": 0, "failed": 0,
+                "error": f"Timed out after {timeout} s", "duration_ms": timeout * 1000,
+                "virtual_seconds": 0.0, "transcript": [],
+            })
+    pool.terminate()
+    return results
+
+def run_as_sessions(programs, prepared, scripted_inputs, real_time, timeout):
+    """Every program a concurrent session of this process's interpreter (as testRunner.js does)"""
+    cwd = os.getcwd()
+    # Every program gets a data directory of its own in one scratch directory, as the shared
+    # worker's tabs do, so the process's cwd is never a session's
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        runs = []
+        for path in programs:
+            data_dir = os.path.join(scratch_dir, os.path.splitext(os.path.basename(path))[0])
+            os.makedirs(data_dir)
+            runs.append((path, prepared[path], scripted_inputs.get(os.path.basename(path), []), data_dir))
+        os.chdir(scratch_dir)
+        try:
+            results = runner.run_sessions(runs, real_time=real_time, timeout=timeout)
+        finally:
+            os.chdir(cwd)
+    for result in results:
+        result.update(summarize_transcript(result["transcript"], result["error"]))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the test programs in parallel")
+    parser.add_argument("programs", nargs="*", help="test programs (default: test/t*.py)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--json", metavar="PATH", help="write structured results to PATH ('-' for stdout)")
+    parser.add_argument("--real-time", action="store_true", help="actually wait in time.sleep()")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds before a test is abandoned")
+    parser.add_argument("--sessions", action="store_true",
+                        help="run the programs concurrently in this process, like the browser test suite")
+    args = parser.parse_args()
+
+    programs = [os.path.abspath(path) for path in args.programs] or sorted(glob.glob(os.path.join(TEST_DIR, "t*.py")))
+    with open(SCRIPTED_INPUTS, encoding="utf-8") as f:
+        scripted_inputs = json.load(f)
+
+    started = time.perf_counter()
+    # One Node.js call transforms the whole suite
+    prepared = runner.prepare_programs(programs)
+
+    if args.sessions:
+        results = run_as_sessions(programs, prepared, scripted_inputs, args.real_time, args.timeout)
+    else:
+        results = run_in_pool(programs, prepared, scripted_inputs, args.jobs, args.real_time, args.timeout)
+    suite = {"duration_ms": (time.perf_counter() - started) * 1000, "results": results}
+
+    # Keep stdout clean for the JSON when it is written there
+    report = sys.stderr if args.json == "-" else sys.stdout
+    for result in results:
+        line = (f"{result['status'].upper():8} {result['name']} ({result['passed']} passed, "
+                f"{result['failed']} failed, {result['duration_ms']:.0f} ms)")
+        print(line + (f"\n         {result['error']}" if result["error"] else ""), file=report)
+    ok = sum(result["status"] == "passed" for result in results)
+    print(f"\n{ok}/{len(results)} test programs passed in {suite['duration_ms']:.0f} ms", file=report)
+
+    if args.json == "-":
+        json.dump(suite, sys.stdout, indent=2)
+    elif args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(suite, f, indent=2)
+
+    sys.exit(0 if ok == len(results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Headless program runner
+Runs a program the way the browser does - transformed by prepareProgram.js (through
+Node.js) and with the builtins from bootstrap.py - but under CPython, with scripted
+input, a virtual clock for time.sleep() and in-memory storage instead of cookies.
+Files the program writes persist in its data directory (.data/<program>/ by default),
+the counterpart of the browser's IndexedDB-backed one (see persistentFs.js).
+
+Usage: python runner.py <program.py> [input ...] [--real-time] [--timeslice N] [--data-dir DIR]
+                        [--memprofile [REPORT.json] | --profile [REPORT.json] [--sort KEY]]
+       (without scripted inputs, input is read from the terminal)
+"""
+
+import argparse
+import ast
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import bootstrap
+import memprofile
+import profiler as function_profiler
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+PREPARE_SCRIPT = os.path.join(PROJECT_DIR, "prepareProgram.js")
+# Content packs live in scenes/ next to the program (same layout as contentPacks.js)
+PACK_DIR = "scenes"
+# Program data directories of the CLI, like /home/pyodide/data/<program> in the browser
+DATA_ROOT = os.path.join(PROJECT_DIR, ".data")
+ASYNC_DEF = re.compile(r"^\s*async\s+def\s+(\w+)", re.MULTILINE)
+
+class ScriptedInputExhausted(EOFError):
+    """Raised inside the program when it asks for more input than was scripted"""
+
+def prepare_programs(paths, wrap=True, also_transform=(), timeslice=0):
+    """Run the browser transform over programs with Node.js, returns {path: code}"""
+    command = ["node", PREPARE_SCRIPT, "--json"] + (["--wrap"] if wrap else [])
+    if also_transform:
+        command += ["--also-transform", ",".join(also_transform)]
+    if timeslice:
+        command += ["--timeslice", str(timeslice)]
+    command += list(paths)
+    result = subprocess.run(command, capture_output=True, text=True, encoding="utf-8")
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"prepareProgram.js exited with {result.returncode}")
+    return json.loads(result.stdout)
+
+class Session:
+    """Host side of one program run: transcript, input, clock and storage"""
+
+    def __init__(self, inputs=None, real_time=False, echo=False, program_path=None, prepared_code="", data_dir=None):
+        # None means interactive: read answers from the terminal
+        self.inputs = None if inputs is None else list(inputs)
+        self.program_path = program_path
+        # Where the program's relative paths lead when it shares the interpreter (None: the cwd)
+        self.data_dir = data_dir
+        # Pack code has to await the functions the transform made async in the program
+        self.async_names = ASYNC_DEF.findall(prepared_code)
+        self.real_time = real_time
+        self.echo = echo
+        self.clock = 0.0
+        self.transcript = []
+        self.store = {}
+        self.events = {}
+
+    def host(self):
+        """The js_* host functions bootstrap.create_runtime() expects"""
+        host = {
+            "js_print": self.print,
+            "js_input": self.input,
+            "js_sleep": self.sleep,
+            "js_save_data": self.save_data,
+            "js_load_data": self.load_data,
+            "js_clear_data": self.clear_data,
+            "js_record_event": self.record_event,
+            "js_event_count": self.event_count,
+            "js_clear_events": self.clear_events,
+            "js_load_pack": self.load_pack,
+        }
+        if self.data_dir is not None:
+            host["js_data_dir"] = self.data_dir
+        return host
+
+    def record(self, msg_type, text):
+        self.transcript.append({"type": msg_type, "text": text, "t": self.clock})
+        if self.echo and msg_type != "user":
+            # Host code runs in the session's context, where print() and sys.stdout lead back here
+            stream = sys.__stderr__ if msg_type == "error" else sys.__stdout__
+            stream.write(f"{text}\n")
+
+    def print(self, text, msg_type="python"):
+        self.record(msg_type, str(text))
+
+    async def input(self, prompt=""):
+        if prompt:
+            self.record("system", prompt)
+        if self.inputs is None:
+            value = await asyncio.to_thread(input, "> ")
+        elif self.inputs:
+            value = self.inputs.pop(0)
+        else:
+            raise ScriptedInputExhausted("EOF when reading a line (no scripted input left)")
+        self.record("user", value)
+        return value
+
+    async def sleep(self, seconds):
+        self.clock += seconds
+        if self.real_time:
+            await asyncio.sleep(seconds)
+        else:
+            # Still give other tasks a turn, like a real sleep would
+            await asyncio.sleep(0)
+
+    # Data arrives as JSON text (see save_data in bootstrap.py) and is stored as is, like the browser's cookies
+    def save_data(self, text, key="app_data"):
+        self.store[key] = str(text)
+        return True
+
+    def load_data(self, key="app_data"):
+        return self.store.get(key)
+
+    def clear_data(self, key="app_data"):
+        self.store.pop(key, None)
+        return True
+
+    def record_event(self, event, key="app_events", count=1):
+        counts = self.events.setdefault(key, {})
+        counts[event] = counts.get(event, 0) + count
+        return counts[event]
+
+    def event_count(self, event, key="app_events"):
+        return self.events.get(key, {}).get(event, 0)
+
+    def clear_events(self, key="app_events"):
+        self.events.pop(key, None)
+
+    async def load_pack(self, name):
+        if self.program_path is None:
+            raise RuntimeError("Content packs need the program's path")
+        path = os.path.join(os.path.dirname(os.path.abspath(self.program_path)), PACK_DIR, f"{name}.py")
+        prepared = await asyncio.to_thread(prepare_programs, [path], False, self.async_names)
+        return prepared[path]
+
+async def run_code(code, session, filename="<program>", profiler=None):
+    """Execute prepared (wrapped) program code in a fresh namespace routed to the session"""
+    namespace = bootstrap.create_namespace(bootstrap.create_runtime(session.host()))
+    if profiler is not None:
+        await profiler.run(code, namespace)
+        return namespace
+    compiled = compile(code, filename, "exec", flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT)
+    result = eval(compiled, namespace)
+    if asyncio.iscoroutine(result):
+        await result
+    return namespace
+
+def run_sessions(runs, real_time=False, timeout=None):
+    """Run several programs at once as sessions of one interpreter and event loop
+
+    runs is a list of (path, prepared code, scripted inputs, data directory or None). Every
+    program is an asyncio task of its own (bootstrap.start_session), so its I/O reaches its
+    own Session even from modules it imports, and its relative paths its own data directory.
+    Returns a result per program, in the shape of run_program().
+    """
+    async def run_one(path, code, inputs, data_dir):
+        session = Session(inputs, real_time=real_time, program_path=path, prepared_code=code, data_dir=data_dir)
+        started = time.perf_counter()
+        error = None
+        try:
+            task = bootstrap.start_session(code, bootstrap.create_runtime(session.host()), path)
+            await asyncio.wait_for(task, timeout)
+        except asyncio.TimeoutError:
+            error = f"Timed out after {timeout} s"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        return {
+            "name": os.path.basename(path),
+            "error": error,
+            "duration_ms": (time.perf_counter() - started) * 1000,
+            "virtual_seconds": session.clock,
+            "transcript": session.transcript,
+        }
+
+    async def run_all():
+        return await asyncio.gather(*(run_one(*run) for run in runs))
+    return asyncio.run(run_all())
+
+def default_data_dir(path):
+    """Data directory of a program, e.g. .data/main for main.py"""
+    return os.path.join(DATA_ROOT, os.path.splitext(os.path.basename(path))[0])
+
+def run_program(path, inputs=None, real_time=False, code=None, echo=False, timeout=None, memory_profile=False,
+                timeslice=0, data_dir=None, profile=False):
+    """Run one program to completion and return its structured result
+
+    With data_dir, the program runs in that directory (created if needed), so files it
+    opens by relative path are still there the next time.
+    """
+    if code is None:
+        code = prepare_programs([path], timeslice=timeslice)[path]
+    if memory_profile and profile:
+        raise ValueError("Memory and function profiling can't be combined in one run")
+    cwd = os.getcwd()
+    if data_dir is not None:
+        # The program path is resolved before the working directory changes
+        path = os.path.abspath(path)
+        os.makedirs(data_dir, exist_ok=True)
+        os.chdir(data_dir)
+    try:
+        session = Session(inputs, real_time=real_time, echo=echo, program_path=path, prepared_code=code)
+        profiler = None
+        if memory_profile:
+            profiler = memprofile.MemoryProfiler(path)
+        elif profile:
+            profiler = function_profiler.FunctionProfiler(path)
+        started = time.perf_counter()
+        error = None
+        try:
+            asyncio.run(asyncio.wait_for(run_code(code, session, path, profiler), timeout))
+        except asyncio.TimeoutError:
+            error = f"Timed out after {timeout} s"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        result = {
+            "name": os.path.basename(path),
+            "error": error,
+            "duration_ms": (time.perf_counter() - started) * 1000,
+            "virtual_seconds": session.clock,
+            "transcript": session.transcript,
+        }
+        if memory_profile:
+            result["memory_profile"] = profiler.report()
+        elif profile:
+            result["profile"] = profiler.report()
+        return result
+    finally:
+        os.chdir(cwd)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a program headlessly with the browser's execution semantics")
+    parser.add_argument("program", help="Python program to run")
+    parser.add_argument("inputs", nargs="*", help="scripted answers to input() (default: read from the terminal)")
+    parser.add_argument("--real-time", action="store_true", help="actually wait in time.sleep()")
+    parser.add_argument("--timeslice", type=int, default=0, metavar="N",
+                        help="add yield points to loops, checked every N iterations (as ?timeslice=N)")
+    parser.add_argument("--data-dir", metavar="DIR",
+                        help="working directory whose files persist between runs (default: .data/<program>)")
+    parser.add_argument("--memprofile", nargs="?", const="", metavar="REPORT.json",
+                        help="trace memory between prompts, print a summary and optionally write the JSON report")
+    parser.add_argument("--profile", nargs="?", const="", metavar="REPORT.json",
+                        help="time every program function, print a summary and optionally write the JSON report")
+    parser.add_argument("--sort", default="self_ms", choices=function_profiler.SORT_KEYS,
+                        help="column the --profile summary is sorted by (default: self_ms)")
+    args = parser.parse_intermixed_args()
+    if args.memprofile is not None and args.profile is not None:
+        parser.error("--memprofile and --profile can't be combined")
+
+    memory_profile = args.memprofile is not None
+    profile = args.profile is not None
+    started_in = os.getcwd()
+    result = run_program(args.program, args.inputs or None, real_time=args.real_time, echo=True,
+                         memory_profile=memory_profile, timeslice=args.timeslice,
+                         data_dir=args.data_dir or default_data_dir(args.program), profile=profile)
+    if memory_profile:
+        print("\n" + memprofile.format_report(result["memory_profile"]), file=sys.stderr)
+        if args.memprofile:
+            # Relative to where runner.py was started, not the program's data directory
+            with open(os.path.join(started_in, args.memprofile), "w", encoding="utf-8") as f:
+                json.dump(result["memory_profile"], f, indent=2)
+    if profile:
+        report = dict(result["profile"], sort=args.sort)
+        report["functions"] = sorted(report["functions"], key=lambda entry: -entry[args.sort])
+        print("\n" + function_profiler.format_report(report), file=sys.stderr)
+        if args.profile:
+            with open(os.path.join(started_in, args.profile), "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+    if result["error"]:
+        print(f"Program error: {result['error']}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
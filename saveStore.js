@@ -0,0 +1,465 @@
+// saveStore.js
+// Versioned, field-level cookie storage for program save data
+//
+// The top-level fields of a saved dict are spread by name over a fixed number of chunk
+// cookies (`<key>.%c<n>`, at most SAVE_CHUNKS per key), each holding the schema version
+// and a JSON object of its fields. Saving only rewrites the chunks whose fields changed:
+// bumping one counter rewrites its chunk, along with the other fields that hash to the
+// same chunk, and a program with many decision points still uses a handful of cookies
+// rather than one per field. A chunk too big for one cookie continues in part cookies
+// (`<key>.%c<n>.<part>`) instead of being dropped by the browser. Dots in keys are
+// escaped, so the cookies of key `a` and key `a.b` never mix.
+//
+// A field that must never be rewritten by a write of another field (each tab's session of
+// eventJournal.js) can be kept in a cookie of its own instead, `<key>.%f<field>`, with
+// writeFieldCookie(). It reads back as part of the data like any other field.
+
+import { debug } from './debugUtils.js';
+
+const MODULE_NAME = 'saveStore.js';
+
+// Bump this when the on-disk layout changes and register a migration for the old version
+const SAVE_SCHEMA_VERSION = 2;
+// Chunk cookies per key: more spreads writes thinner, fewer keeps the cookie count down
+const SAVE_CHUNKS = 4;
+// Browsers drop cookies over about 4 KB (name and value): longer chunks are split into parts
+const MAX_COOKIE_BYTES = 3800;
+// Field used when the saved value is not a plain object (lists, strings, numbers...)
+const ROOT_FIELD = '%r';
+// Schema version 1 cookie names (`<key>.%v` next to one `<key>.<field>` cookie per field)
+const V1_VERSION_FIELD = '%v';
+// Marks the cookie of a field kept on its own: `<key>.%f<field>`
+const FIELD_COOKIE = '%f';
+const COOKIE_DAYS = 30;
+
+// Where cookie assignments are read and written: document.cookie in a page. Workers have
+// no cookies, so sharedHost.js swaps in a jar of its own (see useCookieJar)
+let cookieJar = {
+    read: () => document.cookie,
+    write: assignment => { document.cookie = assignment; }
+};
+
+/**
+ * Read and write cookies through another jar than document.cookie
+ * @param {Object} jar - { read() returning a document.cookie-style string, write(assignment) }
+ */
+function useCookieJar(jar) {
+    cookieJar = jar;
+}
+
+// fromVersion -> function(data) returning the data in the layout of fromVersion + 1
+const migrations = {
+    // Version 0 is the original format: the whole value JSON-encoded in a single `<key>` cookie.
+    // The data itself is unchanged, only the storage layout moves to one cookie per field.
+    0: data => data,
+    // Version 1 kept one cookie per field; version 2 packs them into chunks, same data
+    1: data => data
+};
+
+/**
+ * Register a migration that upgrades save data from one schema version to the next
+ * @param {number} fromVersion - The schema version the migration upgrades from
+ * @param {Function} migrate - Receives the decoded data and returns the upgraded data
+ */
+function registerSaveMigration(fromVersion, migrate) {
+    migrations[fromVersion] = migrate;
+}
+
+// Cookie values cannot contain separators, whitespace or non-ASCII characters.
+// Escape only those (plus '%') instead of URI-encoding the whole JSON string,
+// which keeps the common case - numbers, booleans, plain words - at its JSON size.
+function encodeValue(value) {
+    return JSON.stringify(value).replace(/[^\x21-\x7e]|[%;,]/gu, c => encodeURIComponent(c));
+}
+
+function decodeValue(text) {
+    return JSON.parse(decodeURIComponent(text));
+}
+
+function encodeFieldName(field) {
+    return String(field).replace(/[^\x21-\x7e]|[%;,=]/gu, c => encodeURIComponent(c));
+}
+
+// A key as a cookie name prefix: '.' separates the key from its chunk, so it is escaped too
+function encodeKey(key) {
+    return encodeFieldName(key).replace(/\./g, '%2E');
+}
+
+function chunkName(key, index) {
+    return `${encodeKey(key)}.%c${index}`;
+}
+
+// The chunk a field lives in, from a hash of its name
+function chunkOf(field) {
+    let hash = 5381;
+    for (let i = 0; i < field.length; i++) {
+        hash = ((hash * 33) ^ field.charCodeAt(i)) >>> 0;
+    }
+    return hash % SAVE_CHUNKS;
+}
+
+function fieldCookieName(key, field) {
+    return `${encodeKey(key)}.${FIELD_COOKIE}${encodeFieldName(field)}`;
+}
+
+function partName(key, index, part) {
+    return `${chunkName(key, index)}.${part}`;
+}
+
+/**
+ * The cookie values of a chunk: `<version>:<encoded JSON object of its fields>`, or when that
+ * is too long for one cookie, `<version>/<parts>:<first piece>` followed by the other pieces
+ * @returns {string[]} - The chunk cookie's value, then the values of its part cookies
+ */
+function encodeChunk(key, index, fields) {
+    const encoded = encodeValue(fields);
+    const single = `${SAVE_SCHEMA_VERSION}:${encoded}`;
+    if (chunkName(key, index).length + single.length <= MAX_COOKIE_BYTES) {
+        return [single];
+    }
+    // Room for the longest name and header of the chunk's cookies
+    const room = MAX_COOKIE_BYTES - partName(key, index, 9999).length - `${SAVE_SCHEMA_VERSION}/9999:`.length;
+    const pieces = [];
+    for (let start = 0; start < encoded.length; start += room) {
+        pieces.push(encoded.slice(start, start + room));
+    }
+    pieces[0] = `${SAVE_SCHEMA_VERSION}/${pieces.length}:${pieces[0]}`;
+    return pieces;
+}
+
+function decodeChunk(cookies, key, index, text) {
+    const colon = text.indexOf(':');
+    const [version, parts] = text.slice(0, colon).split('/').map(n => parseInt(n, 10));
+    let encoded = text.slice(colon + 1);
+    for (let part = 1; part < (parts || 1); part++) {
+        const piece = cookies.get(partName(key, index, part));
+        if (piece === undefined) {
+            throw new Error(`part ${part} of chunk ${index} is missing`);
+        }
+        encoded += piece;
+    }
+    return { version, fields: decodeValue(encoded), parts: parts || 1 };
+}
+
+function readCookies() {
+    const cookies = new Map();
+    for (const part of cookieJar.read().split(';')) {
+        const eq = part.indexOf('=');
+        if (eq === -1) continue;
+        cookies.set(part.slice(0, eq).trim(), part.slice(eq + 1));
+    }
+    return cookies;
+}
+
+function writeCookie(name, value, days = COOKIE_DAYS) {
+    const expires = new Date();
+    expires.setTime(expires.getTime() + (days * 24 * 60 * 60 * 1000));
+    cookieJar.write(`${name}=${value};expires=${expires.toUTCString()};path=/`);
+}
+
+function removeCookie(name) {
+    cookieJar.write(`${name}=;expires=Thu, 01 Jan 1970 00:00:00 UTC;path=/;`);
+}
+
+// The version 1 field cookies of a key: Map of cookie name -> raw value
+function legacyFieldCookies(cookies, key) {
+    const prefix = `${key}.`;
+    const fields = new Map();
+    if (!cookies.has(`${prefix}${V1_VERSION_FIELD}`)) {
+        return fields;
+    }
+    for (const [name, value] of cookies) {
+        if (name.startsWith(prefix) && !name.startsWith(`${prefix}%c`) && !name.startsWith(`${prefix}${FIELD_COOKIE}`)) {
+            fields.set(name, value);
+        }
+    }
+    return fields;
+}
+
+// The decoded chunks of a key: array of { version, fields } (undefined where there is no cookie)
+function readChunks(cookies, key) {
+    const chunks = [];
+    for (let i = 0; i < SAVE_CHUNKS; i++) {
+        const value = cookies.get(chunkName(key, i));
+        chunks.push(value === undefined ? undefined : decodeChunk(cookies, key, i, value));
+    }
+    return chunks;
+}
+
+// The fields of a key kept in cookies of their own: Map of field -> { version, value }
+function readFieldCookies(cookies, key) {
+    const prefix = `${encodeKey(key)}.${FIELD_COOKIE}`;
+    const fields = new Map();
+    for (const [name, text] of cookies) {
+        if (!name.startsWith(prefix)) continue;
+        const colon = text.indexOf(':');
+        fields.set(decodeURIComponent(name.slice(prefix.length)), {
+            version: parseInt(text.slice(0, colon), 10),
+            value: decodeValue(text.slice(colon + 1))
+        });
+    }
+    return fields;
+}
+
+// Write or remove (value undefined) the cookie of a field kept on its own; returns whether a write happened
+function writeFieldCookieValue(cookies, key, field, value) {
+    const name = fieldCookieName(key, field);
+    if (value === undefined) {
+        if (!cookies.has(name)) return false;
+        removeCookie(name);
+        cookies.delete(name);
+        return true;
+    }
+    const text = `${SAVE_SCHEMA_VERSION}:${encodeValue(value)}`;
+    if (cookies.get(name) === text) return false;
+    if (name.length + text.length > MAX_COOKIE_BYTES) {
+        throw new Error(`Field '${field}' of '${key}' is ${text.length} bytes, too big for a cookie of its own`);
+    }
+    writeCookie(name, text);
+    cookies.set(name, text);
+    return true;
+}
+
+// Write one chunk's cookies, or remove them once it holds no fields; returns whether a write happened
+function writeChunk(cookies, key, index, fields) {
+    const name = chunkName(key, index);
+    const values = Object.keys(fields).length === 0 ? [] : encodeChunk(key, index, fields);
+    const names = values.map((value, part) => part === 0 ? name : partName(key, index, part));
+    let written = false;
+    // Parts first and the chunk cookie, which says how many there are, last
+    for (let part = values.length - 1; part >= 0; part--) {
+        if (cookies.get(names[part]) !== values[part]) {
+            writeCookie(names[part], values[part]);
+            cookies.set(names[part], values[part]);
+            written = true;
+        }
+    }
+    if (values.length > 1) {
+        debug(MODULE_NAME, `Chunk ${index} of '${key}' is split over ${values.length} cookies`);
+    }
+    // Cookies the chunk no longer needs
+    for (let part = values.length; ; part++) {
+        const stale = part === 0 ? name : partName(key, index, part);
+        if (!cookies.has(stale)) {
+            if (part > 0) break;
+            continue;
+        }
+        removeCookie(stale);
+        cookies.delete(stale);
+        written = true;
+    }
+    return written;
+}
+
+// Remove the cookies of the layouts before chunks; returns how many were removed
+function removeLegacyCookies(cookies, key) {
+    let removed = 0;
+    for (const name of legacyFieldCookies(cookies, key).keys()) {
+        removeCookie(name);
+        removed++;
+    }
+    if (cookies.has(key)) {
+        removeCookie(key);
+        removed++;
+    }
+    return removed;
+}
+
+function isPlainObject(value) {
+    return value !== null && typeof value === 'object' && !Array.isArray(value);
+}
+
+/**
+ * Save data under a key, rewriting only the chunks whose fields changed since the last save
+ * @param {string} key - Storage key
+ * @param {*} data - JSON-serializable data (plain objects are stored field by field)
+ * @returns {number} - Number of cookies written or removed
+ */
+function writeSaveData(key, data) {
+    const cookies = readCookies();
+    const chunks = Array.from({ length: SAVE_CHUNKS }, () => ({}));
+    // Fields kept on their own stay in their cookies
+    const ownFields = readFieldCookies(cookies, key);
+    let writes = 0;
+    if (isPlainObject(data)) {
+        for (const [field, value] of Object.entries(data)) {
+            if (ownFields.has(field)) {
+                if (writeFieldCookieValue(cookies, key, field, value)) writes++;
+            } else {
+                chunks[chunkOf(field)][field] = value;
+            }
+        }
+    } else {
+        chunks[chunkOf(ROOT_FIELD)][ROOT_FIELD] = data;
+    }
+    for (const field of ownFields.keys()) {
+        if (!isPlainObject(data) || !(field in data)) {
+            if (writeFieldCookieValue(cookies, key, field, undefined)) writes++;
+        }
+    }
+
+    chunks.forEach((fields, index) => {
+        if (writeChunk(cookies, key, index, fields)) writes++;
+    });
+    // Drop leftover version 0/1 cookies so they are not migrated again on the next load
+    writes += removeLegacyCookies(cookies, key);
+
+    debug(MODULE_NAME, `Saved '${key}': ${writes} cookie write(s)`);
+    return writes;
+}
+
+/**
+ * Save a single top-level field of the data stored under a key, leaving the other fields untouched
+ * @param {string} key - Storage key
+ * @param {string} field - Field name
+ * @param {*} value - JSON-serializable value
+ * @returns {boolean} - Whether the field's chunk had to be rewritten
+ */
+function writeSaveField(key, field, value) {
+    const cookies = readCookies();
+    const index = chunkOf(String(field));
+    const chunk = readChunks(cookies, key)[index];
+    const fields = chunk ? { ...chunk.fields } : {};
+    fields[field] = value;
+    return writeChunk(cookies, key, index, fields);
+}
+
+/**
+ * Save a single top-level field in a cookie of its own, which writes of other fields never
+ * rewrite (a field of the same name in its chunk moves out of it)
+ * @param {string} key - Storage key
+ * @param {string} field - Field name
+ * @param {*} value - JSON-serializable value
+ * @returns {boolean} - Whether the cookie had to be written
+ * @throws {Error} - If the value is too big for one cookie
+ */
+function writeFieldCookie(key, field, value) {
+    const cookies = readCookies();
+    const written = writeFieldCookieValue(cookies, key, String(field), value);
+    const index = chunkOf(String(field));
+    const chunk = readChunks(cookies, key)[index];
+    if (chunk && field in chunk.fields) {
+        const fields = { ...chunk.fields };
+        delete fields[field];
+        writeChunk(cookies, key, index, fields);
+    }
+    return written;
+}
+
+/**
+ * Check whether a field is kept in a cookie of its own, without decoding any saved data
+ * @param {string} key - Storage key
+ * @param {string} field - Field name
+ * @returns {boolean}
+ */
+function hasFieldCookie(key, field) {
+    return readCookies().has(fieldCookieName(key, String(field)));
+}
+
+/**
+ * Remove a single top-level field of the data stored under a key
+ * @param {string} key - Storage key
+ * @param {string} field - Field name
+ */
+function removeSaveField(key, field) {
+    const cookies = readCookies();
+    writeFieldCookieValue(cookies, key, String(field), undefined);
+    const index = chunkOf(String(field));
+    const chunk = readChunks(cookies, key)[index];
+    if (!chunk || !(field in chunk.fields)) return;
+    const fields = { ...chunk.fields };
+    delete fields[field];
+    writeChunk(cookies, key, index, fields);
+}
+
+// Data of the version 1 layout, one cookie per field
+function readLegacyFields(fields, key) {
+    let data = {};
+    for (const [name, value] of fields) {
+        const field = name.slice(key.length + 1);
+        if (field === V1_VERSION_FIELD) continue;
+        if (field === ROOT_FIELD) {
+            return decodeValue(value);
+        }
+        data[decodeURIComponent(field)] = decodeValue(value);
+    }
+    return data;
+}
+
+/**
+ * Load data saved under a key, migrating older layouts to the current schema
+ * @param {string} key - Storage key
+ * @returns {*} - The saved data, or null if nothing is stored
+ */
+function readSaveData(key) {
+    const cookies = readCookies();
+
+    let version;
+    let data;
+    try {
+        const chunks = readChunks(cookies, key).filter(Boolean);
+        const ownFields = readFieldCookies(cookies, key);
+        const legacy = legacyFieldCookies(cookies, key);
+        if (chunks.length > 0 || ownFields.size > 0) {
+            version = Math.min(...chunks.map(chunk => chunk.version), ...[...ownFields.values()].map(own => own.version));
+            data = Object.assign({}, ...chunks.map(chunk => chunk.fields));
+            for (const [field, own] of ownFields) {
+                data[field] = own.value;
+            }
+            if (ROOT_FIELD in data) {
+                data = data[ROOT_FIELD];
+            }
+        } else if (legacy.size > 0) {
+            version = parseInt(legacy.get(`${key}.${V1_VERSION_FIELD}`), 10);
+            data = readLegacyFields(legacy, key);
+        } else if (cookies.has(key)) {
+            version = 0;
+            data = JSON.parse(cookies.get(key));
+        } else {
+            return null;
+        }
+    } catch (e) {
+        debug(MODULE_NAME, `Could not decode save data for '${key}': ${e.message}`);
+        return null;
+    }
+
+    if (version < SAVE_SCHEMA_VERSION) {
+        for (let v = version; v < SAVE_SCHEMA_VERSION; v++) {
+            if (!migrations[v]) {
+                throw new Error(`No save migration registered from version ${v}`);
+            }
+            data = migrations[v](data);
+        }
+        debug(MODULE_NAME, `Migrated '${key}' from schema v${version} to v${SAVE_SCHEMA_VERSION}`);
+        writeSaveData(key, data);
+    }
+    return data;
+}
+
+/**
+ * Remove all data saved under a key
+ * @param {string} key - Storage key
+ */
+function clearSaveData(key) {
+    const cookies = readCookies();
+    for (let i = 0; i < SAVE_CHUNKS; i++) {
+        writeChunk(cookies, key, i, {});
+    }
+    for (const field of readFieldCookies(cookies, key).keys()) {
+        writeFieldCookieValue(cookies, key, field, undefined);
+    }
+    removeLegacyCookies(cookies, key);
+}
+
+export {
+    SAVE_SCHEMA_VERSION,
+    registerSaveMigration,
+    useCookieJar,
+    writeSaveData,
+    writeSaveField,
+    writeFieldCookie,
+    hasFieldCookie,
+    removeSaveField,
+    readSaveData,
+    clearSaveData
+};
@@ -0,0 +1,41 @@
+"""
+MONDAY - Demo Version: the bathroom scene
+Content pack loaded by main.py with enter_scene("bathroom_menu"). It shares the functions
+and state of main.py (pause, menu, game_over, state...) and can't be run on its own.
+"""
+
+def bathroom_menu():
+    choice = menu("   DO YOU GO?   ", [
+        ("RELIEVE SELF", relieve_self), 
+        ("HOLD IT IN", hold_it_in)
+    ])
+    # Both relieve_self and hold_it_in need async
+    await choice()
+
+def hold_it_in():
+    print("YOU WET YOUR PANTS.")
+    state["pants_wet"] = True
+    pause()
+    ed_mcmahon()
+
+def relieve_self():
+    print("AHHHHH...")
+    pause()
+    ed_mcmahon()
+
+def ed_mcmahon():
+    if not state["pants_wet"]:
+        print("ED MCMAHON SHOWS UP AT YOUR DOOR!")
+        print("HE SAYS YOU'VE WON 10 MILLION BUCKS!")
+        print("WHOO-HOO!")
+        print("YOU STUFF THE ENTIRE 10 MILLION BUCKS IN YOUR POCKET.")
+        state["has_money"] = True
+        pause()
+        enter_scene("breakfast_demo")
+    else:
+        print("ED MCMAHON SHOWS UP AT YOUR DOOR!")
+        print("HE SAYS YOU'VE WON 10 MILLION BUCKS!")
+        print("BUT HE SEES YOUR PANTS AND IS DISGUSTED.")
+        print("HE TAKES BACK THE MONEY AND LEAVES.")
+        pause()
+        game_over()
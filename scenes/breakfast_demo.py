@@ -0,0 +1,44 @@
+"""
+MONDAY - Demo Version: the end of the demo
+Content pack loaded with enter_scene("breakfast_demo"). It shares the functions
+and state of main.py (pause, menu, start_demo, state...) and can't be run on its own.
+"""
+
+def breakfast_demo():
+    # Increment completion count when demo is completed
+    completion_count = increment_completion_count()
+    
+    print("Now you need to get ready for school...")
+    print("But this is where the demo ends!")
+    pause()
+    print("\n" + "="*50)
+    print("         DEMO COMPLETE!")
+    print("="*50)
+    
+    # Show completion message
+    if completion_count == 1:
+        print(f"\n🎉 Congratulations! You completed the Monday demo!")
+        print("🏆 This is your first completion!")
+    else:
+        print(f"\n🎉 Demo completed! This is completion #{completion_count}!")
+        if completion_count >= 3:
+            print("🌟 You're becoming a Monday survival expert!")
+    
+    print("\nIn the full game, you would continue with:")
+    print("• Washing hands and eating breakfast")
+    print("• Packing your school bag")
+    print("• Catching the bus to school")
+    print("• Navigating classes and social situations")
+    print("• Making choices that affect your survival")
+    print("• Discovering multiple endings")
+    print("\nThe full game contains dozens of decision points")
+    print("and hilariously unexpected death scenes!")
+    print("\nPlay the full game at: https://lazyspaniard.com/monday/")
+    pause()
+    
+    choice = menu("What would you like to do?", [
+        ("PLAY AGAIN", start_demo),
+        ("MAIN MENU", main_menu),
+        ("QUIT", quit_demo)
+    ])
+    await choice()
@@ -0,0 +1,380 @@
+"""
+Multi-player program server
+Serves programs to players whose devices can't download Pyodide: every connection plays a
+session of its own under CPython, with the browser's transform and the builtins of
+bootstrap.py. The sessions share one interpreter and event loop (bootstrap.start_session),
+each with its own namespace and with its I/O routed to its connection, so one process holds
+thousands of players who are mostly reading or thinking. Saved data and statistics, kept in
+cookies in the browser, are kept per player in <data-dir>/<player>.json.
+
+Plain TCP speaks text for telnet or nc: output arrives line by line, and a prompt ends with
+telnet's Go Ahead (IAC GA), which telnet clients don't show. WebSocket, when the websockets
+package is installed, speaks JSON: {"type": "print", "text", "msgType"}, {"type": "input",
+"prompt"} and {"type": "done", "error"} messages, answered with text frames;
+ws://host:port/main.py?player=NAME picks the program and the player. Whatever isn't picked
+is asked for first.
+
+Usage: python server.py [program.py ...] [--host HOST] [--port N] [--ws-port N] [--data-dir DIR]
+                        [--virtual-time] [--idle-timeout S] [--max-sessions N] [--stats S]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import urllib.parse
+
+import bootstrap
+import runner
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+DEFAULT_PORT = 4000
+DEFAULT_WS_PORT = 4001
+# Telnet's Interpret As Command + Go Ahead: the prompt is complete, the player's turn
+GO_AHEAD = b"\xff\xf9"
+# Telnet negotiation a client may send among its lines
+TELNET_COMMAND = re.compile(rb"\xff[\xfb-\xfe].|\xff[\xf0-\xfa]", re.DOTALL)
+UNSAFE_NAME = re.compile(r"[^\w.-]")
+MAX_NAME_LENGTH = 64
+# Seconds between a change to a player's data and writing it
+SAVE_DELAY = 1.0
+PLAYER_PROMPT = "Player name (empty to play without saving): "
+# Content pack code, transformed once for all sessions: (program path, name) -> future
+pack_cache = {}
+
+class Disconnected(BaseException):
+    """Raised in a session whose player left or was idle too long; a BaseException so the program's own handlers don't catch it"""
+
+class TcpChannel:
+    """A player on a plain TCP connection: output as text lines, one line per answer"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def send(self, msg_type, text):
+        if not self.writer.is_closing():
+            self.writer.write(f"{text}\n".encode("utf-8"))
+
+    async def drain(self):
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            raise Disconnected()
+
+    async def ask(self, prompt, timeout):
+        if self.writer.is_closing():
+            raise Disconnected()
+        self.writer.write(prompt.encode("utf-8") + GO_AHEAD)
+        await self.drain()
+        try:
+            line = await asyncio.wait_for(self.reader.readline(), timeout)
+        except (ConnectionError, asyncio.TimeoutError):
+            raise Disconnected()
+        if not line:
+            raise Disconnected()
+        return TELNET_COMMAND.sub(b"", line).decode("utf-8", "replace").rstrip("\r\n")
+
+    async def finish(self, error):
+        if error:
+            self.send("error", f"Program error: {error}")
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+class WebSocketChannel:
+    """A player on a WebSocket: JSON messages out, text frames as answers"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        # Output is produced synchronously by print() and sent by one task, in order
+        self.outbox = []
+        self.sending = None
+
+    def _post(self, message):
+        self.outbox.append(json.dumps(message))
+        if self.sending is None or self.sending.done():
+            self.sending = asyncio.ensure_future(self._send_all())
+
+    async def _send_all(self):
+        try:
+            while self.outbox:
+                batch, self.outbox = self.outbox, []
+                for message in batch:
+                    await self.websocket.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            self.outbox = []
+
+    def send(self, msg_type, text):
+        self._post({"type": "print", "text": text, "msgType": msg_type})
+
+    async def drain(self):
+        if self.sending is not None:
+            await self.sending
+
+    async def ask(self, prompt, timeout):
+        self._post({"type": "input", "prompt": prompt})
+        await self.drain()
+        try:
+            answer = await asyncio.wait_for(self.websocket.recv(), timeout)
+        except (websockets.exceptions.ConnectionClosed, asyncio.TimeoutError):
+            raise Disconnected()
+        return answer.decode("utf-8", "replace") if isinstance(answer, bytes) else answer
+
+    async def finish(self, error):
+        self._post({"type": "done", "error": error})
+        await self.drain()
+        await self.websocket.close()
+
+class PlayerStore:
+    """Saved data and statistics of the players, a JSON file each, written shortly after a change"""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        # name -> {"data": {key: JSON text}, "events": {key: {event: count}}, "sessions": n}
+        self.players = {}
+        self.pending = {}
+
+    def path(self, name):
+        return os.path.join(self.data_dir, f"{name}.json")
+
+    def open(self, name):
+        """The record of a player, shared by all their sessions; a private one for an empty name"""
+        if not name:
+            return {"data": {}, "events": {}, "sessions": 1}
+        record = self.players.get(name)
+        if record is None:
+            record = {"data": {}, "events": {}, "sessions": 0}
+            if os.path.exists(self.path(name)):
+                with open(self.path(name), encoding="utf-8") as f:
+                    saved = json.load(f)
+                record["data"] = saved.get("data", {})
+                record["events"] = saved.get("events", {})
+            self.players[name] = record
+        record["sessions"] += 1
+        return record
+
+    def changed(self, name):
+        if name and name not in self.pending:
+            self.pending[name] = asyncio.get_running_loop().call_later(SAVE_DELAY, self.write, name)
+
+    def write(self, name):
+        self.pending.pop(name, None)
+        record = self.players[name]
+        temporary = self.path(name) + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"data": record["data"], "events": record["events"]}, f)
+        os.replace(temporary, self.path(name))
+
+    def flush(self):
+        """Write every pending change now"""
+        for name in list(self.pending):
+            self.pending.pop(name).cancel()
+            self.write(name)
+
+    def close(self, name):
+        if not name:
+            return
+        if name in self.pending:
+            self.pending.pop(name).cancel()
+            self.write(name)
+        record = self.players[name]
+        record["sessions"] -= 1
+        if record["sessions"] == 0:
+            del self.players[name]
+
+class PlayerSession(runner.Session):
+    """Host side of a remote player's run: I/O over the connection, saved data in the player's record"""
+
+    def __init__(self, channel, player, record, players, idle_timeout=None, **kwargs):
+        super().__init__(inputs=[], **kwargs)
+        self.channel = channel
+        self.player = player
+        self.players = players
+        self.idle_timeout = idle_timeout
+        self.store = record["data"]
+        self.events = record["events"]
+
+    # No transcript: a session may run for hours
+    def record(self, msg_type, text):
+        if msg_type != "user":
+            self.channel.send(msg_type, text)
+
+    async def input(self, prompt=""):
+        return await self.channel.ask(str(prompt), self.idle_timeout)
+
+    async def sleep(self, seconds):
+        # Output waits for a slow connection here rather than piling up
+        await self.channel.drain()
+        await super().sleep(seconds)
+
+    def save_data(self, text, key="app_data"):
+        self.players.changed(self.player)
+        return super().save_data(text, key)
+
+    def clear_data(self, key="app_data"):
+        self.players.changed(self.player)
+        return super().clear_data(key)
+
+    def record_event(self, event, key="app_events", count=1):
+        self.players.changed(self.player)
+        return super().record_event(event, key, count)
+
+    def clear_events(self, key="app_events"):
+        self.players.changed(self.player)
+        super().clear_events(key)
+
+    async def load_pack(self, name):
+        key = (self.program_path, name)
+        if key not in pack_cache:
+            pack_cache[key] = asyncio.ensure_future(super().load_pack(name))
+        try:
+            return await asyncio.shield(pack_cache[key])
+        except Exception:
+            pack_cache.pop(key, None)
+            raise
+
+class GameServer:
+    """The served programs and their sessions, one per connection"""
+
+    def __init__(self, paths, data_dir, real_time=True, idle_timeout=None, max_sessions=0):
+        prepared = runner.prepare_programs(paths)
+        # name -> (path, prepared code, compiled code): compiled once for every session
+        self.programs = {
+            os.path.basename(path): (path, code, bootstrap.compile_program(code, path))
+            for path, code in prepared.items()
+        }
+        self.players = PlayerStore(data_dir)
+        self.real_time = real_time
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.stats = {"active": 0, "peak": 0, "started": 0, "finished": 0, "left": 0, "errors": 0}
+
+    async def choose_program(self, channel):
+        names = sorted(self.programs)
+        if len(names) == 1:
+            return names[0]
+        channel.send("python", "\n".join(f"  {i}. {name}" for i, name in enumerate(names, 1)))
+        while True:
+            answer = (await channel.ask("Program: ", self.idle_timeout)).strip()
+            if answer.isdigit() and 1 <= int(answer) <= len(names):
+                return names[int(answer) - 1]
+            if answer in self.programs:
+                return answer
+            channel.send("error", f"No program {answer!r}")
+
+    async def play(self, channel, program=None, player=None):
+        """Run one session for a connection, asking for what the connection didn't pick"""
+        stats = self.stats
+        if self.max_sessions and stats["active"] >= self.max_sessions:
+            await channel.finish("The server is full, try again later")
+            return
+        stats["active"] += 1
+        stats["peak"] = max(stats["peak"], stats["active"])
+        error = None
+        try:
+            if program is None:
+                program = await self.choose_program(channel)
+            if player is None:
+                player = await channel.ask(PLAYER_PROMPT, self.idle_timeout)
+            player = UNSAFE_NAME.sub("_", player.strip())[:MAX_NAME_LENGTH]
+            path, code, compiled = self.programs[program]
+            record = self.players.open(player)
+            try:
+                session = PlayerSession(channel, player, record, self.players, self.idle_timeout,
+                                        real_time=self.real_time, program_path=path, prepared_code=code)
+                stats["started"] += 1
+                task = bootstrap.start_session(compiled, bootstrap.create_runtime(session.host()), path)
+                try:
+                    await task
+                finally:
+                    task.cancel()
+                stats["finished"] += 1
+            finally:
+                self.players.close(player)
+        except Disconnected:
+            stats["left"] += 1
+        except Exception as e:
+            stats["errors"] += 1
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            stats["active"] -= 1
+        try:
+            await channel.finish(error)
+        except (ConnectionError, Disconnected):
+            pass
+
+    async def handle_tcp(self, reader, writer):
+        await self.play(TcpChannel(reader, writer))
+
+    async def handle_websocket(self, websocket, path=None):
+        # websockets passes the path as an argument in old versions and as request.path in new ones
+        request = getattr(websocket, "request", None)
+        target = urllib.parse.urlsplit(request.path if request is not None else path or websocket.path)
+        program = os.path.basename(urllib.parse.unquote(target.path))
+        player = urllib.parse.parse_qs(target.query).get("player", [None])[0]
+        await self.play(WebSocketChannel(websocket), program if program in self.programs else None, player)
+
+    def format_stats(self):
+        return ", ".join(f"{name} {value}" for name, value in self.stats.items())
+
+def raise_file_limit():
+    """Allow as many open connections as the system lets this process have"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+async def serve(args):
+    server = GameServer(args.programs, args.data_dir, real_time=not args.virtual_time,
+                        idle_timeout=args.idle_timeout or None, max_sessions=args.max_sessions)
+    servers = [await asyncio.start_server(server.handle_tcp, args.host, args.port, backlog=1024)]
+    print(f"Serving {', '.join(server.programs)} on tcp://{args.host}:{args.port}", file=sys.stderr)
+    if args.ws_port:
+        if websockets is None:
+            print("WebSocket disabled: the websockets package is not installed", file=sys.stderr)
+        else:
+            servers.append(await websockets.serve(server.handle_websocket, args.host, args.ws_port))
+            print(f"Serving WebSocket on ws://{args.host}:{args.ws_port}/<program>?player=NAME", file=sys.stderr)
+    try:
+        while True:
+            await asyncio.sleep(args.stats or 3600)
+            if args.stats:
+                print(server.format_stats(), file=sys.stderr)
+    finally:
+        server.players.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve programs to remote players over TCP and WebSocket")
+    parser.add_argument("programs", nargs="*", default=[os.path.join(runner.PROJECT_DIR, "main.py")],
+                        help="programs to serve (default: main.py)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (0.0.0.0 for every interface)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="plain TCP port")
+    parser.add_argument("--ws-port", type=int, default=DEFAULT_WS_PORT, help="WebSocket port, 0 to turn it off")
+    parser.add_argument("--data-dir", default=os.path.join(runner.DATA_ROOT, "players"),
+                        help="directory of the players' saved data")
+    parser.add_argument("--virtual-time", action="store_true", help="don't wait in time.sleep() (for benchmarks)")
+    parser.add_argument("--idle-timeout", type=float, default=1800.0, help="seconds a prompt waits before the player is dropped, 0 for ever")
+    parser.add_argument("--max-sessions", type=int, default=0, help="most players at once, 0 for no limit")
+    parser.add_argument("--stats", type=float, default=0.0, metavar="S", help="print session counts every S seconds")
+    args = parser.parse_args()
+    raise_file_limit()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
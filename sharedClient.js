@@ -0,0 +1,117 @@
+// sharedClient.js
+// The page's side of the shared interpreter (sharedHost.js, ?shared=true)
+//
+// Connects the tab to the origin's SharedWorker and answers what the worker asks on the
+// program's behalf - output, input, sleep(), content packs - with the page's own
+// functions. Cookie changes made by the worker for any tab are written to document.cookie
+// here, so saved data survives the worker, which lives only as long as its tabs.
+
+import { debug } from './debugUtils.js';
+
+const MODULE_NAME = 'sharedClient.js';
+const HOST_SCRIPT = 'sharedHost.js';
+const HOST_NAME = 'pyodide-shared-host';
+
+/**
+ * Whether this browser can run the shared host
+ * @returns {boolean}
+ */
+function sharedHostSupported() {
+    return typeof SharedWorker === 'function';
+}
+
+/**
+ * Connect to the shared interpreter
+ * @param {string} baseUrl - Result of pyodideBaseUrl()
+ * @param {string} programFile - The program the page runs (its data directory is mounted for it)
+ * @param {Object} handlers - { print(text, type), stream(text, type), input(prompt), sleep(seconds),
+ *                              loadPack(name), prefetchPack(name) }; the async ones return promises
+ * @returns {Object} - { ready: Promise<{ pythonVersion, tabs }>, run(code), stop(), scheduleSync(), flush(), close() }
+ */
+function connectSharedHost(baseUrl, programFile, handlers) {
+    const debugParam = new URLSearchParams(window.location.search).get('debug') === 'true' ? '&debug=true' : '';
+    const worker = new SharedWorker(`${HOST_SCRIPT}?pyodide=${encodeURIComponent(baseUrl)}${debugParam}`,
+        { type: 'module', name: HOST_NAME });
+    const port = worker.port;
+    let readyCallbacks;
+    let runCallbacks = null;
+    const ready = new Promise((resolve, reject) => { readyCallbacks = { resolve, reject }; });
+
+    const requests = {
+        stream: (text, type) => handlers.stream(text, type),
+        input: prompt => handlers.input(prompt),
+        sleep: seconds => handlers.sleep(seconds),
+        load_pack: name => handlers.loadPack(name)
+    };
+
+    port.onmessage = ({ data: message }) => {
+        switch (message.type) {
+            case 'ready':
+                debug(MODULE_NAME, `Shared interpreter ready (${message.tabs} tab(s) connected)`);
+                readyCallbacks.resolve(message);
+                break;
+            case 'failed':
+                readyCallbacks.reject(new Error(message.error));
+                break;
+            case 'print':
+                handlers.print(message.text, message.msgType);
+                break;
+            case 'prefetch_pack':
+                handlers.prefetchPack(message.name);
+                break;
+            case 'request':
+                Promise.resolve()
+                    .then(() => requests[message.kind](...message.args))
+                    .then(
+                        value => port.postMessage({ type: 'reply', id: message.id, value: value === undefined ? null : value }),
+                        error => port.postMessage({ type: 'reply', id: message.id, error: error.message || String(error) })
+                    );
+                break;
+            case 'cookie':
+                document.cookie = message.assignment;
+                break;
+            case 'done':
+                if (runCallbacks) {
+                    const { resolve, reject } = runCallbacks;
+                    runCallbacks = null;
+                    if (message.error) {
+                        reject(new Error(message.error));
+                    } else {
+                        resolve();
+                    }
+                }
+                break;
+        }
+    };
+    port.start();
+    port.postMessage({ type: 'hello', cookies: document.cookie, programFile });
+
+    // The worker can't tell that a tab went away
+    window.addEventListener('pagehide', () => port.postMessage({ type: 'close' }));
+
+    return {
+        ready,
+        // Run wrapped program code in this tab's session; rejects with the program's error
+        run(code) {
+            return new Promise((resolve, reject) => {
+                runCallbacks = { resolve, reject };
+                port.postMessage({ type: 'run', code });
+            });
+        },
+        stop() {
+            port.postMessage({ type: 'stop' });
+        },
+        // The worker saves program files itself at the end of a run; these ask for it sooner
+        scheduleSync() {
+            port.postMessage({ type: 'sync' });
+        },
+        flush() {
+            port.postMessage({ type: 'flush' });
+        },
+        close() {
+            port.postMessage({ type: 'close' });
+        }
+    };
+}
+
+export { sharedHostSupported, connectSharedHost };
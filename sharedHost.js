@@ -0,0 +1,251 @@
+// sharedHost.js
+// One Pyodide interpreter for every tab of the origin, run as a SharedWorker (?shared=true)
+//
+// Each tab connects over its own MessagePort (see sharedClient.js) and runs its program in
+// a session of its own: an asyncio task with its own namespace, builtins and I/O routing
+// (start_session() in bootstrap.py), the way the test suite runs programs side by side. Output, input, sleep()
+// and content packs belong to the tab and go back over its port. Saved data and statistics
+// are handled here, by saveStore.js and eventJournal.js, against one copy of the origin's
+// cookies: a worker has no cookies, so the copy is seeded by the first tab and every change
+// is sent to all tabs, which write it to document.cookie. With every write going through
+// one place, two tabs bumping the same counter no longer race.
+// Program files live in the same IndexedDB-backed data directories as in a page
+// (persistentFs.js); tabs running the same program share its directory. The interpreter's
+// cwd is left alone: each session's open() and os resolve relative paths against its
+// program's directory (js_data_dir, see create_runtime() in bootstrap.py).
+
+import { debug, setDebugModules } from './debugUtils.js';
+import { useCookieJar, writeSaveData, readSaveData, clearSaveData } from './saveStore.js';
+import { recordEvent, eventCount, clearEvents } from './eventJournal.js';
+import { createPersistentFs } from './persistentFs.js';
+
+const MODULE_NAME = 'sharedHost.js';
+const params = new URL(self.location.href).searchParams;
+// Set by sharedClient.js from pyodideBaseUrl(), so the worker loads what the page would
+const PYODIDE_BASE_URL = params.get('pyodide');
+
+if (params.get('debug') === 'true') {
+    setDebugModules({ 'sharedHost.js': true, 'persistentFs.js': true });
+}
+
+// Ports of the connected tabs, which all receive cookie changes
+const ports = new Set();
+// The origin's cookies: name -> raw value
+const cookies = new Map();
+let cookiesSeeded = false;
+
+useCookieJar({
+    read: () => [...cookies].map(([name, value]) => `${name}=${value}`).join('; '),
+    write: assignment => {
+        const [pair, ...attributes] = assignment.split(';');
+        const eq = pair.indexOf('=');
+        const name = pair.slice(0, eq).trim();
+        const expires = attributes.map(a => a.trim()).find(a => a.startsWith('expires='));
+        if (expires && new Date(expires.slice('expires='.length)) <= new Date()) {
+            cookies.delete(name);
+        } else {
+            cookies.set(name, pair.slice(eq + 1));
+        }
+        for (const port of ports) {
+            port.postMessage({ type: 'cookie', assignment });
+        }
+    }
+});
+
+function seedCookies(text) {
+    if (cookiesSeeded) return;
+    cookiesSeeded = true;
+    for (const part of String(text || '').split(';')) {
+        const eq = part.indexOf('=');
+        if (eq === -1) continue;
+        cookies.set(part.slice(0, eq).trim(), part.slice(eq + 1));
+    }
+    debug(MODULE_NAME, `Cookies seeded with ${cookies.size} entries`);
+}
+
+// The interpreter, booted once when the first tab connects
+const interpreter = (async () => {
+    const { loadPyodide } = await import(`${PYODIDE_BASE_URL}pyodide.mjs`);
+    const pyodide = await loadPyodide({ indexURL: PYODIDE_BASE_URL });
+    const response = await fetch('bootstrap.py');
+    if (!response.ok) {
+        throw new Error(`Could not load bootstrap.py (HTTP ${response.status})`);
+    }
+    // Without js_print in its globals the bootstrap only defines create_runtime() and friends
+    await pyodide.runPythonAsync(await response.text());
+    debug(MODULE_NAME, `Interpreter ready for ${ports.size} tab(s)`);
+    return {
+        pyodide,
+        createRuntime: pyodide.globals.get('create_runtime'),
+        startSession: pyodide.globals.get('start_session'),
+        version: pyodide.runPython('import sys; sys.version.split()[0]')
+    };
+})();
+
+// Data directory of each program, mounted by the first session that runs it
+const programFiles = new Map();
+
+async function filesFor(programFile) {
+    if (!programFiles.has(programFile)) {
+        const files = createPersistentFs(programFile);
+        const { pyodide } = await interpreter;
+        await files.mount(pyodide, { chdir: false });
+        programFiles.set(programFile, files);
+    }
+    return programFiles.get(programFile);
+}
+
+function createSession(port) {
+    const pending = new Map();
+    let nextId = 1;
+    const session = {
+        port,
+        programFile: 'main.py',
+        files: null,
+        running: false,
+        stopRequested: false,
+        deliverInput: null
+    };
+
+    // Ask the tab for something and wait for its reply
+    session.request = (kind, ...args) => {
+        const id = nextId++;
+        return new Promise((resolve, reject) => {
+            pending.set(id, { resolve, reject });
+            port.postMessage({ type: 'request', id, kind, args });
+        });
+    };
+
+    session.reply = ({ id, value, error }) => {
+        const waiting = pending.get(id);
+        if (!waiting) return;
+        pending.delete(id);
+        if (error) {
+            waiting.reject(new Error(error));
+        } else {
+            waiting.resolve(value);
+        }
+    };
+
+    // The tab went away: nothing it was asked will be answered
+    session.abandon = () => {
+        session.stopRequested = true;
+        for (const waiting of pending.values()) {
+            waiting.reject(new Error('Tab closed'));
+        }
+        pending.clear();
+    };
+
+    return session;
+}
+
+// The js_* host functions of one session, as app.js provides them in a page
+function sessionHost(session) {
+    return {
+        js_data_dir: session.files.dataDir,
+        js_print: (text, type = 'python') => {
+            session.port.postMessage({ type: 'print', text: String(text), msgType: type });
+        },
+        js_stream: (text, type = 'python') => session.request('stream', String(text), type),
+        js_request_input: prompt => {
+            // A good moment to save the files the program wrote so far
+            session.files.scheduleSync();
+            session.request('input', String(prompt)).then(
+                value => session.deliverInput(value),
+                error => session.deliverInput(null, error.message)
+            );
+        },
+        js_sleep: seconds => session.request('sleep', Number(seconds)),
+        js_stop_requested: () => session.stopRequested,
+        js_load_pack: name => session.request('load_pack', String(name)),
+        js_prefetch_pack: name => {
+            session.port.postMessage({ type: 'prefetch_pack', name: String(name) });
+        },
+        // Saved data crosses the bridge as JSON text (see save_data/load_data in bootstrap.py)
+        js_save_data: (text, key = 'app_data') => {
+            writeSaveData(key, JSON.parse(text));
+            return true;
+        },
+        js_load_data: (key = 'app_data') => {
+            const data = readSaveData(key);
+            return data === null ? null : JSON.stringify(data);
+        },
+        js_clear_data: (key = 'app_data') => {
+            clearSaveData(key);
+            return true;
+        },
+        js_record_event: recordEvent,
+        js_event_count: eventCount,
+        js_clear_events: clearEvents
+    };
+}
+
+async function runProgram(session, code) {
+    if (session.running) return;
+    session.running = true;
+    session.stopRequested = false;
+    const { pyodide, createRuntime, startSession } = await interpreter;
+    let host, runtime, task;
+    let error = null;
+    try {
+        session.files = await filesFor(session.programFile);
+        host = pyodide.toPy(sessionHost(session));
+        runtime = createRuntime(host);
+        session.deliverInput = runtime.get('_deliver_input');
+        task = startSession(code, runtime, session.programFile);
+        await task;
+    } catch (err) {
+        error = err.message;
+    } finally {
+        for (const proxy of [session.deliverInput, host, runtime, task]) {
+            if (proxy) proxy.destroy();
+        }
+        session.deliverInput = null;
+        session.running = false;
+        if (session.files) {
+            session.files.flush();
+        }
+    }
+    debug(MODULE_NAME, `Run of ${session.programFile} finished${error ? `: ${error}` : ''}`);
+    session.port.postMessage({ type: 'done', error, stopped: session.stopRequested });
+}
+
+self.addEventListener('connect', event => {
+    const port = event.ports[0];
+    const session = createSession(port);
+    ports.add(port);
+
+    port.onmessage = ({ data: message }) => {
+        switch (message.type) {
+            case 'hello':
+                seedCookies(message.cookies);
+                session.programFile = message.programFile || 'main.py';
+                interpreter.then(
+                    ({ version }) => port.postMessage({ type: 'ready', pythonVersion: version, tabs: ports.size }),
+                    error => port.postMessage({ type: 'failed', error: error.message })
+                );
+                break;
+            case 'run':
+                runProgram(session, message.code);
+                break;
+            case 'stop':
+                session.stopRequested = true;
+                break;
+            case 'reply':
+                session.reply(message);
+                break;
+            case 'sync':
+                if (session.files) session.files.scheduleSync();
+                break;
+            case 'flush':
+                if (session.files) session.files.flush();
+                break;
+            case 'close':
+                session.abandon();
+                ports.delete(port);
+                debug(MODULE_NAME, `Tab closed, ${ports.size} left`);
+                break;
+        }
+    };
+    port.start();
+});
@@ -0,0 +1,226 @@
+// sw.js
+// Cache-first service worker for the interpreter and the app's files (registered by assetConfig.js)
+//
+// Two caches, both named after CACHE_VERSION (from the registration URL):
+// - the runtime cache holds everything fetched from the Pyodide base URL - pyodide.js,
+//   the wasm binary, the stdlib and packages - as it is first requested. Its name also
+//   carries a digest of the base URL, so moving to another Pyodide version or host
+//   starts a new cache and the old interpreter's files are deleted on activation;
+// - the app cache holds the files listed in asset-manifest.json and is named after the
+//   manifest's version. After serving a page from cache, the worker fetches the manifest
+//   in the background; a new version is downloaded into a cache of its own, every file is
+//   checked against its SHA-256 digest, and a complete, matching cache is kept as pending.
+//   It replaces the old one at the next navigation, and every page keeps the cache it was
+//   loaded from, so a page never mixes files of two versions.
+// Without a manifest (e.g. a deployment that skipped buildManifest.js) app files just
+// come from the network; the interpreter is still cached.
+
+const params = new URL(self.location.href).searchParams;
+const CACHE_VERSION = params.get('v') || '0';
+const PYODIDE_BASE_URL = params.get('pyodide') || '';
+const CACHE_PREFIX = 'pyodide-chat-';
+// Short digest of a string (djb2), for cache names
+function nameDigest(text) {
+    let hash = 5381;
+    for (let i = 0; i < text.length; i++) {
+        hash = ((hash * 33) ^ text.charCodeAt(i)) >>> 0;
+    }
+    return hash.toString(36);
+}
+
+const RUNTIME_CACHE = `${CACHE_PREFIX}runtime-v${CACHE_VERSION}-${nameDigest(PYODIDE_BASE_URL)}`;
+const APP_CACHE_PREFIX = `${CACHE_PREFIX}app-v${CACHE_VERSION}-`;
+const SCOPE = self.registration.scope;
+const MANIFEST_URL = new URL('asset-manifest.json', SCOPE).href;
+const INDEX_URL = new URL('index.html', SCOPE).href;
+// 'active' or 'pending', stored in those app caches so a restarted worker can tell them
+// from the older caches kept for pages that are still open
+const STATE_URL = new URL('sw-app-cache-state', SCOPE).href;
+
+// The complete app caches in use and waiting, { name, cache, manifest }, looked up once per
+// worker start, and the cache each page was loaded from (by client id)
+let current = null;
+let pending = null;
+let lookup = null;
+let updating = null;
+let downloading = null;
+const clientCaches = new Map();
+
+async function digestOf(response) {
+    const bytes = await response.clone().arrayBuffer();
+    const hash = new Uint8Array(await crypto.subtle.digest('SHA-256', bytes));
+    return 'sha256-' + btoa(String.fromCharCode(...hash));
+}
+
+// Find the app cache in use and the pending one among the completed caches (the manifest is stored last)
+function lookUpAppCaches() {
+    lookup = lookup || findAppCaches();
+    return lookup;
+}
+
+async function findAppCaches() {
+    for (const name of (await caches.keys()).filter(key => key.startsWith(APP_CACHE_PREFIX))) {
+        const cache = await caches.open(name);
+        const stored = await cache.match(MANIFEST_URL);
+        if (!stored) continue;
+        const entry = { name, cache, manifest: await stored.json() };
+        const state = await cache.match(STATE_URL);
+        const text = state ? await state.text() : 'active';
+        if (text === 'active' && !current) current = entry;
+        if (text === 'pending' && !pending) pending = entry;
+    }
+}
+
+// The app cache in use
+async function currentAppCache() {
+    await lookUpAppCaches();
+    return current;
+}
+
+// Switch to the pending app cache; pages loaded before keep theirs
+async function promotePending() {
+    if (!pending) return;
+    const previous = current;
+    current = pending;
+    pending = null;
+    await current.cache.put(STATE_URL, new Response('active'));
+    if (previous) {
+        await previous.cache.put(STATE_URL, new Response('old'));
+    }
+    await dropUnusedAppCaches();
+}
+
+// Delete the app caches no open page, nor the next one, can use
+async function dropUnusedAppCaches() {
+    const live = new Set((await self.clients.matchAll({ includeUncontrolled: true })).map(client => client.id));
+    for (const id of clientCaches.keys()) {
+        if (!live.has(id)) clientCaches.delete(id);
+    }
+    const keep = new Set([current, pending, ...clientCaches.values()].filter(Boolean).map(entry => entry.name));
+    for (const key of await caches.keys()) {
+        if (key.startsWith(APP_CACHE_PREFIX) && !keep.has(key) && key !== downloading) {
+            await caches.delete(key);
+        }
+    }
+}
+
+// Download a new manifest version into its own cache, pending once every file checks out
+async function updateAppCache() {
+    const response = await fetch(MANIFEST_URL, { cache: 'no-cache' });
+    if (!response.ok) return;
+    const manifest = await response.clone().json();
+    await lookUpAppCaches();
+    if ([current, pending].some(entry => entry && entry.manifest.version === manifest.version)) return;
+
+    const name = APP_CACHE_PREFIX + manifest.version;
+    const cache = await caches.open(name);
+    downloading = name;
+    try {
+        await Promise.all(Object.entries(manifest.files).map(async ([file, expected]) => {
+            const url = new URL(file, SCOPE).href;
+            const fileResponse = await fetch(url, { cache: 'no-cache' });
+            if (!fileResponse.ok) throw new Error(`${file}: HTTP ${fileResponse.status}`);
+            if (await digestOf(fileResponse) !== expected) throw new Error(`${file}: digest mismatch`);
+            await cache.put(url, fileResponse);
+        }));
+    } catch (error) {
+        console.warn(`App cache ${manifest.version} not used:`, error.message);
+        await caches.delete(name);
+        return;
+    } finally {
+        downloading = null;
+    }
+    await cache.put(STATE_URL, new Response('pending'));
+    await cache.put(MANIFEST_URL, response);
+    pending = { name, cache, manifest };
+    // The first cache is used right away; a later one waits for the next navigation
+    if (!current) {
+        await promotePending();
+    } else {
+        await dropUnusedAppCaches();
+    }
+}
+
+function scheduleUpdate() {
+    if (!updating) {
+        updating = updateAppCache()
+            .catch(error => console.warn('App cache update failed:', error.message))
+            .finally(() => { updating = null; });
+    }
+    return updating;
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil(scheduleUpdate().then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    // Drop the caches of other versions; the app cache was already cleaned up by the update
+    event.waitUntil((async () => {
+        for (const key of await caches.keys()) {
+            if (key.startsWith(CACHE_PREFIX) && key !== RUNTIME_CACHE && !key.startsWith(APP_CACHE_PREFIX)) {
+                await caches.delete(key);
+            }
+        }
+        await self.clients.claim();
+    })());
+});
+
+// The app cache of the page a request comes from; a navigation starts a page on the newest one
+async function appCacheFor(event) {
+    await lookUpAppCaches();
+    if (event.request.mode === 'navigate') {
+        await promotePending();
+        if (current && event.resultingClientId) clientCaches.set(event.resultingClientId, current);
+        return current;
+    }
+    if (!clientCaches.has(event.clientId) && current && event.clientId) {
+        clientCaches.set(event.clientId, current);
+    }
+    return clientCaches.get(event.clientId) || current;
+}
+
+async function appResponse(event, url) {
+    const active = await appCacheFor(event);
+    const cached = active ? await active.cache.match(url) : null;
+    if (event.request.mode === 'navigate') {
+        event.waitUntil(scheduleUpdate());
+    }
+    return cached || fetch(event.request);
+}
+
+async function runtimeResponse(request) {
+    const cache = await caches.open(RUNTIME_CACHE);
+    const cached = await cache.match(request.url);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok && response.type !== 'opaque') {
+        const active = await currentAppCache();
+        const expected = active && active.manifest.pyodide
+            ? active.manifest.pyodide[request.url.slice(PYODIDE_BASE_URL.length)]
+            : undefined;
+        if (expected && await digestOf(response) !== expected) {
+            console.warn(`${request.url} does not match its digest, not cached`);
+            return response;
+        }
+        await cache.put(request.url, response.clone());
+    }
+    return response;
+}
+
+self.addEventListener('fetch', event => {
+    const { request } = event;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+
+    if (PYODIDE_BASE_URL && request.url.startsWith(PYODIDE_BASE_URL)) {
+        event.respondWith(runtimeResponse(request));
+        return;
+    }
+    if (url.origin !== self.location.origin || !request.url.startsWith(SCOPE)) return;
+
+    // Pages are served whatever their query (?debug=true, ?runtests=true...)
+    const key = url.pathname === new URL(SCOPE).pathname ? INDEX_URL : url.origin + url.pathname;
+    if (key === MANIFEST_URL) return;
+    event.respondWith(appResponse(event, key));
+});
@@ -0,0 +1,30 @@
+"""
+Rewind Across Save/Load Test
+Saves and loads between prompts, then rewinds with /undo (see scripted_inputs.json).
+The replay has to get the same load_data() and record_event() results as the first run,
+even though the saved data has changed since, or it reaches a different prompt.
+"""
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}: {label}")
+
+saved = load_data("rewind_test") or {"runs": 0}
+runs = saved["runs"]
+save_data({"runs": runs + 1}, "rewind_test")
+first = input(f"Run {runs}: first answer? ")
+
+saved = load_data("rewind_test")
+save_data({"runs": saved["runs"], "first": first}, "rewind_test")
+visits = record_event("visit", "rewind_test")
+prompt = f"Run {runs}, visit {visits}, saved {sorted(saved)}: second answer? "
+second = input(prompt)
+
+# Undone: the replay comes back to the prompt above
+third = input("Third answer? ")
+
+check("the replay loaded what the first run loaded", runs == 0)
+check("the replay got the first run's event count", visits == 1)
+check("the rewind landed on the same prompt", prompt == "Run 0, visit 1, saved ['runs']: second answer? ")
+check("the answers after the rewind are the new ones", (first, second, third) == ("a", "b2", "c"))
+check("the replay didn't count the visit again", event_count("visit", "rewind_test") == 1)
+print("END")
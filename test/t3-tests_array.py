@@ -55,7 +55,7 @@ print("[TEST 10] Import and use a module")
 print(os.name)
 
 print("[TEST 11] Use sys.stdout.write and sys.stdout.flush")
-sys.stdout.write("Flush this line\n") # writes to console.log()
+sys.stdout.write("Flush this line\n") # goes to the chat like print()
 sys.stdout.flush()
 
 print("[TEST 12] Use time.sleep")
@@ -4,6 +4,8 @@ Basic test to troubleshoot save/load functionality.
 Utilizes save/load javascript functions created in app.js and made available in python via pyodide: save_data, load_data, clear_data
 """ 
 
+import json
+
 def simple_cookie_test():
     """Very simple test to see what's happening with cookies"""
     print("🔧 SIMPLE COOKIE TEST - TROUBLESHOOTING 🔧")
@@ -76,10 +78,10 @@ def simple_cookie_test():
         print(f"js_load_data result: {js_loaded}")
         print(f"Type: {type(js_loaded)}")
         
-        # Test manual conversion
-        print("Testing manual .to_py() conversion...")
-        if hasattr(js_loaded, 'to_py'):
-            converted = js_loaded.to_py()
+        # Saved data crosses the JS/Python bridge as JSON text, so no proxy is left to release
+        print("Testing json.loads() on the raw result...")
+        if isinstance(js_loaded, str):
+            converted = json.loads(js_loaded)
             print(f"Converted result: {converted}")
             print(f"Converted type: {type(converted)}")
             
@@ -90,7 +92,7 @@ def simple_cookie_test():
             equal = converted == wrapper_result
             print("☑️ Successful. Results are equal" if equal else "❌ Unsuccessful. Results are NOT equal")
         else:
-            print("No .to_py() method available")
+            print(f"❌ Expected JSON text from js_load_data, got {type(js_loaded)}")
         
     except Exception as e:
         print(f"❌ Raw JS load function failed: {e}")
@@ -0,0 +1,28 @@
+"""
+Data Directory Test: Notes
+Runs alongside t9-data_dir_scores.py, which writes a file of the same name. Run as sessions
+of one interpreter (run_tests.py --sessions, ?runtests=true), each program has a data
+directory of its own: its relative paths and os.chdir() must never reach the other's files.
+"""
+
+import os
+import time
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}: {label}")
+
+start = os.getcwd()
+with open("save.txt", "w") as f:
+    f.write("notes")
+os.makedirs("drafts", exist_ok=True)
+os.chdir("drafts")
+
+# The other program writes its save.txt while this one sleeps
+time.sleep(0.5)
+
+check("the working directory is still this program's", os.getcwd() == os.path.join(start, "drafts"))
+with open(os.path.join("..", "save.txt")) as f:
+    check("save.txt still holds this program's text", f.read() == "notes")
+os.chdir("..")
+check("only this program's files are listed", sorted(os.listdir()) == ["drafts", "save.txt"])
+print("END")
@@ -0,0 +1,25 @@
+"""
+Data Directory Test: Scores
+Runs alongside t8-data_dir_notes.py, which writes a file of the same name and changes
+its working directory while this program runs. See that file for what is checked.
+"""
+
+import os
+import time
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}: {label}")
+
+start = os.getcwd()
+check("save.txt doesn't exist before this program writes it", not os.path.exists("save.txt"))
+with open("save.txt", "w") as f:
+    f.write("scores: 10")
+
+time.sleep(0.5)
+
+check("the other program's chdir() didn't move this one", os.getcwd() == start)
+with open("save.txt") as f:
+    check("save.txt still holds this program's text", f.read() == "scores: 10")
+os.remove("save.txt")
+check("os.remove() removed this program's file", not os.path.exists("save.txt"))
+print("END")
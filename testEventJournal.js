@@ -0,0 +1,147 @@
+// testEventJournal.js
+// Checks eventJournal.js with several tabs sharing an in-memory cookie jar (node testEventJournal.js)
+// Each tab is a fresh instance of the module, as a page load would be.
+
+import assert from 'assert';
+import { useCookieJar, readSaveData } from './saveStore.js';
+
+const jar = new Map();
+const writes = [];
+// What reads return instead of the jar, to play a tab that read just before another tab wrote
+let staleRead = null;
+useCookieJar({
+    read: () => staleRead !== null ? staleRead : [...jar].map(([name, value]) => `${name}=${value}`).join('; '),
+    write: assignment => {
+        const [pair, ...attributes] = assignment.split(';');
+        const eq = pair.indexOf('=');
+        const name = pair.slice(0, eq).trim();
+        writes.push(name);
+        if (attributes.some(attribute => attribute.includes('1970'))) {
+            jar.delete(name);
+        } else {
+            jar.set(name, pair.slice(eq + 1));
+        }
+    }
+});
+
+const DAY_MS = 24 * 60 * 60 * 1000;
+const realNow = Date.now;
+let clockOffset = 0;
+Date.now = () => realNow() + clockOffset;
+
+let tabs = 0;
+function openTab() {
+    return import(`./eventJournal.js?tab=${++tabs}`);
+}
+
+const sessionsOf = key => Object.keys(readSaveData(key) || {}).filter(field => field.startsWith('s_'));
+
+const cases = [
+    {
+        name: 'two tabs recording in turns keep every increment, each in its own cookie',
+        async run() {
+            const [a, b] = [await openTab(), await openTab()];
+            for (let i = 0; i < 5; i++) {
+                writes.length = 0;
+                a.recordEvent('play', 'turns');
+                assert.strictEqual(writes.length, 1, 'one cookie write per event');
+                b.recordEvent('play', 'turns');
+            }
+            b.recordEvent('win', 'turns', 3);
+            assert.strictEqual(a.eventCount('play', 'turns'), 5);
+            const fresh = await openTab();
+            assert.strictEqual(fresh.eventCount('play', 'turns'), 10);
+            assert.strictEqual(fresh.eventCount('win', 'turns'), 3);
+            assert.strictEqual(sessionsOf('turns').length, 2);
+        }
+    },
+    {
+        name: 'a tab writing on a stale read of the cookies leaves other sessions alone',
+        async run() {
+            const [a, b] = [await openTab(), await openTab()];
+            a.recordEvent('play', 'race');
+            b.recordEvent('play', 'race');
+            for (let i = 0; i < 8; i++) {
+                staleRead = [...jar].map(([name, value]) => `${name}=${value}`).join('; ');
+                b.recordEvent('play', 'race');
+                // a read the cookies before b's write landed, so it may only write its own cookie
+                writes.length = 0;
+                a.recordEvent('play', 'race');
+                staleRead = null;
+                assert.strictEqual(writes.length, 1);
+                assert(writes[0].startsWith('race.%fs_'), `a wrote ${writes[0]}`);
+            }
+            assert.strictEqual((await openTab()).eventCount('play', 'race'), 18);
+        }
+    },
+    {
+        name: 'more than MAX_SESSIONS sessions are folded into the base, oldest first',
+        async run() {
+            for (let i = 0; i < 12; i++) {
+                clockOffset += 1000;
+                (await openTab()).recordEvent('play', 'many');
+            }
+            const fresh = await openTab();
+            assert.strictEqual(fresh.eventCount('play', 'many'), 12);
+            assert.strictEqual(sessionsOf('many').length, 8);
+            assert.strictEqual(readSaveData('many').base.play, 4);
+        }
+    },
+    {
+        name: 'stale sessions are folded, and their tab starts a new session without counting twice',
+        async run() {
+            const old = await openTab();
+            old.recordEvent('play', 'stale', 4);
+            clockOffset += 2 * DAY_MS;
+            const fresh = await openTab();
+            assert.strictEqual(fresh.eventCount('play', 'stale'), 4);
+            assert.deepStrictEqual(sessionsOf('stale'), []);
+            assert.strictEqual(readSaveData('stale').base.play, 4);
+            // The old tab is still open and records again
+            old.recordEvent('play', 'stale');
+            assert.strictEqual(sessionsOf('stale').length, 1);
+            assert.strictEqual((await openTab()).eventCount('play', 'stale'), 5);
+        }
+    },
+    {
+        name: 'a session folded again after a lost race is not counted twice',
+        async run() {
+            const tab = await openTab();
+            tab.recordEvent('play', 'refold', 2);
+            const [field] = sessionsOf('refold');
+            clockOffset += 2 * DAY_MS;
+            (await openTab()).eventCount('play', 'refold');
+            // The tab wrote its session back right after the fold removed it
+            const cookie = [...jar.keys()].find(name => name.startsWith('refold.%f'));
+            assert.strictEqual(cookie, undefined);
+            jar.set(`refold.%f${field}`, `2:${JSON.stringify({ t: Date.now(), c: { play: 2 }, l: [] })}`);
+            assert.strictEqual((await openTab()).eventCount('play', 'refold'), 2);
+            assert.deepStrictEqual(sessionsOf('refold'), []);
+        }
+    },
+    {
+        name: 'long sessions compact their log',
+        async run() {
+            const tab = await openTab();
+            for (let i = 0; i < 40; i++) tab.recordEvent(i % 2 ? 'odd' : 'even', 'long');
+            const [field] = sessionsOf('long');
+            const session = readSaveData('long')[field];
+            assert(session.l.length < 16);
+            assert.strictEqual((await openTab()).eventCount('odd', 'long'), 20);
+        }
+    }
+];
+
+let failed = 0;
+for (const testCase of cases) {
+    try {
+        await testCase.run();
+        console.log(`✓ ${testCase.name}`);
+    } catch (error) {
+        failed++;
+        console.log(`✗ ${testCase.name}`);
+        console.log(`    ${error.message.split('\n').join('\n    ')}`);
+    }
+}
+console.log(`\n${cases.length - failed}/${cases.length} passed`);
+process.exit(failed ? 1 : 0);
@@ -0,0 +1,145 @@
+// testRunner.js
+// Runs the test programs in test/ concurrently inside one Pyodide instance
+//
+// Every program is a session of its own (see start_session() in bootstrap.py): an
+// asyncio task with its own namespace and builtins, whose I/O stays its own even in
+// modules it imports. It gets its scripted inputs from test/scripted_inputs.json, a
+// virtual clock for time.sleep(), an in-memory store instead of the player's cookies and
+// a data directory of its own, as the shared worker gives every tab (sharedHost.js).
+// run_tests.py is the CPython counterpart and reports results in the same shape.
+
+import { debug } from './debugUtils.js';
+import { prepareProgram, wrapProgram } from './prepareProgram.js';
+
+const MODULE_NAME = 'testRunner.js';
+const TEST_DIR = 'test/';
+const SCRIPTED_INPUTS = `${TEST_DIR}scripted_inputs.json`;
+// Data directories of the test programs, one set per run of the suite
+const TEST_DATA_ROOT = '/home/pyodide/tests';
+let suiteRuns = 0;
+
+// Test programs announce their results by printing
+const PASS_PATTERN = /\b(PASS(ED)?|SUCCESS)\b/;
+const FAIL_PATTERN = /\bFAIL(ED|URE)?\b/;
+
+// Host functions for one test program, mirroring the js_* functions app.js provides
+function createTestHost(inputs, transcript, clock, dataDir) {
+    const store = new Map();
+    const events = new Map();
+    return {
+        js_data_dir: dataDir,
+        js_print: (text, type = 'python') => {
+            transcript.push({ type, text: String(text), t: clock.now });
+        },
+        js_input: async (prompt) => {
+            if (prompt) transcript.push({ type: 'system', text: prompt, t: clock.now });
+            if (inputs.length === 0) {
+                throw new Error('EOF when reading a line (no scripted input left)');
+            }
+            const value = inputs.shift();
+            transcript.push({ type: 'user', text: value, t: clock.now });
+            return value;
+        },
+        js_sleep: async (seconds) => {
+            clock.now += Number(seconds);
+        },
+        // Saved data arrives as JSON text (see save_data in bootstrap.py)
+        js_save_data: (text, key = 'app_data') => {
+            store.set(key, String(text));
+            return true;
+        },
+        js_load_data: (key = 'app_data') => store.has(key) ? store.get(key) : null,
+        js_clear_data: (key = 'app_data') => store.delete(key) || true,
+        js_record_event: (event, key = 'app_events', count = 1) => {
+            const name = `${key}/${event}`;
+            events.set(name, (events.get(name) || 0) + count);
+            return events.get(name);
+        },
+        js_event_count: (event, key = 'app_events') => events.get(`${key}/${event}`) || 0,
+        js_clear_events: (key = 'app_events') => {
+            for (const name of [...events.keys()]) {
+                if (name.startsWith(`${key}/`)) events.delete(name);
+            }
+        }
+    };
+}
+
+/**
+ * Work out the status of a finished test program from its transcript
+ * @param {Array} transcript - Messages the program produced
+ * @param {string|null} error - Error message if the program raised
+ * @returns {Object} - { status, passed, failed }
+ */
+function summarizeTranscript(transcript, error) {
+    let passed = 0;
+    let failed = 0;
+    for (const message of transcript) {
+        if (message.type === 'user' || message.type === 'system') continue;
+        for (const line of message.text.split('\n')) {
+            if (FAIL_PATTERN.test(line)) failed++;
+            else if (PASS_PATTERN.test(line)) passed++;
+        }
+    }
+    const status = error ? 'error' : failed > 0 ? 'failed' : 'passed';
+    return { status, passed, failed };
+}
+
+async function runTest(pyodide, name, inputs, dataRoot) {
+    const transcript = [];
+    const clock = { now: 0 };
+    const started = performance.now();
+    let error = null;
+    let createRuntime, startSession, host, runtime, task;
+    try {
+        const response = await fetch(TEST_DIR + name);
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        const code = wrapProgram(prepareProgram(await response.text()));
+        createRuntime = pyodide.globals.get('create_runtime');
+        startSession = pyodide.globals.get('start_session');
+        const dataDir = `${dataRoot}/${name.replace(/\.py$/, '')}`;
+        pyodide.FS.mkdirTree(dataDir);
+        host = pyodide.toPy(createTestHost([...inputs], transcript, clock, dataDir));
+        runtime = createRuntime(host);
+        task = startSession(code, runtime, name);
+        await task;
+    } catch (err) {
+        error = err.message;
+    } finally {
+        for (const proxy of [createRuntime, startSession, host, runtime, task]) {
+            if (proxy) proxy.destroy();
+        }
+    }
+    const duration_ms = performance.now() - started;
+    debug(MODULE_NAME, `${name} finished in ${duration_ms.toFixed(1)} ms`);
+    return {
+        name,
+        ...summarizeTranscript(transcript, error),
+        error,
+        duration_ms,
+        virtual_seconds: clock.now,
+        transcript
+    };
+}
+
+/**
+ * Run every test program listed in test/scripted_inputs.json, concurrently
+ * @param {Object} pyodide - A Pyodide instance that has already run bootstrap.py
+ * @returns {Promise<Object>} - { duration_ms, results: [...] }
+ */
+async function runTestSuite(pyodide) {
+    const response = await fetch(SCRIPTED_INPUTS);
+    if (!response.ok) {
+        throw new Error(`Could not load ${SCRIPTED_INPUTS} (HTTP ${response.status})`);
+    }
+    const scripts = await response.json();
+    const started = performance.now();
+    const dataRoot = `${TEST_DATA_ROOT}/${++suiteRuns}`;
+    const results = await Promise.all(
+        Object.entries(scripts).map(([name, inputs]) => runTest(pyodide, name, inputs, dataRoot))
+    );
+    return { duration_ms: performance.now() - started, results };
+}
+
+export { runTestSuite, summarizeTranscript };
@@ -0,0 +1,136 @@
+// testSaveStore.js
+// Checks saveStore.js against an in-memory cookie jar (node testSaveStore.js)
+
+import assert from 'assert';
+import {
+    useCookieJar, writeSaveData, readSaveData, writeSaveField, writeFieldCookie, hasFieldCookie,
+    removeSaveField, clearSaveData
+} from './saveStore.js';
+
+// Cookie jar that keeps assignments like a browser would, minus the size limit
+const jar = new Map();
+useCookieJar({
+    read: () => [...jar].map(([name, value]) => `${name}=${value}`).join('; '),
+    write: assignment => {
+        const [pair, ...attributes] = assignment.split(';');
+        const eq = pair.indexOf('=');
+        const name = pair.slice(0, eq).trim();
+        if (attributes.some(attribute => attribute.includes('1970'))) {
+            jar.delete(name);
+        } else {
+            jar.set(name, pair.slice(eq + 1));
+        }
+    }
+});
+
+const cookiesOf = key => [...jar.keys()].filter(name => name === key || name.startsWith(`${key}.`));
+
+const cases = [
+    {
+        name: 'version 0 (one JSON cookie) migrates to chunks',
+        run() {
+            jar.set('old', '{"score":3,"name":"Ann"}');
+            assert.deepStrictEqual(readSaveData('old'), { score: 3, name: 'Ann' });
+            assert(!jar.has('old'));
+            assert(cookiesOf('old').every(name => name.startsWith('old.%c')));
+            assert.deepStrictEqual(readSaveData('old'), { score: 3, name: 'Ann' });
+        }
+    },
+    {
+        name: 'version 1 (a cookie per field) migrates to chunks',
+        run() {
+            jar.set('v1.%v', '1');
+            jar.set('v1.score', '7');
+            jar.set('v1.name', '%22Bo%22');
+            assert.deepStrictEqual(readSaveData('v1'), { score: 7, name: 'Bo' });
+            assert.deepStrictEqual(cookiesOf('v1').filter(name => !name.startsWith('v1.%c')), []);
+            assert.deepStrictEqual(readSaveData('v1'), { score: 7, name: 'Bo' });
+        }
+    },
+    {
+        name: 'keys a and a.b keep their data apart',
+        run() {
+            writeSaveData('a', { x: 1 });
+            writeSaveData('a.b', { y: 2 });
+            assert.deepStrictEqual(readSaveData('a'), { x: 1 });
+            assert.deepStrictEqual(readSaveData('a.b'), { y: 2 });
+            clearSaveData('a');
+            assert.strictEqual(readSaveData('a'), null);
+            assert.deepStrictEqual(readSaveData('a.b'), { y: 2 });
+        }
+    },
+    {
+        name: 'only the chunk of a changed field is rewritten',
+        run() {
+            const data = {};
+            for (let i = 0; i < 50; i++) data[`choice${i}`] = i;
+            writeSaveData('game', data);
+            assert.strictEqual(writeSaveData('game', data), 0);
+            data.choice5 = 99;
+            assert.strictEqual(writeSaveData('game', data), 1);
+            writeSaveField('game', 'choice6', 'six');
+            removeSaveField('game', 'choice7');
+            const saved = readSaveData('game');
+            assert.strictEqual(saved.choice5, 99);
+            assert.strictEqual(saved.choice6, 'six');
+            assert(!('choice7' in saved));
+        }
+    },
+    {
+        name: 'a chunk too big for one cookie is split, and joined again when it shrinks',
+        run() {
+            const data = { story: 'x'.repeat(20000), log: Array.from({ length: 2000 }, (_, i) => i) };
+            writeSaveData('big', data);
+            assert(cookiesOf('big').length > 4);
+            assert(cookiesOf('big').every(name => name.length + jar.get(name).length <= 3800));
+            assert.deepStrictEqual(readSaveData('big'), data);
+            writeSaveData('big', { story: 'short' });
+            assert.strictEqual(cookiesOf('big').length, 1);
+            assert.deepStrictEqual(readSaveData('big'), { story: 'short' });
+            writeSaveData('big', data);
+            clearSaveData('big');
+            assert.deepStrictEqual(cookiesOf('big'), []);
+        }
+    },
+    {
+        name: 'a field in a cookie of its own is left alone by writes of other fields',
+        run() {
+            writeSaveField('journal', 'base', { play: 1 });
+            writeFieldCookie('journal', 's_tab1', { c: { play: 2 } });
+            assert(hasFieldCookie('journal', 's_tab1'));
+            const before = jar.get('journal.%fs_tab1');
+            writeSaveField('journal', 'base', { play: 5 });
+            writeSaveData('journal', { ...readSaveData('journal'), folded: ['s_old'] });
+            assert.strictEqual(jar.get('journal.%fs_tab1'), before);
+            assert.deepStrictEqual(readSaveData('journal'),
+                { base: { play: 5 }, folded: ['s_old'], s_tab1: { c: { play: 2 } } });
+            removeSaveField('journal', 's_tab1');
+            assert(!hasFieldCookie('journal', 's_tab1'));
+            clearSaveData('journal');
+            assert.deepStrictEqual(cookiesOf('journal'), []);
+        }
+    },
+    {
+        name: 'values that are not objects round-trip',
+        run() {
+            writeSaveData('list', [1, 'two', { three: 3 }]);
+            assert.deepStrictEqual(readSaveData('list'), [1, 'two', { three: 3 }]);
+            writeSaveData('text', 'semi;colon, comma % percent é');
+            assert.strictEqual(readSaveData('text'), 'semi;colon, comma % percent é');
+        }
+    }
+];
+
+let failed = 0;
+for (const testCase of cases) {
+    try {
+        testCase.run();
+        console.log(`✓ ${testCase.name}`);
+    } catch (error) {
+        failed++;
+        console.log(`✗ ${testCase.name}`);
+        console.log(`    ${error.message.split('\n').join('\n    ')}`);
+    }
+}
+console.log(`\n${cases.length - failed}/${cases.length} passed`);
+process.exit(failed ? 1 : 0);
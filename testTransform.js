@@ -0,0 +1,208 @@
+// testTransform.js
+// Checks the output of transformPythonForPyodide on small programs (node testTransform.js)
+
+import { transformPythonForPyodide } from './transformInputToAsync.js';
+
+const cases = [
+    {
+        name: 'awaited time.sleep() calls go to the async sleep, the others stay blocking',
+        code: `import time
+
+def pause(seconds):
+    time.sleep(seconds)
+
+later = lambda: time.sleep(0.1)
+pause(1)`,
+        contains: ['    await _sleep(seconds)', 'later = lambda: time.sleep(0.1)', 'await pause(1)'],
+        excludes: ['await time.sleep']
+    },
+    {
+        name: 'a parameter called only in a lambda gets no async variant',
+        code: `def ask():
+    return input("? ")
+
+def sort_by(items, key):
+    return sorted(items, key=lambda item: key(item))
+
+print(sort_by([3, 1], abs))
+ask()`,
+        contains: ['def sort_by(items, key):', 'print(sort_by([3, 1], abs))'],
+        excludes: ['sort_by__async']
+    },
+    {
+        name: 'functions called through a loop over a parameter are awaited',
+        code: `def ask():
+    return input("? ")
+
+def run_all(actions):
+    for action in actions:
+        action()
+
+def run_groups(groups):
+    return [[step() for step in group] for group in groups]
+
+run_all([ask, print])
+run_groups([[ask]])`,
+        contains: [
+            'async def run_all__async(actions):',
+            '        await _maybe_await(action())',
+            'return [[await _maybe_await(step()) for step in group] for group in groups]',
+            'await run_all__async([ask, print])',
+            'await run_groups__async([[ask]])'
+        ],
+        excludes: []
+    },
+    {
+        name: 'a busy loop in a plain helper yields, and its callers await it',
+        code: `def spin(n):
+    total = 0
+    while True:
+        total += 1
+        if total >= n:
+            return total
+
+def work():
+    return spin(10 ** 9) + 1
+
+print(work())`,
+        options: { timeslice: 1000 },
+        contains: [
+            'async def spin(n):',
+            '    while True:\n        if _yield_due(1000): await _yield_now()',
+            'async def work():',
+            'return await spin(10 ** 9) + 1',
+            'print(await work())'
+        ],
+        excludes: []
+    },
+    {
+        name: 'a recursive function that asks for input awaits itself',
+        code: `def countdown(n):
+    if n == 0:
+        return input("Liftoff? ")
+    print(n)
+    return countdown(n - 1)
+
+countdown(3)`,
+        contains: [
+            'async def countdown(n):',
+            '        return await input("Liftoff? ")',
+            '    return await countdown(n - 1)',
+            'await countdown(3)'
+        ],
+        excludes: []
+    },
+    {
+        name: 'mutually recursive functions both become async',
+        code: `def ping(n):
+    if n == 0:
+        return input("Done? ")
+    return pong(n - 1)
+
+def pong(n):
+    return ping(n)
+
+ping(4)`,
+        contains: [
+            'async def ping(n):',
+            '    return await pong(n - 1)',
+            'async def pong(n):',
+            '    return await ping(n)',
+            'await ping(4)'
+        ],
+        excludes: []
+    },
+    {
+        name: 'async functions and lambdas passed to a higher-order function use its async variant',
+        code: `def ask(prompt):
+    return input(prompt)
+
+def apply(f, value):
+    return f(value)
+
+def shout(text):
+    return text.upper()
+
+print(apply(ask, "Name? "))
+print(apply(shout, "hi"))
+print(apply(lambda text: ask(text), "Again? "))`,
+        contains: [
+            'def apply(f, value):\n    return f(value)',
+            'async def apply__async(f, value):\n    return await _maybe_await(f(value))',
+            'def shout(text):',
+            'print(await apply__async(ask, "Name? "))',
+            'print(apply(shout, "hi"))',
+            'print(await apply__async(lambda text: ask(text), "Again? "))'
+        ],
+        excludes: ['async def shout', 'await shout']
+    },
+    {
+        name: 'sync helpers, recursive or not, stay sync next to async code',
+        code: `def ask():
+    return input("? ")
+
+def total(values):
+    return sum(values)
+
+def fact(n):
+    return 1 if n <= 1 else n * fact(n - 1)
+
+def even(n):
+    return n == 0 or odd(n - 1)
+
+def odd(n):
+    return n != 0 and even(n - 1)
+
+print(total([1, 2]), fact(5), even(4))
+print(sorted([3, 1], key=lambda x: -x))
+ask()`,
+        options: { timeslice: 1000 },
+        contains: [
+            'async def ask():',
+            'def total(values):',
+            '    return 1 if n <= 1 else n * fact(n - 1)',
+            '    return n == 0 or odd(n - 1)',
+            '    return n != 0 and even(n - 1)',
+            'print(total([1, 2]), fact(5), even(4))',
+            'print(sorted([3, 1], key=lambda x: -x))',
+            'await ask()'
+        ],
+        excludes: ['async def total', 'async def fact', 'async def even', 'async def odd', '_yield_due']
+    },
+    {
+        name: 'helpers used as values and loops in class bodies stay without await',
+        code: `def score(x):
+    for i in range(3):
+        x += i
+    return x
+
+class Board:
+    cells = []
+    for i in range(3):
+        cells.append(score(i))
+
+print(sorted([3, 1], key=score))`,
+        options: { timeslice: 1000 },
+        contains: ['def score(x):', 'print(sorted([3, 1], key=score))'],
+        excludes: ['await']
+    }
+];
+
+let failed = 0;
+for (const testCase of cases) {
+    const options = testCase.options || {};
+    const result = transformPythonForPyodide(testCase.code, options);
+    const missing = testCase.contains.filter(text => !result.includes(text));
+    const unexpected = testCase.excludes.filter(text => result.includes(text));
+    if (missing.length === 0 && unexpected.length === 0) {
+        console.log(`✓ ${testCase.name}`);
+        continue;
+    }
+    failed++;
+    console.log(`✗ ${testCase.name}`);
+    missing.forEach(text => console.log(`    missing: ${text}`));
+    unexpected.forEach(text => console.log(`    unexpected: ${text}`));
+    console.log(result.split('\n').map(line => `    | ${line}`).join('\n'));
+}
+console.log(`\n${cases.length - failed}/${cases.length} passed`);
+process.exit(failed ? 1 : 0);
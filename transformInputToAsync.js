@@ -3,7 +3,8 @@
 // Usage: node transformInputToAsync.js <python_file.py>
 
 // List of additional function names that should be transformed to use await
-const ALSO_TRANSFORM = ["custom_function_name"];  // Add function names without parentheses
+// enter_scene() is the async builtin that loads and runs a content pack (see contentPacks.js)
+const ALSO_TRANSFORM = ["custom_function_name", "enter_scene"];  // Add function names without parentheses
 
 import { debug } from './debugUtils.js';
 const MODULE_NAME = 'transformInputToAsync.js';
@@ -19,245 +20,669 @@ if (typeof process !== 'undefined' && process.versions && process.versions.node)
     fileURLToPath = (await import('url')).fileURLToPath;
 }
 
-function findFunctionsWithInputOrSleep(code) {
-    debug(MODULE_NAME, '=== findFunctionsWithInputOrSleep START ===');
-    const lines = code.split(/\r?\n/);
-    debug(MODULE_NAME, `Processing ${lines.length} lines of code`);
-    const functionRegex = /^([ \t]*)def\s+(\w+)\s*\([^)]*\):/;
-    const results = [];
-    
-    for (let i = 0; i < lines.length; i++) {
-        const match = lines[i].match(functionRegex);
-        if (match) {
-            const [_, indent, name] = match;
-            debug(MODULE_NAME, `Found function '${name}' at line ${i + 1} with indent '${indent}'`);
-            
-            // Collect the function body (naive: until next non-indented line or EOF)
-            let bodyLines = [];
-            let j = i + 1;
-            while (j < lines.length && (/^\s/.test(lines[j]) || lines[j].trim() === '')) {
-                bodyLines.push(lines[j]);
-                j++;
+// Python keywords that can be followed by "(" without being a call
+const KEYWORDS = new Set([
+    'and', 'as', 'assert', 'async', 'await', 'class', 'def', 'del', 'elif', 'else', 'except',
+    'finally', 'for', 'from', 'global', 'if', 'import', 'in', 'is', 'lambda', 'nonlocal', 'not',
+    'or', 'pass', 'raise', 'return', 'try', 'while', 'with', 'yield', 'match', 'case', 'print'
+]);
+// Builtins returning a callable that suspends (a menu option made with scene("name"))
+const ASYNC_CALLABLE_FACTORIES = ['scene'];
+// Suffix of the async variant of a function that calls functions passed to it
+const ASYNC_VARIANT_SUFFIX = '__async';
+// Builtin from bootstrap.py that awaits a call's result only if it is awaitable
+const MAYBE_AWAIT = '_maybe_await';
+// Async sleep from bootstrap.py that awaited time.sleep() calls are rewritten to; the ones
+// left as they are (in a lambda, or a function passed around) keep the blocking time.sleep
+const ASYNC_SLEEP = '_sleep';
+// Yield point put at the top of loop bodies by the timeslice option (builtins from bootstrap.py)
+const YIELD_POINT = every => `if _yield_due(${every}): await _yield_now()`;
+
+const DEF_REGEX = /^([ \t]*)(async\s+)?def\s+(\w+)\s*\(/;
+const CLASS_REGEX = /^([ \t]*)class\s+(\w+)/;
+const CALL_REGEX = /((?:\w+\s*\.\s*)*)(\w+)\s*\(/g;
+
+/**
+ * Blank out string contents and comments so code can be searched with regexes
+ * @param {string} code - Python code with '\n' line endings
+ * @returns {{lines: string[], continuation: boolean[]}} - Masked lines (same columns as the
+ *   original) and whether each line continues a bracket or string from the line before
+ */
+function maskPython(code) {
+    let out = '';
+    let depth = 0;
+    const continuation = [false];
+    let i = 0;
+    while (i < code.length) {
+        const ch = code[i];
+        if (ch === '#') {
+            while (i < code.length && code[i] !== '\n') {
+                out += ' ';
+                i++;
             }
-            const bodyNoComments = bodyLines.join('\n').replace(/#.*$/gm, '');
-            debug(MODULE_NAME, `Function '${name}' body has ${bodyLines.length} lines`);
-            
-            // Check for built-in async calls (input and sleep)
-            const hasInput = /\binput\s*\(/.test(bodyNoComments);
-            const hasSleep = /\btime\.sleep\s*\(/.test(bodyNoComments);
-            
-            // Check for additional transforms from configuration
-            const customTransforms = ALSO_TRANSFORM.map(fnName => {
-                return {
-                    name: fnName,
-                    // More precise regex that only matches function calls
-                    has: !(/["'`]/.test(bodyNoComments.charAt(bodyNoComments.indexOf(fnName) - 1))) && new RegExp(`\\b${fnName}\\s*\\(`).test(bodyNoComments)
-                };
-            });
-            
-            const hasCustom = customTransforms.some(t => t.has);
-            
-            // Debug output
-            const checks = [
-                `hasInput=${hasInput}`,
-                `hasSleep=${hasSleep}`,
-                ...customTransforms.map(t => `has${t.name}=${t.has}`)
-            ].join(', ');
-            debug(MODULE_NAME, `Function '${name}': ${checks}`);
-            
-            if (hasInput || hasSleep || hasCustom) {
-                const reason = [
-                    hasInput && 'input()',
-                    hasSleep && 'time.sleep()',
-                    ...customTransforms.filter(t => t.has).map(t => `${t.name}()`)
-                ].filter(Boolean).join(', ');
-                debug(MODULE_NAME, `✓ Adding function '${name}' to results (contains ${reason})`);
-                results.push({ name, line: i + 1 });
-            } else {
-                debug(MODULE_NAME, `✗ Skipping function '${name}' (no async calls found)`);
+        } else if (ch === '"' || ch === "'") {
+            const quote = code.startsWith(ch.repeat(3), i) ? ch.repeat(3) : ch;
+            out += quote;
+            i += quote.length;
+            while (i < code.length && !code.startsWith(quote, i)) {
+                if (code[i] === '\n') {
+                    if (quote.length === 1) break;  // unterminated string
+                    out += '\n';
+                    continuation.push(true);
+                } else if (code[i] === '\\' && i + 1 < code.length) {
+                    out += code[i + 1] === '\n' ? ' \n' : '  ';
+                    if (code[i + 1] === '\n') continuation.push(true);
+                    i++;
+                } else {
+                    out += ' ';
+                }
+                i++;
+            }
+            if (code.startsWith(quote, i)) {
+                out += quote;
+                i += quote.length;
             }
+            continue;
+        } else {
+            if ('([{'.includes(ch)) depth++;
+            if (')]}'.includes(ch)) depth = Math.max(0, depth - 1);
+            if (ch === '\n') continuation.push(depth > 0 || code[i - 1] === '\\');
+            out += ch;
+            i++;
         }
     }
-    
-    debug(MODULE_NAME, `=== findFunctionsWithInputOrSleep END: Found ${results.length} functions ===`);
-    return results;
+    return { lines: out.split('\n'), continuation };
 }
 
-function findFunctionCalls(code, functionNames) {
-    debug(MODULE_NAME, '=== findFunctionCalls START ===');
-    debug(MODULE_NAME, `Looking for calls to functions: ${functionNames.join(', ')}`);
-    const lines = code.split(/\r?\n/);
-    const calls = {};
-    
-    // Initialize all function names with empty arrays
-    for (const name of functionNames) {
-        calls[name] = [];
-        debug(MODULE_NAME, `Initialized call tracking for function '${name}'`);
+// Position of the bracket closing the one at (line, col), or null
+function findClosing(masked, line, col) {
+    let depth = 0;
+    for (let l = line; l < masked.length; l++) {
+        for (let c = l === line ? col : 0; c < masked[l].length; c++) {
+            const ch = masked[l][c];
+            if ('([{'.includes(ch)) depth++;
+            if (')]}'.includes(ch) && --depth === 0) return { line: l, col: c };
+        }
     }
-    
-    lines.forEach((line, idx) => {
-        for (const name of functionNames) {
-            // Safari-compatible version that doesn't use lookbehind
-            const defCheck = !line.trim().startsWith('def ');
-            const callRegex = new RegExp(`\\b${name}\\s*\\(`, 'g');
-            let match;
-            while ((match = callRegex.exec(line)) !== null) {
-                // Only process if this isn't a function definition
-                if (defCheck) {
-                    debug(MODULE_NAME, `Found call to '${name}' at line ${idx + 1}: ${line.trim()}`);
-                    calls[name].push({ line: idx + 1, text: line.trim() });
-                }
+    return null;
+}
+
+// Text between two positions of the masked code
+function maskedBetween(masked, from, to) {
+    if (from.line === to.line) return masked[from.line].slice(from.col, to.col);
+    const parts = [masked[from.line].slice(from.col)];
+    for (let l = from.line + 1; l < to.line; l++) parts.push(masked[l]);
+    parts.push(masked[to.line].slice(0, to.col));
+    return parts.join('\n');
+}
+
+// Parameter names of a def header's parameter list (masked text between the parentheses)
+function parameterNames(paramText, isMethod) {
+    const names = [];
+    let depth = 0;
+    let current = '';
+    for (const ch of paramText + ',') {
+        if ('([{'.includes(ch)) depth++;
+        if (')]}'.includes(ch)) depth--;
+        if (ch === ',' && depth === 0) {
+            const match = current.match(/^\s*\**\s*(\w+)/);
+            if (match) names.push(match[1]);
+            current = '';
+        } else {
+            current += ch;
+        }
+    }
+    return isMethod ? names.slice(1) : names;
+}
+
+/**
+ * Find every function definition with its extent, parameters and enclosing class/function
+ * Bodies follow indentation (and bracket/string continuation lines), so methods and nested
+ * functions are separate from the code around them.
+ * @param {string[]} masked - Masked lines from maskPython()
+ * @param {boolean[]} continuation - Continuation flags from maskPython()
+ * @returns {{functions: Object[], owners: (Object|null)[], classBodies: boolean[]}} - Function
+ *   records, the innermost function each line belongs to (null for module level) and whether a
+ *   line is directly in a class body
+ */
+function parseFunctions(masked, continuation) {
+    const functions = [];
+    const owners = new Array(masked.length).fill(null);
+    const classBodies = new Array(masked.length).fill(false);
+    // line -> function whose body starts on its header line ("def f(): return x")
+    const inlineBodies = new Map();
+    const stack = [];  // open blocks: { indent, fn } or { indent, className }
+    let owner = null;
+
+    for (let i = 0; i < masked.length; i++) {
+        const line = masked[i];
+        if (continuation[i] || line.trim() === '') {
+            owners[i] = owner;
+            classBodies[i] = classBodies[i - 1] || false;
+            continue;
+        }
+        const indent = line.match(/^[ \t]*/)[0].length;
+        while (stack.length > 0 && indent <= stack[stack.length - 1].indent) {
+            stack.pop();
+        }
+        const enclosingFn = [...stack].reverse().find(block => block.fn);
+        owner = enclosingFn ? enclosingFn.fn : null;
+        owners[i] = owner;
+        classBodies[i] = stack.length > 0 && Boolean(stack[stack.length - 1].className);
+        for (let fn = owner; fn; fn = fn.parent) fn.end = i;
+
+        const defMatch = line.match(DEF_REGEX);
+        const classMatch = !defMatch && line.match(CLASS_REGEX);
+        if (defMatch) {
+            const top = stack[stack.length - 1];
+            const className = top && top.className ? top.className : null;
+            const open = defMatch[0].length - 1;
+            const close = findClosing(masked, i, open);
+            const headerEnd = close ? close.line : i;
+            const fn = {
+                name: defMatch[3],
+                line: i,
+                indent: defMatch[1],
+                isAsync: Boolean(defMatch[2]),
+                className,
+                parent: owner,
+                params: close ? parameterNames(maskedBetween(masked, { line: i, col: open + 1 }, close), Boolean(className)) : [],
+                headerEnd,
+                // A body on the header line itself ("def f(): return x") starts after the colon
+                bodyCol: close ? masked[headerEnd].indexOf(':', close.col) + 1 : line.length,
+                end: headerEnd
+            };
+            functions.push(fn);
+            if (fn.bodyCol > 0 && masked[headerEnd].slice(fn.bodyCol).trim() !== '') {
+                inlineBodies.set(headerEnd, fn);
             }
+            for (let l = i + 1; l <= headerEnd; l++) owners[l] = owner;
+            stack.push({ indent, fn });
+            owner = fn;
+            i = headerEnd;
+        } else if (classMatch) {
+            stack.push({ indent, className: classMatch[2] });
         }
-    });
-    
-    debug(MODULE_NAME, '=== findFunctionCalls SUMMARY ===');
-    for (const [name, callList] of Object.entries(calls)) {
-        debug(MODULE_NAME, `Function '${name}': ${callList.length} calls found`);
     }
-    debug(MODULE_NAME, '=== findFunctionCalls END ===');
-    
+    return { functions, owners, inlineBodies, classBodies };
+}
+
+// The function a position belongs to, counting one-line bodies ("def f(): return x")
+function ownerAt(parsed, line, col) {
+    const fn = parsed.inlineBodies.get(line);
+    return fn && col >= fn.bodyCol ? fn : parsed.owners[line];
+}
+
+/**
+ * Find all calls with their callee classification
+ * @returns {Object[]} - { line, col, nameCol, open, name, base, awaited, awaitCol, inLambda, owner }
+ */
+function findCalls(masked, parsed) {
+    const calls = [];
+    masked.forEach((line, idx) => {
+        CALL_REGEX.lastIndex = 0;
+        let match;
+        while ((match = CALL_REGEX.exec(line)) !== null) {
+            const name = match[2];
+            const base = match[1].replace(/\s/g, '').replace(/\.$/, '') || null;
+            const prefix = line.slice(0, match.index);
+            if (KEYWORDS.has(name) || /\b(def|class)\s+$/.test(prefix) || /^\d/.test(name)) continue;
+            if (base && KEYWORDS.has(base.split('.')[0])) continue;
+            const awaitMatch = prefix.match(/\bawait\s+$/);
+            calls.push({
+                line: idx,
+                col: match.index,
+                nameCol: match.index + match[1].length,
+                open: { line: idx, col: match.index + match[0].length - 1 },
+                name,
+                base,
+                // A call on an expression result: x().name(...), x[0].name(...)
+                onExpression: !base && /[\w)\]]\s*\.\s*$/.test(prefix),
+                awaited: Boolean(awaitMatch),
+                awaitCol: awaitMatch ? awaitMatch.index : -1,
+                inLambda: /\blambda\b/.test(prefix),
+                owner: ownerAt(parsed, idx, match.index)
+            });
+        }
+    });
     return calls;
 }
 
-function transformPythonCode(code, functionInfos, calls) {
-    debug(MODULE_NAME, '=== transformPythonCode START ===');
-    debug(MODULE_NAME, `Transforming code with ${functionInfos.length} async functions`);
-    
-    // functionInfos: [{ name, line }]
-    let lines = code.split(/\r?\n/);
-    debug(MODULE_NAME, `Code has ${lines.length} lines`);
-    
-    // Insert 'async' before 'def' for each function definition line
-    debug(MODULE_NAME, '--- Adding async keywords to function definitions ---');
-    for (const fn of functionInfos) {
-        const idx = fn.line - 1;
-        if (idx >= 0 && idx < lines.length && !/^\s*async\s+def\b/.test(lines[idx])) {
-            const oldLine = lines[idx];
-            lines[idx] = lines[idx].replace(/^(\s*)def\b/, '$1async def');
-            debug(MODULE_NAME, `Line ${fn.line}: '${oldLine}' → '${lines[idx]}'`);
-        } else {
-            debug(MODULE_NAME, `Skipping line ${fn.line}: already async or invalid index`);
+/**
+ * Work out which functions must be async from the call graph
+ * A function is async when it (transitively) reaches input(), time.sleep(), a configured
+ * async function or a hand-written await of something unknown. Everything else stays a
+ * plain function, so pure helpers don't pay for coroutines. Functions that only call
+ * functions passed to them get a sync version and an async variant (name__async), and
+ * each call site picks one depending on whether it passes an async function. With a
+ * timeslice, plain functions with loops become async too where every use of them can
+ * await them, so their loops can yield.
+ * @param {string} code - Python code with '\n' line endings
+ * @param {string[]} alsoTransform - Function names that are always async
+ * @param {number} timeslice - Yield points will be added to loops (0: no)
+ * @returns {Object} - Analysis used by transformPythonCode()
+ */
+function analyzeAsync(code, alsoTransform = ALSO_TRANSFORM, timeslice = 0) {
+    debug(MODULE_NAME, '=== analyzeAsync START ===');
+    const { lines: masked, continuation } = maskPython(code);
+    const parsed = parseFunctions(masked, continuation);
+    const calls = findCalls(masked, parsed);
+    const alsoSet = new Set(alsoTransform.filter(name => !name.endsWith(ASYNC_VARIANT_SUFFIX)));
+    // Variants defined by the program a content pack is loaded into
+    const externalVariants = new Set(alsoTransform
+        .filter(name => name.endsWith(ASYNC_VARIANT_SUFFIX))
+        .map(name => name.slice(0, -ASYNC_VARIANT_SUFFIX.length)));
+
+    const functionsByName = new Map();
+    const methodsByName = new Map();
+    for (const fn of parsed.functions) {
+        const index = fn.className ? methodsByName : functionsByName;
+        if (!index.has(fn.name)) index.set(fn.name, []);
+        index.get(fn.name).push(fn);
+    }
+    debug(MODULE_NAME, `Found ${parsed.functions.length} functions and ${calls.length} calls`);
+
+    // Modules the code imports: module.function() is never a method call
+    const modules = new Set(['time']);
+    for (const line of masked) {
+        const importMatch = line.match(/^\s*import\s+(.+)/);
+        const fromMatch = line.match(/^\s*from\s+\S+\s+import\s+(.+)/);
+        for (const part of ((importMatch || fromMatch || [])[1] || '').split(',')) {
+            const alias = part.trim().match(/(\w+)\s*$/);
+            if (alias) modules.add(alias[1]);
         }
     }
-    
-    // Now add 'await' to function calls
-    debug(MODULE_NAME, '--- Adding await to function calls ---');
-    for (const fn of functionInfos) {
-        const fnEscaped = fn.name.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
-        // Check if calls[fn.name] exists and has elements
-        if (calls[fn.name] && calls[fn.name].length > 0) {
-            debug(MODULE_NAME, `Processing ${calls[fn.name].length} calls to function '${fn.name}'`);
-            for (const call of calls[fn.name]) {
-                const idx = call.line - 1;
-                if (idx >= 0 && idx < lines.length && !/\bawait\s+/.test(lines[idx])) {
-                    const oldLine = lines[idx];
-                    lines[idx] = lines[idx].replace(new RegExp(`\\b${fnEscaped}\\s*\\(`), `await ${fn.name}(`);
-                    debug(MODULE_NAME, `Line ${call.line}: '${oldLine}' → '${lines[idx]}'`);
-                } else {
-                    debug(MODULE_NAME, `Skipping call at line ${call.line}: already has await or invalid`);
+    // What a function was passed: its parameters and the variables of loops over them
+    // ("for action in actions: action()"), followed through nested loops
+    for (const fn of parsed.functions) fn.passedIn = new Set(fn.params);
+    const loops = [];
+    masked.forEach((line, idx) => {
+        const loopRegex = /\bfor\s+([\w\s,()[\]]+?)\s+in\s+([^:\]]+)/g;
+        let match;
+        while ((match = loopRegex.exec(line)) !== null) {
+            const fn = ownerAt(parsed, idx, match.index);
+            if (!fn) continue;
+            const targets = match[1].match(/[A-Za-z_]\w*/g) || [];
+            const sources = [...match[2].matchAll(/(^|[^.\w])([A-Za-z_]\w*)/g)].map(m => m[2]);
+            loops.push({ fn, targets, sources });
+        }
+    });
+    let loopsChanged = true;
+    while (loopsChanged) {
+        loopsChanged = false;
+        for (const { fn, targets, sources } of loops) {
+            if (!sources.some(name => fn.passedIn.has(name))) continue;
+            for (const name of targets) {
+                if (!fn.passedIn.has(name)) {
+                    fn.passedIn.add(name);
+                    loopsChanged = true;
                 }
             }
-        } else {
-            debug(MODULE_NAME, `No calls found for function '${fn.name}'`);
         }
     }
-    
-    // Transform all input() calls to await input() calls
-    debug(MODULE_NAME, '--- Adding await to input() calls ---');
-    let inputTransforms = 0;
-    for (let i = 0; i < lines.length; i++) {
-        // Only add await if it's not already there
-        if (/\binput\s*\(/.test(lines[i]) && !/\bawait\s+input\s*\(/.test(lines[i])) {
-            const oldLine = lines[i];
-            lines[i] = lines[i].replace(/\binput\s*\(/g, 'await input(');
-            debug(MODULE_NAME, `Line ${i + 1}: '${oldLine}' → '${lines[i]}'`);
-            inputTransforms++;
+    const isParam = (fn, name) => Boolean(fn) && fn.passedIn.has(name);
+
+    // Classify every call by what it calls
+    for (const call of calls) {
+        if (call.base === 'time' && call.name === 'sleep') call.kind = 'sleep';
+        else if (call.base === null && call.onExpression) call.kind = methodsByName.has(call.name) ? 'method' : 'other';
+        else if (call.base !== null) {
+            call.kind = methodsByName.has(call.name) && !modules.has(call.base.split('.')[0]) ? 'method' : 'other';
         }
+        else if (call.name === 'input') call.kind = 'input';
+        else if (alsoSet.has(call.name)) call.kind = 'also';
+        else if (isParam(call.owner, call.name)) call.kind = 'param';
+        else if (functionsByName.has(call.name)) call.kind = 'function';
+        else if (externalVariants.has(call.name)) call.kind = 'variant';
+        else call.kind = 'other';
     }
-    debug(MODULE_NAME, `Applied await to ${inputTransforms} input() calls`);
-    
-    // Also transform time.sleep() calls to await time.sleep() calls
-    debug(MODULE_NAME, '--- Adding await to time.sleep() calls ---');
-    let sleepTransforms = 0;
-    for (let i = 0; i < lines.length; i++) {
-        // Only add await if it's not already there
-        if (/\btime\.sleep\s*\(/.test(lines[i]) && !/\bawait\s+time\.sleep\s*\(/.test(lines[i])) {
-            const oldLine = lines[i];
-            lines[i] = lines[i].replace(/\btime\.sleep\s*\(/g, 'await time.sleep(');
-            debug(MODULE_NAME, `Line ${i + 1}: '${oldLine}' → '${lines[i]}'`);
-            sleepTransforms++;
+
+    // Higher-order functions: call a parameter, or pass one on to another higher-order function.
+    // A call in a lambda doesn't count, the lambda can't await it anyway
+    const higherOrder = new Set();
+    let changed = true;
+    while (changed) {
+        changed = false;
+        for (const call of calls) {
+            const fn = call.owner;
+            if (!fn || fn.className || higherOrder.has(fn)) continue;
+            const passesParam = (call.kind === 'function' && functionsByName.get(call.name).some(f => higherOrder.has(f))) &&
+                argumentNames(masked, call).some(arg => isParam(fn, arg));
+            if ((call.kind === 'param' && !call.awaited && !call.inLambda) || passesParam) {
+                higherOrder.add(fn);
+                changed = true;
+            }
         }
     }
-    debug(MODULE_NAME, `Applied await to ${sleepTransforms} time.sleep() calls`);
 
-    // Transform configured custom function calls to await calls
-    for (const fnName of ALSO_TRANSFORM) {
-        debug(MODULE_NAME, `--- Adding await to ${fnName}() calls ---`);
-        let transforms = 0;
-        
-        for (let i = 0; i < lines.length; i++) {
-            // More precise regex that only matches function calls, not strings
-            const fnRegex = new RegExp(`\\b${fnName}\\s*\\(`);
-            const awaitRegex = new RegExp(`\\bawait\\s+${fnName}\\s*\\(`);
-            
-            // Only add await if it's not already there and not in a string
-            if (fnRegex.test(lines[i]) && !awaitRegex.test(lines[i])) {
-                // Check if the match is inside a string
-                const matchIndex = lines[i].search(fnRegex);
-                const charBefore = lines[i].charAt(matchIndex - 1);
-                if (/["'`]/.test(charBefore)) continue;  // Skip if inside a string
-                const oldLine = lines[i];
-                lines[i] = lines[i].replace(fnRegex, `await ${fnName}(`);
-                debug(MODULE_NAME, `Line ${i + 1}: '${oldLine}' → '${lines[i]}'`);
-                transforms++;
+    // Worklist over the reverse call graph, no iteration limit
+    const asyncFunctions = new Set();
+    const queue = [];
+    const markAsync = (fn, reason) => {
+        if (!fn || asyncFunctions.has(fn)) return;
+        debug(MODULE_NAME, `✓ '${fn.name}' is async (${reason})`);
+        asyncFunctions.add(fn);
+        queue.push(fn);
+    };
+    const asyncName = name => (functionsByName.get(name) || []).some(fn => asyncFunctions.has(fn));
+    const asyncMethod = name => (methodsByName.get(name) || []).some(fn => asyncFunctions.has(fn));
+    const isVariant = name => externalVariants.has(name) ||
+        (functionsByName.has(name) && !asyncName(name) && functionsByName.get(name).some(fn => higherOrder.has(fn)));
+    // A call site of a higher-order function needs its async variant when it passes an async function
+    const passesAsync = call => argumentNames(masked, call).some(arg => !isParam(call.owner, arg) &&
+        (asyncName(arg) || alsoSet.has(arg) || ASYNC_CALLABLE_FACTORIES.includes(arg)));
+
+    const callersOf = new Map();
+    const variantSites = [];
+    for (const call of calls) {
+        if (['input', 'sleep', 'also'].includes(call.kind)) {
+            markAsync(call.owner, `${call.name}()`);
+        } else if ((call.kind === 'param' || call.kind === 'other') && call.awaited) {
+            markAsync(call.owner, `await ${call.name}()`);
+        } else if (call.kind === 'function' || call.kind === 'method') {
+            const key = `${call.kind}:${call.name}`;
+            if (!callersOf.has(key)) callersOf.set(key, []);
+            callersOf.get(key).push(call);
+        }
+        if (call.kind === 'function' || call.kind === 'variant') {
+            variantSites.push(call);
+        }
+    }
+    for (const fn of parsed.functions) {
+        if (fn.isAsync) markAsync(fn, 'async def');
+    }
+    // Hand-written awaits that aren't in front of a call (await some_future)
+    const awaitedCalls = new Set(calls.filter(call => call.awaited).map(call => `${call.line}:${call.awaitCol}`));
+    masked.forEach((line, idx) => {
+        const awaitRegex = /\bawait\b/g;
+        let match;
+        while ((match = awaitRegex.exec(line)) !== null) {
+            if (!awaitedCalls.has(`${idx}:${match.index}`)) {
+                markAsync(ownerAt(parsed, idx, match.index), 'await');
+            }
+        }
+    });
+
+    const propagate = () => {
+        let variantsChanged = true;
+        while (queue.length > 0 || variantsChanged) {
+            while (queue.length > 0) {
+                const fn = queue.shift();
+                const key = `${fn.className ? 'method' : 'function'}:${fn.name}`;
+                for (const call of callersOf.get(key) || []) {
+                    markAsync(call.owner, `calls ${fn.name}()`);
+                }
+            }
+            // Sites of higher-order functions passing a function that just became async
+            variantsChanged = false;
+            for (const call of variantSites) {
+                if (call.owner && !asyncFunctions.has(call.owner) && isVariant(call.name) && passesAsync(call)) {
+                    markAsync(call.owner, `passes an async function to ${call.name}()`);
+                    variantsChanged = true;
+                }
+            }
+        }
+    };
+    propagate();
+
+    // Plain functions with loops become async with their callers, if all of them can be
+    // async: plain functions that are only ever called directly, where an await can go
+    if (timeslice > 0) {
+        const awaitableCalls = new Set(calls
+            .filter(call => call.kind === 'function' && !call.inLambda && !parsed.classBodies[call.line])
+            .map(call => `${call.line}:${call.nameCol}`));
+        const canBeAsync = fn => {
+            if (fn.className || higherOrder.has(fn) || functionsByName.get(fn.name).length > 1) return false;
+            if (fn.line > 0 && /^\s*@/.test(masked[fn.line - 1])) return false;
+            for (let l = fn.line; l <= fn.end; l++) {
+                const ownLine = parsed.owners[l] === fn || parsed.inlineBodies.get(l) === fn;
+                if (ownLine && /\byield\b/.test(masked[l])) return false;
+            }
+            const nameRegex = new RegExp(`(^|[^.\\w])(${fn.name})\\b`, 'g');
+            return masked.every((line, idx) => [...line.matchAll(nameRegex)].every(match => {
+                const col = match.index + match[1].length;
+                return (idx === fn.line && col > fn.indent.length) || awaitableCalls.has(`${idx}:${col}`);
+            }));
+        };
+        for (const loop of findLoops(masked, continuation, parsed)) {
+            if (!loop.owner || asyncFunctions.has(loop.owner)) continue;
+            // The function and everything that calls it, up to the callers that are async already
+            const closure = new Set([loop.owner]);
+            for (const fn of closure) {
+                for (const call of callersOf.get(`function:${fn.name}`) || []) {
+                    if (call.owner && !asyncFunctions.has(call.owner)) closure.add(call.owner);
+                }
+            }
+            if ([...closure].every(canBeAsync)) {
+                closure.forEach(fn => markAsync(fn, fn === loop.owner ? 'loop' : 'calls a function with a loop'));
+                propagate();
             }
         }
-        debug(MODULE_NAME, `Applied await to ${transforms} ${fnName}() calls`);
     }
-    
-    debug(MODULE_NAME, '=== transformPythonCode END ===');
-    return lines.join('\n');
+
+    const variants = new Set([...higherOrder].filter(fn => !asyncFunctions.has(fn)));
+    debug(MODULE_NAME, `Async: ${[...asyncFunctions].map(fn => fn.name).join(', ') || '(none)'}`);
+    debug(MODULE_NAME, `Sync + async variant: ${[...variants].map(fn => fn.name).join(', ') || '(none)'}`);
+    debug(MODULE_NAME, '=== analyzeAsync END ===');
+    return {
+        masked, continuation, parsed, calls, asyncFunctions, variants,
+        asyncName, asyncMethod, isVariant, passesAsync, isParam
+    };
 }
 
-// Helper function to find functions that contain await calls
-function findFunctionsWithAwait(code) {
-    debug(MODULE_NAME, '=== findFunctionsWithAwait START ===');
-    const lines = code.split(/\r?\n/);
-    const functionRegex = /^([ \t]*)def\s+(\w+)\s*\([^)]*\):/;
-    const results = [];
-    
-    for (let i = 0; i < lines.length; i++) {
-        const match = lines[i].match(functionRegex);
-        if (match) {
-            const [_, indent, name] = match;
-            debug(MODULE_NAME, `Checking function '${name}' at line ${i + 1} for await calls`);
-            
-            // Collect the function body (naive: until next non-indented line or EOF)
-            let bodyLines = [];
-            let j = i + 1;
-            while (j < lines.length && (/^\s/.test(lines[j]) || lines[j].trim() === '')) {
-                bodyLines.push(lines[j]);
-                j++;
-            }
-            const bodyNoComments = bodyLines.join('\n').replace(/#.*$/gm, '');
-            debug(MODULE_NAME, `Function '${name}' body has ${bodyLines.length} lines`);
-            
-            // Check for await calls
-            const hasAwait = /\bawait\s+/.test(bodyNoComments);
-            debug(MODULE_NAME, `Function '${name}': hasAwait=${hasAwait}`);
-            
-            if (hasAwait) {
-                debug(MODULE_NAME, `✓ Adding function '${name}' to results (contains await)`);
-                results.push({ name, line: i + 1 });
+// Identifiers appearing in the arguments of a call
+function argumentNames(masked, call) {
+    if (call.argNames === undefined) {
+        const close = findClosing(masked, call.open.line, call.open.col);
+        call.close = close;
+        call.argNames = close
+            ? [...maskedBetween(masked, { line: call.open.line, col: call.open.col + 1 }, close).matchAll(/(^|[^.\w])([A-Za-z_]\w*)/g)].map(m => m[2])
+            : [];
+    }
+    return call.argNames;
+}
+
+// Apply column edits ({ col, insert } or { col, remove }) to one line, right to left
+function applyEdits(line, edits) {
+    const ordered = [...edits].sort((a, b) => b.col - a.col);
+    for (const edit of ordered) {
+        line = edit.remove
+            ? line.slice(0, edit.col) + line.slice(edit.col + edit.remove)
+            : line.slice(0, edit.col) + edit.insert + line.slice(edit.col);
+    }
+    return line;
+}
+
+/**
+ * Edits for one call
+ * @param {Object} call - Call from analyzeAsync()
+ * @param {Object} analysis - Result of analyzeAsync()
+ * @param {Object|null} variant - Function whose async variant is being written, null for the code itself
+ * @returns {Object[]} - { line, col, insert } / { line, col, remove } edits
+ */
+function callEdits(call, analysis, variant) {
+    const { masked } = analysis;
+    const inVariant = variant !== null && call.owner === variant;
+    let needsAwait = false;
+    let wrap = false;
+    let rename = false;
+
+    switch (call.kind) {
+        case 'input':
+        case 'sleep':
+        case 'also':
+            needsAwait = true;
+            break;
+        case 'function':
+        case 'variant':
+            if (analysis.isVariant(call.name)) {
+                // Inside an async variant, the parameters passed on may be async functions
+                rename = analysis.passesAsync(call) ||
+                    (inVariant && argumentNames(masked, call).some(arg => analysis.isParam(variant, arg)));
+                needsAwait = rename;
             } else {
-                debug(MODULE_NAME, `✗ Skipping function '${name}' (no await calls)`);
+                needsAwait = analysis.asyncName(call.name);
             }
+            break;
+        case 'method':
+            needsAwait = analysis.asyncMethod(call.name);
+            break;
+        case 'param':
+            wrap = call.awaited || inVariant;
+            needsAwait = wrap;
+            break;
+        case 'other':
+            wrap = call.awaited && call.base === null;
+            needsAwait = call.awaited;
+            break;
+    }
+
+    const edits = [];
+    if (!needsAwait) {
+        // A hand-written await of a function that never suspends
+        if (call.awaited && (call.kind === 'function' || call.kind === 'variant' ||
+            (call.kind === 'method' && ['self', 'cls'].includes(call.base)))) {
+            debug(MODULE_NAME, `Line ${call.line + 1}: ${call.name}() is synchronous, dropping its await`);
+            edits.push({ line: call.line, col: call.awaitCol, remove: call.col - call.awaitCol });
         }
+        return edits;
     }
-    
-    debug(MODULE_NAME, `=== findFunctionsWithAwait END: Found ${results.length} functions ===`);
-    return results;
+    if (!call.awaited && (call.inLambda || call.onExpression)) {
+        debug(MODULE_NAME, `Line ${call.line + 1}: can't await ${call.name}() here, left as is`);
+        return edits;
+    }
+    if (call.kind === 'sleep') {
+        // time.sleep( -> _sleep(, before the await that goes in front of it
+        edits.push({ line: call.line, col: call.col, remove: call.nameCol + call.name.length - call.col });
+        edits.push({ line: call.line, col: call.col, insert: ASYNC_SLEEP });
+    }
+
+    if (rename) {
+        edits.push({ line: call.line, col: call.nameCol + call.name.length, insert: ASYNC_VARIANT_SUFFIX });
+    }
+    if (call.awaited && !wrap) {
+        return edits;
+    }
+    const close = call.close !== undefined ? call.close : findClosing(masked, call.open.line, call.open.col);
+    if (wrap && !close) {
+        return edits;
+    }
+    // await binds tighter than attribute access on the result: (await f()).x
+    const after = close ? masked[close.line].slice(close.col + 1).trimStart() : '';
+    const parenthesize = !call.awaited && /^[.[(]/.test(after);
+    let before = call.awaited ? '' : 'await ';
+    let behind = '';
+    if (wrap) {
+        before += `${MAYBE_AWAIT}(`;
+        behind += ')';
+    }
+    if (parenthesize) {
+        before = '(' + before;
+        behind += ')';
+    }
+    edits.push({ line: call.line, col: call.col, insert: before });
+    if (behind) {
+        edits.push({ line: close.line, col: close.col + 1, insert: behind });
+    }
+    return edits;
+}
+
+/**
+ * Find the loops that could get a yield point: with their body on the following lines, and
+ * not directly in a class body, where await is a syntax error
+ * @returns {Object[]} - { headerEnd, indent, owner } of each loop, indent being the body's
+ */
+function findLoops(masked, continuation, parsed) {
+    const loops = [];
+    for (let i = 0; i < masked.length; i++) {
+        const header = masked[i].match(/^([ \t]*)(async\s+)?(for|while)\b/);
+        if (!header || continuation[i] || parsed.classBodies[i]) continue;
+        const owner = parsed.owners[i];
+        let headerEnd = i;
+        while (headerEnd + 1 < masked.length && continuation[headerEnd + 1]) headerEnd++;
+        // One-line loops ("while x: step()") have nowhere to put the yield point
+        if (!/:\s*$/.test(masked[headerEnd])) continue;
+        let body = headerEnd + 1;
+        while (body < masked.length && masked[body].trim() === '') body++;
+        const indent = body < masked.length ? masked[body].match(/^[ \t]*/)[0] : '';
+        if (indent.length > header[1].length) {
+            loops.push({ headerEnd, indent, owner });
+        }
+    }
+    return loops;
+}
+
+/**
+ * Rewrite the code with the result of analyzeAsync(): async defs, awaits, sync/async variants
+ * @param {string} code - Python code with '\n' line endings
+ * @param {Object} analysis - Result of analyzeAsync()
+ * @param {number} timeslice - Give the browser a turn every this many loop iterations (0: never)
+ * @returns {string} - Transformed code
+ */
+function transformPythonCode(code, analysis, timeslice = 0) {
+    debug(MODULE_NAME, '=== transformPythonCode START ===');
+    const lines = code.split('\n');
+    const { masked, parsed, calls, asyncFunctions, variants } = analysis;
+
+    // Edits by line, for the code itself and for each async variant
+    const collect = variant => {
+        const byLine = new Map();
+        const add = edit => {
+            if (!byLine.has(edit.line)) byLine.set(edit.line, []);
+            byLine.get(edit.line).push(edit);
+        };
+        for (const call of calls) {
+            if (variant && (call.line < variant.line || call.line > variant.end)) continue;
+            callEdits(call, analysis, variant).forEach(add);
+        }
+        for (const fn of parsed.functions) {
+            if (asyncFunctions.has(fn) && !fn.isAsync) {
+                add({ line: fn.line, col: fn.indent.length, insert: 'async ' });
+            }
+        }
+        if (variant) {
+            add({ line: variant.line, col: variant.indent.length, insert: 'async ' });
+            const nameCol = masked[variant.line].indexOf(variant.name, variant.indent.length + 3);
+            add({ line: variant.line, col: nameCol + variant.name.length, insert: ASYNC_VARIANT_SUFFIX });
+        }
+        return byLine;
+    };
+
+    const edits = collect(null);
+    const result = lines.map((line, idx) => edits.has(idx) ? applyEdits(line, edits.get(idx)) : line);
+
+    // Each async variant goes right after its sync version, so both exist from the same point on
+    const inserts = new Map();
+    for (const fn of variants) {
+        const variantEdits = collect(fn);
+        const copy = [''];
+        for (let l = fn.line; l <= fn.end; l++) {
+            copy.push(variantEdits.has(l) ? applyEdits(lines[l], variantEdits.get(l)) : lines[l]);
+        }
+        inserts.set(fn.end, copy);
+        debug(MODULE_NAME, `Added ${fn.name}${ASYNC_VARIANT_SUFFIX}() next to ${fn.name}()`);
+    }
+    // Loops that may run long without waiting for anything check whether it's time to yield
+    const yieldPoints = new Map();
+    if (timeslice > 0) {
+        // In async functions or at module level, which runs inside the async wrapper
+        for (const loop of findLoops(masked, analysis.continuation, parsed)) {
+            if (!loop.owner || asyncFunctions.has(loop.owner)) {
+                yieldPoints.set(loop.headerEnd, loop.indent + YIELD_POINT(timeslice));
+            }
+        }
+        debug(MODULE_NAME, `Added yield points to ${yieldPoints.size} loops`);
+    }
+
+    const output = [];
+    result.forEach((line, idx) => {
+        output.push(line);
+        if (yieldPoints.has(idx)) output.push(yieldPoints.get(idx));
+        if (inserts.has(idx)) output.push(...inserts.get(idx));
+    });
+
+    debug(MODULE_NAME, '=== transformPythonCode END ===');
+    return output.join('\n');
 }
 
 // Helper function to transform if __name__ == "__main__" block
@@ -334,88 +759,33 @@ function transformMainBlock(code) {
     return transformedLines.join('\n');
 }
 
-// Main function to transform Python code for Pyodide compatibility with recursive async propagation
-function transformPythonForPyodide(code) {
+// Main function to transform Python code for Pyodide compatibility
+// options.alsoTransform: more function names to treat like ALSO_TRANSFORM, e.g. the async
+// functions of the program a content pack is loaded into
+// options.timeslice: put a yield point in loops of async code, checked every N iterations
+function transformPythonForPyodide(code, { alsoTransform = [], timeslice = 0 } = {}) {
     debug(MODULE_NAME, '🚀 === transformPythonForPyodide START ===');
     debug(MODULE_NAME, 'Input code length:', code.length);
     
-    let currentCode = code;
-    let previousAsyncFunctions = new Set();
-    let maxIterations = 10; // Prevent infinite loops
-    let iteration = 0;
-    
-    // Always run at least one iteration to handle top-level input() and time.sleep() calls
-    do {
-        iteration++;
-        debug(MODULE_NAME, `\n🔄 === Iteration ${iteration} ===`);
-        
-        // Find functions with input() or time.sleep() (base case)
-        const foundFunctions = findFunctionsWithInputOrSleep(currentCode);
-        debug(MODULE_NAME, `Found ${foundFunctions.length} functions with input()/time.sleep()`);
-        
-        // Find functions that contain await calls (cascading case)
-        const awaitFunctions = findFunctionsWithAwait(currentCode);
-        debug(MODULE_NAME, `Found ${awaitFunctions.length} functions with await calls`);
-        
-        // Combine both sets of functions that need to be async
-        const allAsyncFunctions = [...foundFunctions, ...awaitFunctions];
-        debug(MODULE_NAME, `Total potential async functions: ${allAsyncFunctions.length}`);
-        
-        // Remove duplicates
-        const uniqueAsyncFunctions = allAsyncFunctions.filter((fn, index, self) => 
-            index === self.findIndex(f => f.name === fn.name)
-        );
-        debug(MODULE_NAME, `Unique async functions after deduplication: ${uniqueAsyncFunctions.length}`);
-        
-        const currentAsyncFunctions = new Set(uniqueAsyncFunctions.map(f => f.name));
-        
-        debug(MODULE_NAME, 'Functions needing async:', Array.from(currentAsyncFunctions));
-        debug(MODULE_NAME, 'Previous async functions:', Array.from(previousAsyncFunctions));
-        
-        // Find all calls to async functions
-        const functionNames = uniqueAsyncFunctions.map(f => f.name);
-        const calls = findFunctionCalls(currentCode, functionNames);
-        
-        // Transform the code (this will always run at least once, handling top-level calls)
-        debug(MODULE_NAME, '🔧 Starting code transformation...');
-        const beforeTransform = currentCode.length;
-        currentCode = transformPythonCode(currentCode, uniqueAsyncFunctions, calls);
-        const afterTransform = currentCode.length;
-        debug(MODULE_NAME, `Code length: ${beforeTransform} → ${afterTransform}`);
-        
-        // If no new async functions were found, we're done
-        const noNewFunctions = currentAsyncFunctions.size === previousAsyncFunctions.size && 
-            [...currentAsyncFunctions].every(fn => previousAsyncFunctions.has(fn));
-        
-        debug(MODULE_NAME, `No new async functions found: ${noNewFunctions}`);
-        
-        if (noNewFunctions) {
-            debug(MODULE_NAME, '✅ No new async functions found. Transformation complete.');
-            break;
-        }
-        
-        // Update the set of async functions for next iteration
-        previousAsyncFunctions = new Set(currentAsyncFunctions);
-        debug(MODULE_NAME, `Updated previous async functions for next iteration: ${Array.from(previousAsyncFunctions)}`);
-        
-    } while (iteration < maxIterations);
+    const allAlsoTransform = [...ALSO_TRANSFORM, ...alsoTransform];
+    let currentCode = code.replace(/\r\n/g, '\n');
     
-    if (iteration >= maxIterations) {
-        debug(MODULE_NAME, '⚠️ Warning: Maximum iterations reached. Transformation may be incomplete.');
-    }
+    // One pass over the call graph finds every function that has to be async
+    const analysis = analyzeAsync(currentCode, allAlsoTransform, timeslice);
+    currentCode = transformPythonCode(currentCode, analysis, timeslice);
     
     // After all async transformations are done, handle the main block
     debug(MODULE_NAME, '🔧 Transforming main block...');
     currentCode = transformMainBlock(currentCode);
     
-    debug(MODULE_NAME, `🏁 === transformPythonForPyodide END (${iteration} iterations) ===`);
+    debug(MODULE_NAME, '🏁 === transformPythonForPyodide END ===');
     debug(MODULE_NAME, 'Final code length:', currentCode.length);
     
     return currentCode;
 }
 
 // Export for use in other scripts using ES6 syntax. module.exports = { ... }; won't work
-export { transformPythonForPyodide };
+export { transformPythonForPyodide, analyzeAsync };
 
 // If run directly, process a file or sample code (Node.js only)
 if (typeof process !== 'undefined' && process.versions && process.versions.node) {
@@ -487,27 +857,14 @@ qux()`;
         debug(MODULE_NAME, '=== Detailed Analysis ===');
         debug(MODULE_NAME, '='.repeat(80));
         
-        const foundFunctions = findFunctionsWithInputOrSleep(pythonCode);
-        const functionNamesArray = foundFunctions.map(f => f.name);
-        const calls = findFunctionCalls(pythonCode, functionNamesArray);
-        
-        if (foundFunctions.length > 0) {
-            debug(MODULE_NAME, '\nFunctions containing input() or time.sleep():', 
-                foundFunctions.map(f => f.name).join(', '));
-            
-            debug(MODULE_NAME, '\nFunction Call Analysis:');
-            for (const fn of foundFunctions) {
-                debug(MODULE_NAME, `\nCalls to function '${fn.name}':`);
-                if (!calls[fn.name] || calls[fn.name].length === 0) {
-                    debug(MODULE_NAME, '  (No calls found)');
-                } else {
-                    for (const call of calls[fn.name]) {
-                        debug(MODULE_NAME, `  Line ${call.line}: ${call.text}`);
-                    }
-                }
-            }
-        } else {
-            debug(MODULE_NAME, 'No functions with input() or time.sleep() found.');
-        }
+        const analysis = analyzeAsync(pythonCode.replace(/\r\n/g, '\n'), ALSO_TRANSFORM);
+        const describe = fn => fn.className ? `${fn.className}.${fn.name}` : fn.name;
+        debug(MODULE_NAME, '\nAsync functions:',
+            [...analysis.asyncFunctions].map(describe).join(', ') || '(none)');
+        debug(MODULE_NAME, 'Sync with an async variant:',
+            [...analysis.variants].map(describe).join(', ') || '(none)');
+        debug(MODULE_NAME, 'Synchronous:', analysis.parsed.functions
+            .filter(fn => !analysis.asyncFunctions.has(fn) && !analysis.variants.has(fn))
+            .map(describe).join(', ') || '(none)');
     }
 }
\ No newline at end of file
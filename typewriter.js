@@ -0,0 +1,139 @@
+// typewriter.js
+// Streaming "typewriter" rendering of narrate() / print(..., stream=True) output
+//
+// Text is revealed in batches once per animation frame: each frame appends every
+// character that is due since the last one (rate from the --typewriter-cps CSS custom
+// property), so a long passage costs one DOM write per frame instead of one timer per
+// character, and nothing runs at all while the tab is hidden. Output that arrives while
+// a passage is still being revealed is queued behind it to keep the story in order.
+// skip() reveals everything queued at once (app.js calls it on a keypress or click).
+
+import { debug } from './debugUtils.js';
+
+const MODULE_NAME = 'typewriter.js';
+const DEFAULT_CPS = 80;
+
+// Characters per second from the stylesheet; 0 (or reduced motion) means no animation
+function readRate() {
+    if (window.matchMedia && window.matchMedia('(prefers-reduced-motion: reduce)').matches) {
+        return 0;
+    }
+    const value = parseFloat(getComputedStyle(document.documentElement).getPropertyValue('--typewriter-cps'));
+    return Number.isFinite(value) ? value : DEFAULT_CPS;
+}
+
+/**
+ * Create a typewriter renderer
+ * @param {Function} onReveal - Called after each frame that added text (e.g. to keep the chat scrolled down)
+ * @returns {Object} - { stream(element, text), defer(callback), skip(), isBusy() }
+ */
+function createTypewriter(onReveal = () => {}) {
+    // Pending work in output order: { element, text, resolve } passages and { callback } entries
+    const queue = [];
+    let current = null;
+    let frameId = null;
+    let lastFrame = 0;
+    let budget = 0;
+
+    function start(entry) {
+        const textNode = document.createTextNode('');
+        entry.element.appendChild(textNode);
+        entry.element.classList.add('streaming');
+        current = { ...entry, textNode, shown: 0, rate: readRate() };
+        debug(MODULE_NAME, `Streaming ${entry.text.length} characters at ${current.rate} cps`);
+    }
+
+    function finish() {
+        current.textNode.appendData(current.text.slice(current.shown));
+        current.element.classList.remove('streaming');
+        const { resolve } = current;
+        current = null;
+        resolve();
+    }
+
+    // Start the next passage, running the callbacks queued before it
+    function advance() {
+        while (!current && queue.length > 0) {
+            const entry = queue.shift();
+            if (entry.callback) {
+                entry.callback();
+            } else {
+                start(entry);
+            }
+        }
+    }
+
+    function frame(now) {
+        frameId = null;
+        if (current) {
+            if (current.rate <= 0) {
+                finish();
+            } else {
+                budget += Math.min(now - lastFrame, 250) * current.rate / 1000;
+                const count = Math.floor(budget);
+                if (count > 0) {
+                    budget -= count;
+                    const next = Math.min(current.shown + count, current.text.length);
+                    current.textNode.appendData(current.text.slice(current.shown, next));
+                    current.shown = next;
+                    if (next === current.text.length) {
+                        finish();
+                    }
+                }
+            }
+            onReveal();
+        }
+        advance();
+        lastFrame = now;
+        schedule();
+    }
+
+    function schedule() {
+        if (current && frameId === null) {
+            frameId = requestAnimationFrame(frame);
+        }
+    }
+
+    /**
+     * Reveal text into an element
+     * @param {HTMLElement} element - Element the text is appended to
+     * @param {string} text - Text to reveal
+     * @returns {Promise} - Resolves once the whole text is shown
+     */
+    function stream(element, text) {
+        return new Promise(resolve => {
+            queue.push({ element, text: String(text), resolve });
+            if (!current) {
+                lastFrame = performance.now();
+                budget = 0;
+                advance();
+                schedule();
+            }
+        });
+    }
+
+    // Run callback once everything queued before it is shown (right away when idle)
+    function defer(callback) {
+        if (!current) {
+            callback();
+        } else {
+            queue.push({ callback });
+        }
+    }
+
+    function skip() {
+        if (!current) {
+            return;
+        }
+        debug(MODULE_NAME, 'Skipping ahead');
+        while (current) {
+            finish();
+            advance();
+        }
+        onReveal();
+    }
+
+    return { stream, defer, skip, isBusy: () => current !== null };
+}
+
+export { createTypewriter };